@@ -13,6 +13,7 @@ except Exception:
 import tkinter as tk
 from tkinter import messagebox, filedialog, ttk
 from html.parser import HTMLParser
+from json.encoder import encode_basestring_ascii as _json_str
 import anthropic
 import openai
 from ddgs import DDGS
@@ -29,10 +30,38 @@ import re
 import io
 import sys
 import time
+import email.utils
 import concurrent.futures
+import asyncio
+import contextlib
+import multiprocessing
+import glob
+import hashlib
+import random
+import heapq
+import math
+import bisect
+import pickle
+import mmap
+import shutil
+from array import array
+from collections import OrderedDict
+from urllib.parse import urlsplit
 import pyautogui
 import pygetwindow as gw
-from PIL import Image
+from PIL import Image, ImageChops, ImageDraw
+try:
+    import numpy as np   # optional: enables the columnar csv_search engine
+except ImportError:
+    np = None
+try:
+    import mss           # optional: direct screen capture for the screenshot tool
+except ImportError:
+    mss = None
+try:
+    import cv2           # opencv-python: template matching for find_image_on_screen
+except ImportError:
+    cv2 = None
 
 # Desktop automation safety settings
 pyautogui.FAILSAFE = True   # move mouse to (0,0) to abort
@@ -44,16 +73,20 @@ pyautogui.PAUSE = 0.3       # small delay between actions
 TOOLS = [
     {
         "name": "web_search",
-        "description": "Search the web for information. Use this to find current information, answer questions about recent events, look up facts, or find relevant websites. Always prefer searching before guessing.",
+        "description": "Search the web for information. Use this to find current information, answer questions about recent events, look up facts, or find relevant websites. Always prefer searching before guessing. To run several searches at once, pass them all in 'queries' instead of 'query'.",
         "input_schema": {
             "type": "object",
             "properties": {
                 "query": {
                     "type": "string",
                     "description": "The search query",
-                }
+                },
+                "queries": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Several search queries to run concurrently; results are grouped per query",
+                },
             },
-            "required": ["query"],
         },
     },
     {
@@ -99,14 +132,16 @@ TOOLS = [
             "Search a delimited text file (CSV, TSV, TXT, etc.) for records matching a value. "
             "The file must have a header row. You can search a specific column or all columns. "
             "Returns matching rows as formatted text. Use this whenever the user asks to find, "
-            "look up, or filter data in a CSV, TSV, or delimited text file."
+            "look up, or filter data in a CSV, TSV, or delimited text file. For anything beyond a "
+            "single value lookup (several conditions, numeric ranges, sorting, counts, totals or "
+            "averages) pass 'query' so one call answers it instead of paging through rows."
         ),
         "input_schema": {
             "type": "object",
             "properties": {
                 "file_path": {
                     "type": "string",
-                    "description": "Absolute path to the file (CSV, TSV, TXT, etc.)",
+                    "description": "Absolute path to the file (CSV, TSV, TXT, etc.). May also be a directory (searches its .csv/.tsv/.txt/.psv/.tab files) or a glob such as C:\\exports\\*.csv (** recurses); rows are then labelled with their file.",
                 },
                 "delimiter": {
                     "type": "string",
@@ -114,7 +149,20 @@ TOOLS = [
                 },
                 "search_value": {
                     "type": "string",
-                    "description": "The value to search for",
+                    "description": "The value to search for. Optional when 'query' is given (then it is ANDed with the query's WHERE).",
+                },
+                "query": {
+                    "type": "string",
+                    "description": (
+                        "SQL-like query: [SELECT col, ... | COUNT(*), SUM(col), AVG(col), MIN(col), MAX(col) [AS name]] "
+                        "[WHERE expr] [GROUP BY col, ...] [ORDER BY col [ASC|DESC], ...] [LIMIT n]. expr joins "
+                        "predicates with AND/OR/NOT and parentheses: col = v, !=, <, <=, >, >=, BETWEEN a AND b, "
+                        "IN (a, b), CONTAINS v, STARTS WITH v, ENDS WITH v, LIKE 'a%', IS [NOT] EMPTY. Text is "
+                        "case-insensitive; unquoted numbers compare numerically, 'quoted' values as text (fastest "
+                        "on large files). Quote column names with spaces in \"double quotes\". A bare expression "
+                        "is treated as WHERE. Example: SELECT city, COUNT(*), SUM(amount) WHERE amount > 100 AND "
+                        "date >= '2024-03' GROUP BY city ORDER BY sum(amount) DESC LIMIT 5"
+                    ),
                 },
                 "column": {
                     "type": "string",
@@ -130,7 +178,7 @@ TOOLS = [
                     "description": "Maximum number of matching rows to return (default 50).",
                 },
             },
-            "required": ["file_path", "search_value"],
+            "required": ["file_path"],
         },
     },
     {
@@ -205,6 +253,24 @@ META_TOOLS = [
                         "enum": ["disabled", "enabled", "on_demand"],
                     },
                 },
+                "context_policy": {
+                    "type": "object",
+                    "description": (
+                        "Context-window policy for long runs. keep_screenshots: keep screenshots only in "
+                        "the last N tool-result turns (default 3). truncate_after / max_tool_output: "
+                        "truncate tool outputs older than N turns (default 6) to this many characters "
+                        "(default 4000, 0 = never). summarize: summarise the oldest turns when the "
+                        "history exceeds token_budget estimated tokens (default false / 120000). "
+                        "On update, only listed keys are changed."
+                    ),
+                    "properties": {
+                        "keep_screenshots": {"type": "integer"},
+                        "truncate_after": {"type": "integer"},
+                        "max_tool_output": {"type": "integer"},
+                        "summarize": {"type": "boolean"},
+                        "token_budget": {"type": "integer"},
+                    },
+                },
             },
             "required": ["action"],
         },
@@ -263,6 +329,49 @@ META_TOOLS = [
             "required": ["name"],
         },
     },
+    {
+        "name": "search_chats",
+        "description": (
+            "Full-text search over all saved chats (this and other agents' past runs). "
+            "Returns the best-matching messages ranked by relevance, each with its chat "
+            "name, date, model and a snippet. Put \"exact phrases\" in double quotes. "
+            "Use it to recall earlier findings instead of repeating searches."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Words to search for; quoted phrases must match word for word",
+                },
+                "model": {
+                    "type": "string",
+                    "description": "Only chats whose model contains this (e.g. 'sonnet', 'gpt-5')",
+                },
+                "after": {
+                    "type": "string",
+                    "description": "Only chats last saved on or after this date (YYYY-MM-DD)",
+                },
+                "before": {
+                    "type": "string",
+                    "description": "Only chats last saved on or before this date (YYYY-MM-DD)",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Maximum messages returned (default 10, max 50)",
+                },
+                "full_text": {
+                    "type": "boolean",
+                    "description": "Return each matching message in full instead of a snippet (default false)",
+                },
+                "include_current": {
+                    "type": "boolean",
+                    "description": "Also search this run's own saved chat (default false)",
+                },
+            },
+            "required": ["query"],
+        },
+    },
 ]
 
 # Desktop automation tool definitions (pyautogui-based)
@@ -277,6 +386,13 @@ DESKTOP_TOOLS = [
                 "y": {"type": "integer", "description": "Top edge of region to capture"},
                 "width": {"type": "integer", "description": "Width of region to capture"},
                 "height": {"type": "integer", "description": "Height of region to capture"},
+                "full": {
+                    "type": "boolean",
+                    "description": (
+                        "Return the whole screen even if little changed since the previous screenshot "
+                        "(by default only the changed regions and a thumbnail are returned then)"
+                    ),
+                },
             },
             "required": [],
         },
@@ -453,7 +569,9 @@ DESKTOP_TOOLS = [
         "name": "read_screen_text",
         "description": (
             "Read text from a region of the screen using OCR. "
-            "Specify the region as x, y, width, height in screen coordinates."
+            "Specify the region as x, y, width, height in screen coordinates. "
+            "To read several regions of the same screen, pass them all in 'regions': "
+            "the screen is captured once and the regions are read concurrently."
         ),
         "input_schema": {
             "type": "object",
@@ -462,15 +580,30 @@ DESKTOP_TOOLS = [
                 "y": {"type": "integer", "description": "Top edge of region"},
                 "width": {"type": "integer", "description": "Width of region"},
                 "height": {"type": "integer", "description": "Height of region"},
+                "regions": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "x": {"type": "integer"},
+                            "y": {"type": "integer"},
+                            "width": {"type": "integer"},
+                            "height": {"type": "integer"},
+                        },
+                        "required": ["x", "y", "width", "height"],
+                    },
+                    "description": "Several regions to read at once; text is returned per region",
+                },
             },
-            "required": ["x", "y", "width", "height"],
         },
     },
     {
         "name": "find_image_on_screen",
         "description": (
             "Find an image on the screen by matching a reference image file. "
-            "Returns the center coordinates if found. Useful for finding buttons or icons."
+            "Returns the center coordinates if found. Useful for finding buttons or icons. "
+            "To look for several images at once, pass them all in 'image_paths'; "
+            "pass 'region' when you know roughly where the image is."
         ),
         "input_schema": {
             "type": "object",
@@ -479,12 +612,27 @@ DESKTOP_TOOLS = [
                     "type": "string",
                     "description": "Absolute path to the reference image file (PNG, JPG, etc.)",
                 },
+                "image_paths": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Several reference images to find in the same screen capture; results are listed per image",
+                },
                 "confidence": {
                     "type": "number",
                     "description": "Match confidence threshold 0.0-1.0 (default: 0.8)",
                 },
+                "region": {
+                    "type": "object",
+                    "properties": {
+                        "x": {"type": "integer"},
+                        "y": {"type": "integer"},
+                        "width": {"type": "integer"},
+                        "height": {"type": "integer"},
+                    },
+                    "required": ["x", "y", "width", "height"],
+                    "description": "Only search this area (screenshot coordinates)",
+                },
             },
-            "required": ["image_path"],
         },
     },
     {
@@ -720,6 +868,91 @@ BROWSER_TOOLS = [
     },
 ]
 
+# ── Tool capabilities ───────────────────────────────────────────────────────
+
+# How each tool may be scheduled alongside the others in one turn:
+#   read_only        changes nothing: screen, browser, clipboard, files or settings
+#   mutates_ui       changes the desktop or browser: input, windows, pages, clipboard
+#   needs_foreground reads or drives the live desktop/browser session, so it must
+#                    run after earlier UI changes and before later ones
+_INDEPENDENT = {"read_only": True, "mutates_ui": False, "needs_foreground": False}
+_OBSERVER = {"read_only": True, "mutates_ui": False, "needs_foreground": True}
+_UI_ACTION = {"read_only": False, "mutates_ui": True, "needs_foreground": True}
+_STATE_CHANGE = {"read_only": False, "mutates_ui": False, "needs_foreground": False}
+
+TOOL_CAPABILITIES = {
+    # Core
+    "web_search": _INDEPENDENT,
+    "fetch_webpage": _INDEPENDENT,
+    "csv_search": _INDEPENDENT,
+    "get_skill": _INDEPENDENT,
+    "run_powershell": {"read_only": False, "mutates_ui": True, "needs_foreground": False},
+    "user_prompt": _UI_ACTION,          # modal dialog; the user may act on the desktop meanwhile
+    # Desktop
+    "screenshot": _OBSERVER,
+    "read_screen_text": _OBSERVER,
+    "find_image_on_screen": _OBSERVER,
+    "find_window": _OBSERVER,           # _UI_ACTION with activate=true, see _tool_capabilities()
+    "wait_for_window": _OBSERVER,
+    "clipboard_read": _OBSERVER,
+    "clipboard_write": _UI_ACTION,
+    "mouse_click": _UI_ACTION,
+    "type_text": _UI_ACTION,
+    "press_key": _UI_ACTION,
+    "mouse_scroll": _UI_ACTION,
+    "mouse_drag": _UI_ACTION,
+    "open_application": _UI_ACTION,
+    # Browser
+    "browser_get_text": _OBSERVER,
+    "browser_get_elements": _OBSERVER,
+    "browser_screenshot": _OBSERVER,
+    "browser_wait_for": _OBSERVER,
+    "browser_open": _UI_ACTION,
+    "browser_navigate": _UI_ACTION,
+    "browser_click": _UI_ACTION,
+    "browser_fill": _UI_ACTION,
+    "browser_select": _UI_ACTION,
+    "browser_run_js": _UI_ACTION,
+    "browser_close": _UI_ACTION,
+    # Meta
+    "manage_instructions": _STATE_CHANGE,
+    "manage_skills": _STATE_CHANGE,
+    "run_instruction": _STATE_CHANGE,   # fire-and-forget; the launched agent runs on its own
+    "search_chats": _INDEPENDENT,
+}
+
+
+BROWSER_TOOL_NAMES = frozenset(tool["name"] for tool in BROWSER_TOOLS)
+SCREENSHOT_TOOL_NAMES = frozenset(("screenshot", "browser_screenshot"))   # share the delta baseline and scale
+
+
+def _tool_capabilities(name, tool_input=None):
+    """Capabilities of one tool call; unknown tools get the most conservative entry."""
+    if name == "find_window" and (tool_input or {}).get("activate"):
+        return _UI_ACTION
+    return TOOL_CAPABILITIES.get(name, _UI_ACTION)
+
+
+def _tool_dependencies(calls):
+    """For a turn's [(name, input), ...] in request order, return for each
+    call the indices of the earlier calls it must wait for. Every call waits
+    for all earlier state-changing calls (a csv_search after the
+    run_powershell that writes the file, a get_skill after manage_skills),
+    UI changes also wait for earlier observers of the live desktop/browser,
+    and screenshots keep their order. Read-only calls with only read-only
+    calls before them run concurrently."""
+    caps = [_tool_capabilities(name, tool_input) for name, tool_input in calls]
+    deps = []
+    for j, cj in enumerate(caps):
+        deps.append([
+            i for i, ci in enumerate(caps[:j])
+            if not ci["read_only"]
+            or (ci["needs_foreground"] and cj["mutates_ui"])
+            or (calls[i][0] in SCREENSHOT_TOOL_NAMES and calls[j][0] in SCREENSHOT_TOOL_NAMES)
+        ])
+    return deps
+
+
 # ── PowerShell safety guardrails ────────────────────────────────────────────
 
 # Tier 1: Hard-blocked patterns (rejected outright, never run)
@@ -795,23 +1028,115 @@ OPENAI_RESPONSES_PREFIXES = ("gpt-4o", "gpt-4.1", "gpt-4.5", "gpt-5",
                              "o1", "o3", "o4")
 PROVIDERS = ["Anthropic", "OpenAI"]
 DEFAULT_GEOMETRY = "1050x930"
+RENDER_TICK_MS = 50           # check_queue polling interval
+RENDER_FRAME_BUDGET_MS = 12   # max main-thread time spent draining the queue per tick
+AGENT_EXECUTOR_WORKERS = 16   # threads shared by blocking tool calls on the agent event loop
+PARALLEL_SAFE_TOOLS = frozenset(   # tools no other call can affect: network I/O, pure lookups
+    name for name, caps in TOOL_CAPABILITIES.items() if caps["read_only"] and not caps["needs_foreground"])
+TOOL_MAX_CONCURRENCY = 8      # tool calls running at once across the agent
+TOOL_CONCURRENCY_LIMITS = {   # per-tool caps inside the global one
+    "fetch_webpage": 6,
+    "web_search": 2,          # each call may fan out to SEARCH_MAX_CONCURRENCY queries
+    "csv_search": 2,          # disk/CPU bound; multi-file searches also use the process pool
+}
+# Context-window manager defaults, overridable per instruction via "context_policy"
+DEFAULT_CONTEXT_POLICY = {
+    "keep_screenshots": 3,     # screenshots older than N tool-result turns are dropped, N turns at a time
+    "truncate_after": 6,       # tool outputs older than N turns are truncated...
+    "max_tool_output": 4000,   # ...to this many characters (0 = never truncate)
+    "summarize": False,        # summarise the oldest turns when over the token budget
+    "token_budget": 120000,    # estimated history tokens that trigger summarisation
+}
+IMAGE_TOKEN_ESTIMATE = 1600   # roughly what a full-resolution screenshot costs
 
 _BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 INSTRUCTIONS_FILE = os.path.join(_BASE_DIR, "agent_instructions.json")
 CHATS_DIR = os.path.join(_BASE_DIR, "saved_chats")
+CHAT_JOURNAL_MIN_COMPACT_BYTES = 256 * 1024   # a chat's journal is folded into its snapshot above max(this, snapshot size)
 AGENT_STATE_FILE = os.path.join(_BASE_DIR, "agent_state.json")  # instance 1 default
 AGENT_LOCK_PREFIX = os.path.join(_BASE_DIR, "agent_lock_")
 SKILLS_FILE = os.path.join(_BASE_DIR, "skills.json")
+HTTP_CACHE_DIR = os.path.join(_BASE_DIR, "http_cache")
+IMAGE_BLOB_DIR = os.path.join(_BASE_DIR, "image_blobs")   # instruction images, one file per sha256
+IMAGE_BLOB_PRUNE_AGE = 24 * 3600  # unreferenced blobs younger than this may be another instance's unsaved attachment
+
+# fetch_webpage connection pool and response cache
+HTTP_MAX_CONNECTIONS = 20         # pooled connections across all hosts
+HTTP_MAX_PER_HOST = 6             # concurrent requests to any one host
+HTTP_CACHE_MAX_BYTES = 200 * 1024 * 1024
+HTTP_CACHE_MAX_ENTRY_BYTES = 5 * 1024 * 1024
+FETCH_TEXT_BUDGET = 20000         # characters of page text returned by fetch_webpage
+
+# csv_search sidecar indexes
+CSV_INDEX_DIR = os.path.join(_BASE_DIR, "csv_index")
+CSV_INDEX_VERSION = 2
+CSV_NGRAM = 3                     # n-gram length of the contains index
+CSV_INDEX_MAX_KEY_RATIO = 0.1     # columns with more distinct values per row get no postings/n-grams
+CSV_INDEX_MIN_KEYS = 4096         # ...once they have more distinct values than this
+CSV_COLUMNAR_MIN_BYTES = 64 * 1024 * 1024   # files this big use the columnar engine (needs NumPy)
+CSV_SCAN_BATCH = 256              # raw hits mapped to rows per vectorised searchsorted
+CSV_SEARCH_EXTENSIONS = (".csv", ".tsv", ".txt", ".psv", ".tab")   # files searched in a directory
+CSV_POOL_WORKERS = min(8, os.cpu_count() or 1)   # processes for multi-file searches
+CSV_POOL_MIN_BYTES = 64 * 1024 * 1024   # smaller multi-file searches skip the pool and run in-process
+
+# web_search result cache, rate limit and backend
+SEARCH_CACHE_FILE = os.path.join(_BASE_DIR, "search_cache.json")
+SEARCH_CACHE_TTL = 6 * 3600       # seconds a cached result list is reused
+SEARCH_CACHE_MAX_ENTRIES = 500
+SEARCH_MAX_RESULTS = 5
+SEARCH_RATE_PER_SEC = 2.0         # sustained searches per second across all threads
+SEARCH_RATE_BURST = 3
+SEARCH_MAX_CONCURRENCY = 4        # worker threads for a multi-query web_search
+# Set MYAGENT_SEARCH_BACKEND=stub to search offline (MYAGENT_SEARCH_STUB_FILE = optional JSON fixtures)
+SEARCH_BACKEND = os.environ.get("MYAGENT_SEARCH_BACKEND", "ddgs")
+
+# Screenshot pipeline (screenshot and browser_screenshot tools)
+SCREENSHOT_MAX_WIDTH = 1280       # wider captures are downscaled to this
+SCREENSHOT_FORMAT = "jpeg"        # "jpeg", "webp" or "png" (256-colour palette)
+SCREENSHOT_QUALITY = 80           # JPEG/WebP starting quality
+SCREENSHOT_MAX_BYTES = 300_000    # encoded-size budget; quality, then size, is lowered to fit
+SCREENSHOT_DELTAS = True          # full-screen screenshots send only what changed since the last one
+SCREENSHOT_DELTA_BLOCK = 32       # diff grid cell, in downscaled-image pixels (multiple of 4)
+SCREENSHOT_DELTA_THRESHOLD = 24   # grey-level difference that counts as a changed pixel
+SCREENSHOT_DELTA_MAX_CHANGE = 0.3 # fraction of changed cells above which a full frame is sent
+SCREENSHOT_DELTA_MAX_REGIONS = 6
+SCREENSHOT_DELTA_MAX_CHAIN = 8    # deltas in a row before a full frame is sent again
+SCREENSHOT_THUMB_WIDTH = 320      # width of the whole-screen thumbnail sent with a delta
+# Set MYAGENT_SCREEN_BACKEND=fake for a synthetic desktop (auto = mss when installed, else pyautogui)
+SCREEN_BACKEND = os.environ.get("MYAGENT_SCREEN_BACKEND", "auto")
+
+# read_screen_text OCR
+OCR_LANG = "en"
+OCR_CACHE_MAX_ENTRIES = 256       # (region, perceptual hash) -> text results kept
+OCR_HASH_CELL = 2                 # perceptual hash averages cell x cell pixel blocks...
+OCR_HASH_LEVELS = 16              # ...and quantises them to this many grey levels
+# Set MYAGENT_OCR_BACKEND=fake for deterministic OCR without Windows (default winocr)
+OCR_BACKEND = os.environ.get("MYAGENT_OCR_BACKEND", "winocr")
+
+# find_image_on_screen template matching
+TEMPLATE_MAX_FACTOR = 8           # largest downscale factor for the coarse search pass
+TEMPLATE_MIN_COARSE_SIZE = 8      # smallest template side (px) allowed after downscaling
+TEMPLATE_CANDIDATES = 8           # coarse peaks refined at full resolution
+TEMPLATE_CACHE_MAX_ENTRIES = 64   # decoded templates (with their pyramids) kept
+
+# search_chats full-text index over saved_chats/
+CHAT_INDEX_FILE = os.path.join(_BASE_DIR, "chat_index.pickle")
+CHAT_INDEX_VERSION = 2
+CHAT_SEARCH_MAX_DOC_CHARS = 20000 # longer messages (big tool outputs) are indexed up to this
+CHAT_SEARCH_K1 = 1.2              # BM25 term-frequency saturation
+CHAT_SEARCH_B = 0.75              # BM25 length normalisation
+CHAT_SEARCH_MAX_RESULTS = 10
+CHAT_SEARCH_SNIPPET_CHARS = 240
 
 DEFAULT_SYSTEM_PROMPT = (
     "You are an autonomous AI agent with access to a rich set of tools. "
     "Your task is given in the first user message — execute it fully and proactively.\n\n"
 
     "CORE TOOLS (always available):\n"
-    "• web_search — search the web for current information.\n"
+    "• web_search — search the web for current information (pass 'queries' to run several searches at once).\n"
     "• fetch_webpage — fetch and read a specific URL.\n"
     "• run_powershell — execute PowerShell commands on the local Windows PC.\n"
-    "• csv_search — search a delimited text file for records by column heading and value.\n"
+    "• csv_search — search a delimited text file for records by column heading and value, or pass 'query' for filters, ranges, sorting and COUNT/SUM/AVG/GROUP BY in one call.\n"
     "• user_prompt — ask the user a question and wait for their reply. This is the ONLY way to get user input.\n\n"
 
     "DESKTOP TOOLS (available when Desktop is enabled):\n"
@@ -824,7 +1149,7 @@ DEFAULT_SYSTEM_PROMPT = (
     "• find_window — find and optionally activate windows by title.\n"
     "• clipboard_read / clipboard_write — read/write the Windows clipboard.\n"
     "• wait_for_window — wait until a window appears.\n"
-    "• read_screen_text — OCR a screen region to extract text.\n"
+    "• read_screen_text — OCR one or more screen regions to extract text.\n"
     "• find_image_on_screen — find a reference image on screen.\n"
     "• mouse_drag — drag the mouse from one point to another.\n\n"
 
@@ -850,7 +1175,9 @@ DEFAULT_SYSTEM_PROMPT = (
     "on_demand (retrieved via get_skill tool), or disabled.\n"
     "• run_instruction — launch a saved instruction as a separate agent process. "
     "Runs independently (fire-and-forget). Defaults to headless mode; set headless=false "
-    "to show the agent window.\n\n"
+    "to show the agent window.\n"
+    "• search_chats — full-text search over saved chats from earlier runs, ranked by relevance. "
+    "Check it before researching something you may have looked up before.\n\n"
 
     "GUIDELINES:\n"
     "• Execute the task autonomously — chain tools together without hesitation.\n"
@@ -872,29 +1199,61 @@ DEFAULT_INSTRUCTION = (
 # ── Helpers ─────────────────────────────────────────────────────────────────
 
 class HTMLTextExtractor(HTMLParser):
-    """Strip HTML tags and return plain text."""
+    """Strip HTML tags and return plain text.
 
-    def __init__(self):
+    Script/style are always skipped, and so are non-content regions (nav,
+    footer, aside), so a budget goes to the page's main text. Skips count
+    nesting, so a <nav> inside an <aside> doesn't end the skip early, and
+    </body> or </html> ends any region left unclosed. If skipping leaves no
+    text at all, get_text() returns the text of those regions instead.
+    Can be fed incrementally; once `budget` characters of text are
+    collected, `done` is set so a streaming caller can stop downloading."""
+
+    HIDDEN_TAGS = ("script", "style", "noscript")
+    REGION_TAGS = ("nav", "footer", "aside")
+
+    def __init__(self, budget=None):
         super().__init__()
         self._text = []
-        self._skip = False
+        self._fallback = []          # text including skipped regions, up to the budget
+        self._hidden_depth = 0
+        self._region_depth = 0
+        self._length = 0
+        self._fallback_length = 0
+        self.budget = budget
+        self.done = False
 
     def handle_starttag(self, tag, attrs):
-        if tag in ("script", "style", "noscript"):
-            self._skip = True
+        if tag in self.HIDDEN_TAGS:
+            self._hidden_depth += 1
+        elif tag in self.REGION_TAGS:
+            self._region_depth += 1
 
     def handle_endtag(self, tag):
-        if tag in ("script", "style", "noscript"):
-            self._skip = False
+        if tag in self.HIDDEN_TAGS:
+            self._hidden_depth = max(0, self._hidden_depth - 1)
+        elif tag in self.REGION_TAGS:
+            self._region_depth = max(0, self._region_depth - 1)
+        elif tag in ("body", "html"):
+            self._hidden_depth = self._region_depth = 0
         if tag in ("p", "br", "div", "h1", "h2", "h3", "h4", "h5", "h6", "li", "tr"):
             self._text.append("\n")
+            self._fallback.append("\n")
 
     def handle_data(self, data):
-        if not self._skip:
+        if self._hidden_depth or self.done:
+            return
+        if self.budget is None or self._fallback_length <= self.budget:
+            self._fallback.append(data)
+            self._fallback_length += len(data)
+        if not self._region_depth:
             self._text.append(data)
+            self._length += len(data)
+            if self.budget is not None and self._length >= self.budget:
+                self.done = True
 
     def get_text(self):
-        return "".join(self._text).strip()
+        return "".join(self._text).strip() or "".join(self._fallback).strip()
 
 
 def extract_text_from_html(html):
@@ -903,6 +1262,642 @@ def extract_text_from_html(html):
     return extractor.get_text()
 
 
+def _iter_display_json(obj, default=str, indent=2, _level=0):
+    """Yield the JSON text of obj (matching json.dumps(obj, indent=2)) for
+    debug display, shortening base64 image payloads while encoding.
+
+    Base64 image sources have their "data" cut to 40 chars and data-URL
+    "image_url" strings to 60 chars; nothing in obj is copied or modified.
+    Objects JSON can't encode are passed through default() first."""
+    if isinstance(obj, str):
+        yield _json_str(obj)
+    elif obj is None or isinstance(obj, (bool, int, float)):
+        yield json.dumps(obj)
+    elif isinstance(obj, dict):
+        if not obj:
+            yield "{}"
+            return
+        pad = "\n" + " " * (indent * (_level + 1))
+        is_b64_source = obj.get("type") == "base64"
+        yield "{"
+        first = True
+        for key, value in obj.items():
+            yield pad if first else "," + pad
+            first = False
+            yield _json_str(str(key)) + ": "
+            if isinstance(value, str):
+                if key == "data" and is_b64_source and len(value) > 40:
+                    value = value[:40] + "...[truncated]"
+                elif key == "image_url" and value.startswith("data:") and len(value) > 60:
+                    value = value[:60] + "...[truncated]"
+                yield _json_str(value)
+            else:
+                yield from _iter_display_json(value, default, indent, _level + 1)
+        yield "\n" + " " * (indent * _level) + "}"
+    elif isinstance(obj, (list, tuple)):
+        if not obj:
+            yield "[]"
+            return
+        pad = "\n" + " " * (indent * (_level + 1))
+        yield "["
+        for i, item in enumerate(obj):
+            yield pad if i == 0 else "," + pad
+            yield from _iter_display_json(item, default, indent, _level + 1)
+        yield "\n" + " " * (indent * _level) + "]"
+    else:
+        yield from _iter_display_json(default(obj), default, indent, _level)
+
+
+class _RenderBatch:
+    """Collects chat_display inserts for one check_queue frame.
+
+    Consecutive runs that share a tag are merged, and the whole frame is
+    written with a single Text.insert call (Tk accepts alternating
+    text/tag pairs), one state toggle and at most one scroll."""
+
+    def __init__(self):
+        self._runs = []      # [[parts, tag], ...]
+        self._scroll = False
+        self.inserts = 0     # logical inserts queued this frame
+
+    def add(self, text, tag="", scroll=True):
+        if not text:
+            return
+        if self._runs and self._runs[-1][1] == tag:
+            self._runs[-1][0].append(text)
+        else:
+            self._runs.append([[text], tag])
+        self.inserts += 1
+        if scroll:
+            self._scroll = True
+
+    def flush(self, widget):
+        """Write pending runs to widget. Returns the number of Tk inserts made."""
+        if not self._runs:
+            return 0
+        args = []
+        for parts, tag in self._runs:
+            args.append("".join(parts))
+            args.append(tag)
+        widget.config(state="normal")
+        widget.insert(tk.END, *args)
+        widget.config(state="disabled")
+        if self._scroll:
+            widget.see(tk.END)
+        self._runs = []
+        self._scroll = False
+        self.inserts = 0
+        return 1
+
+
+class _ResponsesInputCache:
+    """Memoizes Responses API items per Anthropic-format message.
+
+    Entries are keyed by message identity and hold a reference to the
+    message (so ids cannot be recycled) plus its content object and length,
+    which catches a message whose content was replaced or extended in place.
+    Image data URLs are shared by identity of the base64 string, so a
+    screenshot is formatted into a data URL once per run. After each
+    conversion retain() drops entries for messages that were not in it
+    (compacted or summarised away), so they and their images are freed
+    mid-run instead of at the next clear()."""
+
+    def __init__(self):
+        self._entries = {}     # id(msg) -> (msg, content, content_len, items, data_ids)
+        self._data_urls = {}   # id(data) -> (data, url)
+        self._new_data_ids = []   # data_url() keys used since the last put()
+
+    def clear(self):
+        self._entries.clear()
+        self._data_urls.clear()
+        self._new_data_ids.clear()
+
+    def retain(self, messages):
+        """Keep only entries for `messages`, and the data URLs they use."""
+        if len(self._entries) <= len(messages):
+            return   # every entry was hit or added by this conversion
+        keep = {id(m) for m in messages}
+        self._entries = {k: e for k, e in self._entries.items() if k in keep}
+        data_ids = {d for e in self._entries.values() for d in e[4]}
+        self._data_urls = {k: v for k, v in self._data_urls.items() if k in data_ids}
+
+    @staticmethod
+    def _fingerprint(msg):
+        content = msg.get("content")
+        return content, len(content) if isinstance(content, list) else -1
+
+    def get(self, msg):
+        entry = self._entries.get(id(msg))
+        if entry is None or entry[0] is not msg:
+            return None
+        content, content_len = self._fingerprint(msg)
+        if entry[1] is not content or entry[2] != content_len:
+            return None
+        return entry[3]
+
+    def put(self, msg, items):
+        content, content_len = self._fingerprint(msg)
+        self._entries[id(msg)] = (msg, content, content_len, items, tuple(self._new_data_ids))
+        self._new_data_ids.clear()
+
+    def data_url(self, source):
+        data = source.get("data", "")
+        self._new_data_ids.append(id(data))
+        cached = self._data_urls.get(id(data))
+        if cached is not None and cached[0] is data:
+            return cached[1]
+        url = f"data:{source.get('media_type', 'image/png')};base64,{data}"
+        self._data_urls[id(data)] = (data, url)
+        return url
+
+
+def _with_cache_breakpoints(system, tools, messages):
+    """Return system/tools/messages kwargs carrying prompt-cache breakpoints.
+
+    Marks the last tool schema, the system prompt and the last cacheable
+    block of the final message, so each call writes the whole prefix and
+    the next call in the tool loop reads it back. Only the touched dicts
+    are copied; the caller's history and the cached tool tuple are left
+    untouched."""
+    marker = {"type": "ephemeral"}
+    kwargs = {"system": [{"type": "text", "text": system, "cache_control": marker}]}
+    if tools:
+        kwargs["tools"] = [*tools[:-1], {**tools[-1], "cache_control": marker}]
+    if messages:
+        last = messages[-1]
+        content = last.get("content")
+        if isinstance(content, str) and content:
+            content = [{"type": "text", "text": content, "cache_control": marker}]
+        elif isinstance(content, list):
+            # Thinking blocks and SDK objects cannot carry cache_control
+            for i in range(len(content) - 1, -1, -1):
+                block = content[i]
+                if isinstance(block, dict) and block.get("type") not in ("thinking", "redacted_thinking"):
+                    content = [*content[:i], {**block, "cache_control": marker}, *content[i + 1:]]
+                    break
+        if content is not last.get("content"):
+            kwargs["messages"] = [*messages[:-1], {**last, "content": content}]
+    return kwargs
+
+
+def _context_policy(saved=None):
+    """Merge a saved per-instruction context policy over the defaults."""
+    policy = dict(DEFAULT_CONTEXT_POLICY)
+    if isinstance(saved, dict):
+        policy.update({k: v for k, v in saved.items() if k in policy})
+    return policy
+
+
+def _estimate_tokens(value):
+    """Rough token count for a message, content list or block (~4 chars per
+    token, a fixed cost per image). Handles SDK content objects too."""
+    if isinstance(value, str):
+        return len(value) // 4
+    if isinstance(value, list):
+        return sum(_estimate_tokens(v) for v in value)
+    if not isinstance(value, dict):
+        if hasattr(value, "model_dump"):
+            value = value.model_dump()
+        else:
+            return 0
+    if value.get("type") == "image":
+        return IMAGE_TOKEN_ESTIMATE
+    total = sum(_estimate_tokens(value[k]) for k in ("text", "thinking", "content") if k in value)
+    if "input" in value:
+        total += len(json.dumps(value["input"], default=str)) // 4
+    return total
+
+
+def _truncate_tool_output(text, max_chars):
+    """Cut text to at most max_chars, including the marker, so a truncated
+    output is never truncated again on a later pass."""
+    if not max_chars or len(text) <= max_chars:
+        return text
+    marker = f"\n...[truncated {len(text):,} chars to save context]"
+    return text[:max(0, max_chars - len(marker))] + marker
+
+
+def _compact_tool_results(msg, drop_images, max_chars):
+    """Return (message, screenshots_removed, outputs_truncated) for a user
+    tool-result message. A changed message is a new dict; untouched
+    messages are returned as-is so identity-keyed caches stay valid."""
+    content = msg.get("content")
+    if msg.get("role") != "user" or not isinstance(content, list):
+        return msg, 0, 0
+    shots = truncated = 0
+    new_content = []
+    for block in content:
+        if not (isinstance(block, dict) and block.get("type") == "tool_result"):
+            new_content.append(block)
+            continue
+        inner = block.get("content")
+        new_inner = inner
+        if isinstance(inner, str):
+            new_inner = _truncate_tool_output(inner, max_chars)
+            truncated += new_inner is not inner
+        elif isinstance(inner, list):
+            new_inner = []
+            for sub in inner:
+                if drop_images and isinstance(sub, dict) and sub.get("type") == "image":
+                    sub = {"type": "text", "text": "[Screenshot]"}
+                    shots += 1
+                elif isinstance(sub, dict) and sub.get("type") == "text":
+                    text = _truncate_tool_output(sub.get("text", ""), max_chars)
+                    if text is not sub.get("text", ""):
+                        sub = {**sub, "text": text}
+                        truncated += 1
+                new_inner.append(sub)
+            if all(a is b for a, b in zip(new_inner, inner)):
+                new_inner = inner
+        new_content.append(block if new_inner is inner else {**block, "content": new_inner})
+    if not shots and not truncated:
+        return msg, 0, 0
+    return {**msg, "content": new_content}, shots, truncated
+
+
+def _make_http_client():
+    """Shared keep-alive async client for fetch_webpage, used on the agent
+    event loop. HTTP/2 is used when the optional h2 package is installed."""
+    kwargs = dict(
+        follow_redirects=True,
+        timeout=15,
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+    )
+    try:
+        return httpx.AsyncClient(http2=True, **kwargs)
+    except ImportError:
+        return httpx.AsyncClient(**kwargs)
+
+
+class _AsyncLoop:
+    """asyncio event loop running on its own daemon thread for the app's
+    lifetime. The agent engine and async tools run on it; Tk and worker
+    threads hand it coroutines with submit(). Blocking calls made from it
+    (asyncio.to_thread) share one default executor instead of a new
+    thread pool per turn."""
+
+    def __init__(self, workers=AGENT_EXECUTOR_WORKERS):
+        self.loop = asyncio.new_event_loop()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="agent-tool")
+        self.loop.set_default_executor(self._executor)
+        self._thread = threading.Thread(target=self.loop.run_forever, name="agent-loop", daemon=True)
+        self._thread.start()
+
+    def submit(self, coro):
+        """Schedule a coroutine; returns a concurrent.futures.Future whose
+        cancel() cancels the task on the loop."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine from another thread and wait for its result."""
+        return self.submit(coro).result(timeout)
+
+    def close(self, cleanup=None, timeout=2):
+        """Await `cleanup` on the loop, then stop it and its executor."""
+        if cleanup is not None:
+            try:
+                self.run(cleanup, timeout)
+            except Exception:
+                pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _ToolLimiter:
+    """Concurrency limits for tool calls on the agent event loop: a global
+    cap plus per-tool caps. Calls over a limit wait for a slot in arrival
+    order; `waiting` is the current queue depth and `peak_waiting` its high
+    mark since the last reset_peak(). Only used from the loop thread."""
+
+    def __init__(self, max_concurrency=TOOL_MAX_CONCURRENCY, per_tool=None):
+        per_tool = TOOL_CONCURRENCY_LIMITS if per_tool is None else per_tool
+        self.max_concurrency = max_concurrency
+        self.per_tool = dict(per_tool)
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._tools = {name: asyncio.Semaphore(n) for name, n in self.per_tool.items()}
+        self.running = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+
+    def reset_peak(self):
+        self.peak_waiting = self.waiting
+
+    def describe(self):
+        caps = ", ".join(f"{name} {n}" for name, n in self.per_tool.items())
+        return f"{self.max_concurrency} at once" + (f"; {caps}" if caps else "")
+
+    @contextlib.asynccontextmanager
+    async def slot(self, name):
+        # Per-tool first, then global, so a capped tool never holds a global slot while queued
+        sems = [sem for sem in (self._tools.get(name), self._global) if sem is not None]
+        queued = any(sem.locked() for sem in sems)
+        if queued:
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+        held = []
+        try:
+            for sem in sems:
+                await sem.acquire()
+                held.append(sem)
+            if queued:
+                self.waiting -= 1
+                queued = False
+            self.running += 1
+            try:
+                yield
+            finally:
+                self.running -= 1
+        finally:
+            if queued:
+                self.waiting -= 1
+            for sem in reversed(held):
+                sem.release()
+
+
+class _HttpCache:
+    """On-disk LRU cache of fetched pages, shared across runs.
+
+    Each URL is stored as <sha256>.json (headers, validators, timestamps)
+    plus <sha256>.body (decoded text). Entries younger than the freshness
+    lifetime the server gave (Cache-Control max-age, else Expires) are
+    served without any network request. Other entries are revalidated with
+    ETag / Last-Modified, and a response with neither a lifetime nor a
+    validator is not stored. Neither is one that varies on anything but
+    Accept-Encoding, since the cache is keyed by URL alone. File mtimes
+    record last use, so the LRU order survives restarts, and the oldest
+    entries are evicted past max_bytes."""
+
+    def __init__(self, directory, max_bytes=HTTP_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = None   # key -> size, least recently used first
+        self._total = 0
+
+    def _path(self, key, ext):
+        return os.path.join(self.directory, key + ext)
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        entries = []
+        try:
+            for name in os.listdir(self.directory):
+                if name.endswith(".body"):
+                    st = os.stat(os.path.join(self.directory, name))
+                    entries.append((st.st_mtime, name[:-5], st.st_size))
+        except OSError:
+            pass
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total = sum(self._index.values())
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def get(self, url):
+        """Return the cached entry dict (with "text") or None."""
+        key = self.key(url)
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                return None
+            try:
+                with open(self._path(key, ".json"), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                with open(self._path(key, ".body"), "r", encoding="utf-8") as f:
+                    meta["text"] = f.read()
+                os.utime(self._path(key, ".body"))
+            except (OSError, ValueError):
+                self._drop(key)
+                return None
+            self._index.move_to_end(key)
+        return meta
+
+    @staticmethod
+    def is_fresh(meta):
+        return time.time() - meta.get("stored_at", 0) < meta.get("ttl", 0)
+
+    @staticmethod
+    def freshness(headers):
+        """Seconds a response may be served without revalidation, from
+        Cache-Control (no-cache, max-age) or Expires; None if it gives none."""
+        cache_control = headers.get("cache-control", "").lower()
+        if "no-cache" in cache_control:
+            return 0
+        match = re.search(r"max-age=(\d+)", cache_control)
+        if match:
+            return int(match.group(1))
+        expires = headers.get("expires")
+        if expires is None:
+            return None
+        try:
+            expires_at = email.utils.parsedate_to_datetime(expires).timestamp()
+            date = headers.get("date")
+            now = email.utils.parsedate_to_datetime(date).timestamp() if date else time.time()
+        except (TypeError, ValueError):
+            return 0   # an invalid Expires (e.g. "0") means already expired
+        return max(0, int(expires_at - now))
+
+    def put(self, url, response, text, partial=False):
+        """Store a 200 response body unless it is marked no-store, varies on
+        more than Accept-Encoding, has neither a freshness lifetime nor a
+        validator, or is too large. `partial` marks a body whose download
+        was cut off early. An older copy of an uncacheable page is dropped."""
+        headers = response.headers
+        key = self.key(url)
+        body = text.encode("utf-8")
+        vary = {v.strip().lower() for v in headers.get("vary", "").split(",") if v.strip()}
+        ttl = self.freshness(headers)
+        if ttl is None and (headers.get("etag") or headers.get("last-modified")):
+            ttl = 0   # validator only: revalidate on every use
+        if ("no-store" in headers.get("cache-control", "").lower() or vary - {"accept-encoding"}
+                or ttl is None or len(body) > HTTP_CACHE_MAX_ENTRY_BYTES):
+            with self._lock:
+                self._load_index()
+                if key in self._index:
+                    self._drop(key)
+            return
+        meta = {
+            "url": url,
+            "content_type": response.headers.get("content-type", ""),
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "stored_at": time.time(),
+            "ttl": ttl,
+            "partial": partial,
+        }
+        with self._lock:
+            self._load_index()
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self._path(key, ".body"), "wb") as f:
+                    f.write(body)
+                with open(self._path(key, ".json"), "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+            except OSError:
+                return
+            self._total += len(body) - self._index.pop(key, 0)
+            self._index[key] = len(body)
+            while self._total > self.max_bytes and len(self._index) > 1:
+                self._drop(next(iter(self._index)))
+
+    def refresh(self, url, meta, response):
+        """Record a 304 revalidation: the cached body is current again."""
+        meta = {k: v for k, v in meta.items() if k != "text"}
+        meta["stored_at"] = time.time()
+        ttl = self.freshness(response.headers)
+        if ttl is not None:
+            meta["ttl"] = ttl
+        meta["etag"] = response.headers.get("etag", meta.get("etag"))
+        meta["last_modified"] = response.headers.get("last-modified", meta.get("last_modified"))
+        try:
+            with open(self._path(self.key(url), ".json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+        except OSError:
+            pass
+
+    def _drop(self, key):
+        self._total -= self._index.pop(key, 0)
+        for ext in (".json", ".body"):
+            try:
+                os.remove(self._path(key, ext))
+            except OSError:
+                pass
+
+
+def _normalize_query(query):
+    """Cache key for a search query: case, spacing and trailing punctuation
+    differences don't cause a second network search."""
+    return re.sub(r"\s+", " ", query).strip().strip("?!.,;:'\"").strip().lower()
+
+
+class _DDGSBackend:
+    """web_search backend on duckduckgo-search. One DDGS client is kept per
+    thread and reused, rather than a new one per search."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def search(self, query, max_results):
+        ddgs = getattr(self._local, "ddgs", None)
+        if ddgs is None:
+            ddgs = self._local.ddgs = DDGS()
+        return ddgs.text(query, max_results=max_results) or []
+
+
+class _StubSearchBackend:
+    """Offline web_search backend for testing. Returns results from a JSON
+    fixture file ({normalised query: [{title, href, body}, ...]}) when one
+    matches, otherwise deterministic placeholder results."""
+
+    def __init__(self, fixture_file=None):
+        self.fixtures = {}
+        if fixture_file:
+            with open(fixture_file, "r", encoding="utf-8") as f:
+                self.fixtures = {_normalize_query(q): r for q, r in json.load(f).items()}
+        self.calls = 0
+
+    def search(self, query, max_results):
+        self.calls += 1
+        key = _normalize_query(query)
+        if key in self.fixtures:
+            return self.fixtures[key][:max_results]
+        slug = re.sub(r"\W+", "-", key).strip("-")
+        return [
+            {"title": f"Stub result {i + 1} for {query}",
+             "href": f"https://example.com/{slug}/{i + 1}",
+             "body": f"Placeholder snippet {i + 1} for the query '{query}'."}
+            for i in range(max_results)
+        ]
+
+
+def _make_search_backend():
+    if SEARCH_BACKEND == "stub":
+        return _StubSearchBackend(os.environ.get("MYAGENT_SEARCH_STUB_FILE"))
+    return _DDGSBackend()
+
+
+class _RateLimiter:
+    """Thread-safe token bucket: `rate` acquisitions per second on average,
+    with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class _SearchCache:
+    """Search results keyed by normalised query, persisted to a JSON file so
+    repeated queries are free within a run and across (headless) runs.
+    Entries expire after SEARCH_CACHE_TTL; the oldest are dropped past
+    SEARCH_CACHE_MAX_ENTRIES."""
+
+    def __init__(self, path, ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = None   # key -> {"stored_at": float, "results": list}
+
+    @staticmethod
+    def key(query, max_results):
+        return f"{_normalize_query(query)}|{max_results}"
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+
+    def get(self, query, max_results):
+        with self._lock:
+            self._load()
+            entry = self._entries.get(self.key(query, max_results))
+        if entry and time.time() - entry["stored_at"] < self.ttl:
+            return entry["results"]
+        return None
+
+    def put(self, query, max_results, results):
+        with self._lock:
+            self._load()
+            now = time.time()
+            self._entries = {k: e for k, e in self._entries.items() if now - e["stored_at"] < self.ttl}
+            self._entries[self.key(query, max_results)] = {"stored_at": now, "results": results}
+            if len(self._entries) > self.max_entries:
+                oldest = sorted(self._entries, key=lambda k: self._entries[k]["stored_at"])
+                for k in oldest[:len(self._entries) - self.max_entries]:
+                    del self._entries[k]
+            tmp = self.path + ".tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self._entries, f, ensure_ascii=False)
+                os.replace(tmp, self.path)
+            except OSError:
+                pass
+
+
 class _ToolBlock:
     """Thin wrapper so OpenAI dict-based tool blocks expose the same
     .name, .id, .input attribute interface as Anthropic's Pydantic objects."""
@@ -914,6 +1909,2195 @@ class _ToolBlock:
         self.type = "tool_use"
 
 
+# ── Screenshot Pipeline ─────────────────────────────────────────────────────
+
+class _MssCapture:
+    """Screen capture straight from the OS with mss (BitBlt on Windows),
+    skipping pyautogui's extra copies. mss handles are per thread."""
+
+    name = "mss"
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _sct(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._local.sct = mss.mss()
+        return sct
+
+    def grab(self, region=None):
+        sct = self._sct()
+        if region:
+            left, top, width, height = region
+            area = {"left": left, "top": top, "width": width, "height": height}
+        else:
+            area = sct.monitors[1]   # primary monitor, as pyautogui captures
+        shot = sct.grab(area)
+        return Image.frombuffer("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+
+class _PyAutoGuiCapture:
+    name = "pyautogui"
+
+    def grab(self, region=None):
+        return pyautogui.screenshot(region=region) if region else pyautogui.screenshot()
+
+
+class _FakeCapture:
+    """Synthetic desktop for tests and benchmarks: windows full of text,
+    a taskbar and a noisy photo-like area, drawn once per instance."""
+
+    name = "fake"
+
+    def __init__(self, width=1920, height=1080, seed=0):
+        rng = random.Random(seed)
+        img = Image.new("RGB", (width, height), (40, 70, 110))
+        draw = ImageDraw.Draw(img)
+        for _ in range(6):
+            w, h = rng.randrange(width // 5, width // 2), rng.randrange(height // 4, height // 2)
+            x, y = rng.randrange(0, width - w), rng.randrange(0, height - h - 48)
+            draw.rectangle([x, y, x + w, y + h], fill=(245, 245, 245), outline=(120, 120, 120))
+            draw.rectangle([x, y, x + w, y + 28], fill=(30, 30, 30))
+            for line_y in range(y + 40, y + h - 14, 16):
+                words = ("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randrange(2, 9)))
+                         for _ in range(rng.randrange(3, 12)))
+                draw.text((x + 10, line_y), " ".join(words), fill=(20, 20, 20))
+        photo = Image.effect_noise((width // 5, height // 4), 60).convert("RGB")
+        img.paste(photo, (width // 20, height // 2))
+        draw.rectangle([0, height - 48, width, height], fill=(20, 20, 30))
+        self.image = img
+
+    def grab(self, region=None):
+        if region:
+            left, top, width, height = region
+            return self.image.crop((left, top, left + width, top + height))
+        return self.image.copy()
+
+
+def _make_screen_backend():
+    if SCREEN_BACKEND == "fake":
+        return _FakeCapture()
+    if SCREEN_BACKEND == "pyautogui" or mss is None:
+        return _PyAutoGuiCapture()
+    return _MssCapture()
+
+
+class _ScreenshotPipeline:
+    """capture -> downscale -> encode -> base64 for the screenshot tools.
+
+    Downscaling uses Image.reduce() for whole-number factors and a box
+    filter otherwise. Each thread reuses one encode buffer. The encoder
+    (SCREENSHOT_FORMAT) steps the quality down, or the palette size for
+    PNG, until the image fits max_bytes, then shrinks the image by a
+    quarter and tries again. shoot() and encode() return a dict with the
+    base64 data, media type, final size, the downscale factor and
+    per-stage timings in ms."""
+
+    _MEDIA_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+
+    def __init__(self, backend, max_width=SCREENSHOT_MAX_WIDTH, fmt=SCREENSHOT_FORMAT,
+                 quality=SCREENSHOT_QUALITY, max_bytes=SCREENSHOT_MAX_BYTES):
+        if fmt not in self._MEDIA_TYPES:
+            raise ValueError(f"Unknown screenshot format: {fmt}")
+        self.backend = backend
+        self.max_width = max_width
+        self.fmt = fmt
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def shoot(self, region=None):
+        start = time.perf_counter()
+        img = self.backend.grab(region)
+        capture = (time.perf_counter() - start) * 1000
+        shot = self.encode(img)
+        shot["timings"] = {"capture": capture, **shot["timings"]}
+        return shot
+
+    def downscale(self, img):
+        return self._downscale(img, self.max_width)
+
+    def encode(self, img, max_width=None, quality=None):
+        timings = {}
+        start = time.perf_counter()
+        orig_w = img.width
+        img = self._downscale(img, max_width or self.max_width)
+        timings["resize"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        data, setting = self._encode_within_budget(img, quality or self.quality)
+        while len(data) > self.max_bytes and img.width > 320:
+            img = self._downscale(img, img.width * 3 // 4)
+            data, setting = self._encode_within_budget(img, quality or self.quality)
+        timings["encode"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        b64 = base64.standard_b64encode(data).decode("ascii")
+        timings["b64"] = (time.perf_counter() - start) * 1000
+        return {
+            "data": b64, "media_type": self._MEDIA_TYPES[self.fmt], "bytes": len(data),
+            "width": img.width, "height": img.height, "scale": orig_w / img.width,
+            "setting": setting, "timings": timings,
+        }
+
+    @staticmethod
+    def _downscale(img, max_width):
+        if img.width <= max_width:
+            return img
+        factor = img.width / max_width
+        if factor == int(factor) and img.height % int(factor) == 0:
+            return img.reduce(int(factor))
+        return img.resize((max_width, round(img.height / factor)), Image.BOX)
+
+    def _encode_within_budget(self, img, quality):
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        if self.fmt == "png":
+            steps = [(colors, f"{colors} colours") for colors in (256, 64, 16)]
+        else:
+            steps = [(q, f"q{q}") for q in range(quality, 29, -15)]
+        for value, setting in steps:
+            data = self._save(img, value)
+            if len(data) <= self.max_bytes:
+                break
+        return data, setting
+
+    def _save(self, img, value):
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = io.BytesIO()
+        buf.seek(0)
+        buf.truncate()
+        if self.fmt == "png":
+            img.quantize(value, method=Image.Quantize.FASTOCTREE).save(buf, format="PNG")
+        elif self.fmt == "webp":
+            img.save(buf, format="WEBP", quality=value)
+        else:
+            img.save(buf, format="JPEG", quality=value)
+        return buf.getvalue()
+
+    @staticmethod
+    def describe(shot):
+        t = shot["timings"]
+        stages = ", ".join(f"{stage} {ms:.1f} ms" for stage, ms in t.items())
+        return (f"{shot['width']}x{shot['height']} {shot['media_type'].split('/')[1].upper()} "
+                f"{shot['setting']}, {shot['bytes'] / 1024:.0f} KB ({stages})")
+
+
+class _ScreenDelta:
+    """Change detection between consecutive full-screen screenshots.
+
+    Frames (already downscaled) are compared on a grid of `block`-pixel
+    cells, and 8-connected changed cells are grouped into bounding boxes.
+    compare() only offers a delta while the last full frame is still in
+    the model's context: fewer than keep_turns tool-result turns old
+    (`turn` is advanced by stream_worker), followed by fewer than
+    max_chain deltas, and with little enough of the screen changed."""
+
+    def __init__(self, block=SCREENSHOT_DELTA_BLOCK, threshold=SCREENSHOT_DELTA_THRESHOLD,
+                 max_change=SCREENSHOT_DELTA_MAX_CHANGE, max_regions=SCREENSHOT_DELTA_MAX_REGIONS,
+                 max_chain=SCREENSHOT_DELTA_MAX_CHAIN):
+        self.block = block
+        self.max_change = max_change
+        self.max_regions = max_regions
+        self.max_chain = max_chain
+        self._changed_lut = [255 if v > threshold else 0 for v in range(256)]
+        self._any_lut = [0] + [255] * 255
+        self._lock = threading.Lock()
+        self.turn = 0
+        self._prev = None
+        self._base_turn = 0
+        self._chain = 0
+
+    def reset(self):
+        """Forget the baseline so the next screenshot is a full frame."""
+        with self._lock:
+            self._prev = None
+
+    def next_turn(self):
+        self.turn += 1
+
+    def compare(self, frame, keep_turns, full=False):
+        """Record `frame` as the new baseline and return (boxes, changed
+        fraction) against the previous one, or None to send it in full."""
+        with self._lock:
+            prev, self._prev = self._prev, frame
+            if not full and prev is not None and prev.size == frame.size \
+                    and self._chain < self.max_chain and self.turn - self._base_turn < keep_turns:
+                boxes, fraction = self.changed_boxes(prev, frame)
+                if fraction <= self.max_change and len(boxes) <= self.max_regions:
+                    self._chain += 1
+                    return boxes, fraction
+            self._base_turn, self._chain = self.turn, 0
+            return None
+
+    def changed_boxes(self, prev, frame):
+        diff = ImageChops.difference(prev.convert("L"), frame.convert("L"))
+        # Reduce in two box steps (4x4, then block/4) and re-threshold in between,
+        # so one changed pixel still marks its cell instead of averaging to zero
+        grid = diff.point(self._changed_lut).reduce(4).point(self._any_lut).reduce(self.block // 4)
+        grid_w, grid_h = grid.size
+        changed = {(i % grid_w, i // grid_w) for i, v in enumerate(grid.tobytes()) if v}
+        boxes = []
+        seen = set()
+        for cell in sorted(changed, key=lambda c: (c[1], c[0])):
+            if cell in seen:
+                continue
+            seen.add(cell)
+            stack = [cell]
+            x0 = x1 = cell[0]
+            y0 = y1 = cell[1]
+            while stack:
+                cx, cy = stack.pop()
+                x0, x1, y0, y1 = min(x0, cx), max(x1, cx), min(y0, cy), max(y1, cy)
+                for nx in (cx - 1, cx, cx + 1):
+                    for ny in (cy - 1, cy, cy + 1):
+                        if (nx, ny) in changed and (nx, ny) not in seen:
+                            seen.add((nx, ny))
+                            stack.append((nx, ny))
+            # Half a cell of margin around each region gives the model some context
+            b, pad = self.block, self.block // 2
+            boxes.append((max(0, x0 * b - pad), max(0, y0 * b - pad),
+                          min((x1 + 1) * b + pad, frame.width), min((y1 + 1) * b + pad, frame.height)))
+        return boxes, len(changed) / (grid_w * grid_h)
+
+
+# ── Screen OCR ──────────────────────────────────────────────────────────────
+
+class _WinOcrBackend:
+    """read_screen_text OCR through Windows.Media.Ocr (winocr). recognize()
+    is a coroutine, so several regions are read concurrently on one loop."""
+
+    name = "winocr"
+
+    def __init__(self, lang=OCR_LANG):
+        self.lang = lang
+
+    async def recognize(self, img):
+        import winocr
+        result = await winocr.recognize_pil(img, lang=self.lang)
+        return result.text
+
+
+class _FakeOcrBackend:
+    """OCR backend for tests and benchmarks: after `delay` seconds returns
+    a deterministic line describing the image, and counts its calls."""
+
+    name = "fake"
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = 0
+
+    async def recognize(self, img):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        digest = hashlib.blake2b(img.tobytes(), digest_size=4).hexdigest()
+        return f"Text of a {img.width}x{img.height} region #{digest}"
+
+
+def _make_ocr_backend():
+    if OCR_BACKEND == "fake":
+        return _FakeOcrBackend()
+    return _WinOcrBackend()
+
+
+def _perceptual_hash(img, cell=OCR_HASH_CELL, levels=OCR_HASH_LEVELS):
+    """Hash of how a region looks rather than its exact bytes: grey levels
+    averaged over cell x cell blocks and quantised, so faint colour or
+    antialiasing noise still hits the cache while a changed glyph does not."""
+    grey = img.convert("L")
+    if cell > 1:
+        grey = grey.reduce(cell)
+    step = 256 // levels
+    quantised = grey.point([v // step for v in range(256)])
+    return hashlib.blake2b(quantised.tobytes(), digest_size=16).hexdigest()
+
+
+class _OcrCache:
+    """Thread-safe LRU of OCR text keyed by (screen region, perceptual hash)."""
+
+    def __init__(self, max_entries=OCR_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+            return text
+
+    def put(self, key, text):
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# ── Template Matching ───────────────────────────────────────────────────────
+
+class _Template:
+    """A decoded reference image: RGB pixels, plus greyscale copies
+    downscaled by each pyramid factor, built on first use."""
+
+    def __init__(self, path):
+        with Image.open(path) as img:
+            self.rgb = np.asarray(img.convert("RGB"))
+        self.height, self.width = self.rgb.shape[:2]
+        self.grey = cv2.cvtColor(self.rgb, cv2.COLOR_RGB2GRAY)
+        self._levels = {1: self.grey}
+        self._lock = threading.Lock()
+
+    def factor(self, max_factor=TEMPLATE_MAX_FACTOR, min_size=TEMPLATE_MIN_COARSE_SIZE):
+        """Largest power-of-two downscale that keeps the template recognisable."""
+        f = 1
+        while f * 2 <= max_factor and min(self.width, self.height) // (f * 2) >= min_size:
+            f *= 2
+        return f
+
+    def level(self, f):
+        with self._lock:
+            if f not in self._levels:
+                self._levels[f] = _downscale_grey(self.grey, f)
+            return self._levels[f]
+
+
+def _downscale_grey(grey, f):
+    if f == 1:
+        return grey
+    return cv2.resize(grey, (max(1, grey.shape[1] // f), max(1, grey.shape[0] // f)),
+                      interpolation=cv2.INTER_AREA)
+
+
+class _TemplateMatcher:
+    """Coarse-to-fine template matching for find_image_on_screen.
+
+    Each template is first matched in greyscale against the screen
+    downscaled by the template's pyramid factor. The best TEMPLATE_CANDIDATES
+    peaks are then re-scored in colour at full resolution, in windows just
+    larger than the template, with the same normalised correlation score
+    pyautogui's `confidence` used. Decoded templates are cached by path,
+    mtime and size in an LRU, so a changed file is reloaded."""
+
+    def __init__(self, max_entries=TEMPLATE_CACHE_MAX_ENTRIES, candidates=TEMPLATE_CANDIDATES):
+        self.max_entries = max_entries
+        self.candidates = candidates
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def template(self, path):
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        with self._lock:
+            tpl = self._cache.get(key)
+            if tpl is not None:
+                self._cache.move_to_end(key)
+                return tpl
+        tpl = _Template(path)
+        with self._lock:
+            self._cache[key] = tpl
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return tpl
+
+    def locate_all(self, screen, paths, confidence):
+        """Find each template in one RGB screen array. Returns a list, per
+        path, of ((left, top, width, height) or None, best score)."""
+        grey = cv2.cvtColor(screen, cv2.COLOR_RGB2GRAY)
+        levels = {1: grey}
+        results = []
+        for path in paths:
+            tpl = self.template(path)
+            f = tpl.factor()
+            if f not in levels:
+                levels[f] = _downscale_grey(grey, f)
+            results.append(self.locate(screen, levels[f], tpl, f, confidence))
+        return results
+
+    def locate(self, screen, coarse_screen, tpl, f, confidence):
+        coarse_tpl = tpl.level(f)
+        sh, sw = coarse_screen.shape
+        th, tw = coarse_tpl.shape
+        if tpl.height > screen.shape[0] or tpl.width > screen.shape[1] or th > sh or tw > sw:
+            return None, 0.0
+        scores = cv2.matchTemplate(coarse_screen, coarse_tpl, cv2.TM_CCOEFF_NORMED)
+        scores = np.nan_to_num(scores, nan=-1.0, posinf=1.0, neginf=-1.0)
+        best, best_box = -1.0, None
+        for _ in range(self.candidates):
+            _, peak, _, (cx, cy) = cv2.minMaxLoc(scores)
+            if peak <= -1.0:
+                break
+            # Suppress this peak's neighbourhood so the next candidate is elsewhere
+            scores[max(0, cy - th // 2):cy + th // 2 + 1, max(0, cx - tw // 2):cx + tw // 2 + 1] = -1.0
+            x0, y0 = max(0, (cx - 1) * f), max(0, (cy - 1) * f)
+            x1 = min(screen.shape[1], (cx + 1) * f + tpl.width)
+            y1 = min(screen.shape[0], (cy + 1) * f + tpl.height)
+            window = screen[y0:y1, x0:x1]
+            if window.shape[0] < tpl.height or window.shape[1] < tpl.width:
+                continue
+            fine = cv2.matchTemplate(window, tpl.rgb, cv2.TM_CCOEFF_NORMED)
+            fine = np.nan_to_num(fine, nan=-1.0, posinf=1.0, neginf=-1.0)
+            _, score, _, (fx, fy) = cv2.minMaxLoc(fine)
+            if score > best:
+                best, best_box = score, (x0 + fx, y0 + fy, tpl.width, tpl.height)
+        if best_box is None or best < confidence:
+            return None, max(best, 0.0)
+        return best_box, best
+
+
+# ── Image Blob Store ────────────────────────────────────────────────────────
+
+class _ImageBlobStore:
+    """Content-addressed store for instruction images. IMAGE_BLOB_DIR/<sha256>
+    holds an image's raw bytes, and agent_instructions.json keeps only
+    {"blob": sha256, "media_type", "filename"} references, so an image
+    attached to several instructions is stored once and reading the
+    instructions file never parses image data. Blobs are read, and checked
+    against their digest, only when the agent starts with them."""
+
+    def __init__(self, directory=IMAGE_BLOB_DIR):
+        self.directory = directory
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest)
+
+    def put(self, raw):
+        """Store image bytes; returns their sha256 hex digest."""
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self.path(digest)
+        try:
+            os.utime(path)   # already stored; refresh its age for prune()
+        except OSError:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(raw)
+            os.replace(tmp, path)
+        return digest
+
+    def get_b64(self, digest):
+        """The blob base64-encoded for an API image block. Raises OSError if
+        it is missing, ValueError if its bytes no longer match the digest."""
+        with open(self.path(digest), "rb") as f:
+            raw = f.read()
+        if hashlib.sha256(raw).hexdigest() != digest:
+            raise ValueError(f"image blob {digest[:12]} is corrupt")
+        return base64.standard_b64encode(raw).decode("ascii")
+
+    def prune(self, referenced, min_age=IMAGE_BLOB_PRUNE_AGE):
+        """Delete blobs not in `referenced` that are older than `min_age`
+        seconds; returns how many were removed."""
+        cutoff = time.time() - min_age
+        removed = 0
+        try:
+            with os.scandir(self.directory) as it:
+                stale = [e.path for e in it if len(e.name) == 64 and e.name not in referenced
+                         and e.stat().st_mtime < cutoff]
+        except OSError:
+            return 0
+        for path in stale:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+# ── Chat Store ──────────────────────────────────────────────────────────────
+
+class _ChatStore:
+    """One saved chat on disk: the JSON snapshot (saved_chats/<name>.json,
+    the format every reader already understands), an append-only JSONL
+    journal (<name>.jsonl) of what changed since, and the .txt transcript.
+
+    save() serialises only messages it has not written yet. New messages
+    are appended to the journal. Messages swapped for new dicts (context
+    truncation) are journalled as replacements at their index. Anything
+    else (summarisation, a new run) is compacted into a fresh snapshot.
+    Each batch is one write and one fsync. The journal is folded into the
+    snapshot once it outgrows it, so total I/O stays linear in the chat's
+    length. The snapshot and the journal's first line share a journal_id,
+    so load() skips a journal left behind by an interrupted compaction."""
+
+    TRANSCRIPT_MARK = "transcript_saved"
+
+    def __init__(self, name, directory=CHATS_DIR, min_compact_bytes=CHAT_JOURNAL_MIN_COMPACT_BYTES):
+        self.name = name
+        self.directory = directory
+        self.min_compact_bytes = min_compact_bytes
+        self.path = os.path.join(directory, App._sanitize_filename(name))
+        self.journal_path = os.path.splitext(self.path)[0] + ".jsonl"
+        self.txt_path = os.path.join(directory, App._sanitize_filename(name, '.txt'))
+        self._sources = None     # message objects already written; None until the first save
+        self._slots = []         # per source message: its index in _messages, or None if not saved
+        self._messages = []      # serialised messages, as on disk
+        self._meta = {}
+        self._snapshot_bytes = 0
+        self._journal_bytes = 0
+        self._journal_ops = 0
+        self._transcript_started = False
+        self.bytes_written = 0   # across snapshot, journal and transcript
+
+    def save(self, messages, meta, serialize, compact=False):
+        """Bring the files up to date with `messages` and the `meta` fields.
+        `serialize(msg)` returns a message's saved form, or None to skip it.
+        With compact=True, a non-empty journal is folded into the snapshot."""
+        ops = self._changes(messages, serialize)
+        if ops is None:
+            self._sources = list(messages)
+            self._slots, self._messages = [], []
+            for msg in messages:
+                saved = serialize(msg)
+                self._slots.append(None if saved is None else len(self._messages))
+                if saved is not None:
+                    self._messages.append(saved)
+            self._meta = dict(meta)
+            self.compact()
+            return
+        changed = {k: v for k, v in meta.items() if k not in self._meta or self._meta[k] != v}
+        if changed:
+            self._meta.update(changed)
+            ops.insert(0, {"meta": changed})
+        if ops:
+            data = "".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops).encode("utf-8")
+            with open(self.journal_path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_bytes += len(data)
+            self._journal_ops += len(ops)
+            self.bytes_written += len(data)
+        if self._journal_ops and (compact or self._journal_bytes > max(self.min_compact_bytes, self._snapshot_bytes)):
+            self.compact()
+
+    @property
+    def saved_messages(self):
+        """The chat's messages as saved (read-only)."""
+        return self._messages
+
+    def _changes(self, messages, serialize):
+        """Journal ops turning what was written into `messages`, or None when
+        the history was restructured and needs a new snapshot."""
+        if self._sources is None or len(messages) < len(self._sources):
+            return None
+        ops = []
+        for i, old in enumerate(self._sources):
+            msg = messages[i]
+            if msg is old:
+                continue
+            saved = serialize(msg)
+            slot = self._slots[i]
+            if (saved is None) != (slot is None):
+                return None
+            self._sources[i] = msg
+            if saved is not None and saved != self._messages[slot]:
+                self._messages[slot] = saved
+                ops.append({"seq": slot, "message": saved})
+        for msg in messages[len(self._sources):]:
+            saved = serialize(msg)
+            self._sources.append(msg)
+            if saved is None:
+                self._slots.append(None)
+                continue
+            self._slots.append(len(self._messages))
+            ops.append({"seq": len(self._messages), "message": saved})
+            self._messages.append(saved)
+        return ops
+
+    def compact(self):
+        """Write the snapshot from memory, then start an empty journal."""
+        os.makedirs(self.directory, exist_ok=True)
+        journal_id = os.urandom(8).hex()
+        data = {"messages": self._messages, **self._meta, "name": self.name, "journal_id": journal_id}
+        snapshot = json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+        header = (json.dumps({"journal_id": journal_id}) + "\n").encode("utf-8")
+        # Snapshot first: a crash in between leaves an old journal whose id no longer matches
+        for path, body in ((self.path, snapshot), (self.journal_path, header)):
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        self._snapshot_bytes = len(snapshot)
+        self._journal_bytes = len(header)
+        self._journal_ops = 0
+        self.bytes_written += len(snapshot) + len(header)
+
+    def save_transcript(self, display):
+        """Append the chat display's text added since the last call to the
+        .txt transcript. A left-gravity Tk mark records how far has been
+        written. The file is rewritten on this store's first call, and when
+        the display was cleared since (the mark has collapsed to the start)."""
+        mark = self.TRANSCRIPT_MARK
+        rewrite = not self._transcript_started or display.compare(mark, "==", "1.0")
+        text = display.get("1.0" if rewrite else mark, "end-1c")
+        if rewrite or text:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.txt_path, "w" if rewrite else "a", encoding="utf-8") as f:
+                f.write(text)
+            self.bytes_written += len(text)
+        display.mark_set(mark, "end-1c")
+        display.mark_gravity(mark, "left")
+        self._transcript_started = True
+
+    @staticmethod
+    def load(path):
+        """Read a saved chat: the snapshot with its journal replayed. A torn
+        last journal line (a crash mid-write) ends the replay."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        try:
+            with open(os.path.splitext(path)[0] + ".jsonl", "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return data
+        try:
+            header = json.loads(lines[0]) if lines else {}
+        except ValueError:
+            return data
+        if not data.get("journal_id") or header.get("journal_id") != data["journal_id"]:
+            return data
+        messages = data.setdefault("messages", [])
+        for line in lines[1:]:
+            try:
+                op = json.loads(line)
+            except ValueError:
+                break
+            if "meta" in op:
+                data.update(op["meta"])
+            elif op.get("seq", -1) < len(messages):
+                messages[op["seq"]] = op["message"]
+            elif op["seq"] == len(messages):
+                messages.append(op["message"])
+            else:
+                break
+        return data
+
+
+# ── Chat Search ─────────────────────────────────────────────────────────────
+
+_SEARCH_WORD_RE = re.compile(r"\w+")
+_SEARCH_PLACEHOLDERS = ("[Screenshot]", "[Image was attached]")
+
+
+def _search_tokens(text):
+    """Lowercased word tokens, as indexed and queried by _ChatSearchIndex."""
+    return _SEARCH_WORD_RE.findall(text.lower())
+
+
+def _search_chats_call_ids(messages):
+    """The tool_use ids of search_chats calls in `messages`."""
+    ids = set()
+    for msg in messages:
+        content = msg.get("content") if isinstance(msg, dict) else None
+        for block in content if isinstance(content, list) else ():
+            if isinstance(block, dict) and block.get("type") == "tool_use" and block.get("name") == "search_chats":
+                ids.add(block.get("id"))
+    return ids
+
+
+def _chat_message_text(msg, skip_ids=frozenset()):
+    """The searchable text of a saved message: its text, tool calls (name and
+    input) and tool results. Image placeholders are left out, and so are
+    search_chats calls and their results (ids in `skip_ids`), so earlier
+    search output is not found again as if it were prior work."""
+    content = msg.get("content", "") if isinstance(msg, dict) else ""
+    if isinstance(content, str):
+        return content[:CHAT_SEARCH_MAX_DOC_CHARS]
+    parts = []
+    for block in content if isinstance(content, list) else ():
+        if not isinstance(block, dict):
+            continue
+        kind = block.get("type")
+        if kind == "text":
+            parts.append(block.get("text", ""))
+        elif kind == "tool_use":
+            if block.get("name") != "search_chats":
+                parts.append(f"{block.get('name', '')} {json.dumps(block.get('input', {}), ensure_ascii=False)}")
+        elif kind == "tool_result" and block.get("tool_use_id") not in skip_ids:
+            inner = block.get("content", "")
+            if isinstance(inner, list):
+                parts.extend(b.get("text", "") for b in inner if isinstance(b, dict) and b.get("type") == "text")
+            else:
+                parts.append(str(inner))
+    return "\n".join(p for p in parts if p and p not in _SEARCH_PLACEHOLDERS)[:CHAT_SEARCH_MAX_DOC_CHARS]
+
+
+def _parse_chat_query(query):
+    """Split a query into its words and its "quoted phrases" (as token lists)."""
+    phrases = [toks for toks in (_search_tokens(p) for p in re.findall(r'"([^"]*)"', query)) if toks]
+    return _search_tokens(query), phrases
+
+
+def _parse_date_bound(text, end=False):
+    """Epoch seconds of the start (or with end=True, the end) of a
+    YYYY-MM-DD day in local time; None for an empty value. Raises ValueError."""
+    text = (text or "").strip()
+    if not text:
+        return None
+    day = time.mktime(time.strptime(text, "%Y-%m-%d"))
+    return day + 86400 if end else day
+
+
+class _ChatSearchIndex:
+    """Full-text index over saved_chats/ for the search_chats tool and the
+    Search Chats dialog. Every saved message with text is one document;
+    `postings` maps each term to {doc id: term frequency} and queries are
+    ranked with BM25. Quoted phrases must appear in a message word for word.
+    Results can be limited to chats by model and by last-saved date.
+
+    The index is incremental. update() re-tokenises only the messages of a
+    chat whose text changed (the chat save path calls it with what it just
+    wrote), and refresh() re-reads only chats whose .json or .jsonl changed
+    since they were indexed, so chats saved by SelfBot or another instance
+    are picked up too. The index is pickled to CHAT_INDEX_FILE, so after a
+    restart only chats saved in the meantime are read again."""
+
+    def __init__(self, path=CHAT_INDEX_FILE, directory=CHATS_DIR):
+        self.path = path
+        self.directory = directory
+        self._chats = {}         # chat file name -> {"name", "model", "mtime", "signature", "docs"}
+        self._docs = {}          # doc id -> (chat file name, message index, role, text)
+        self._lengths = {}       # doc id -> length in tokens
+        self._postings = {}      # term -> {doc id: term frequency}
+        self._total_len = 0
+        self._next_id = 0
+        self._loaded = False
+        self._dirty = False
+        self._lock = threading.Lock()           # guards the index structures
+        self._refresh_lock = threading.Lock()   # one refresh() at a time
+        self._indexer = None     # background refresh thread
+
+    # -- persistence ----------------------------------------------------------
+
+    def _ensure_loaded(self):
+        """Read the pickled index once. Call with _lock held."""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return
+        if not isinstance(state, dict) or state.get("version") != CHAT_INDEX_VERSION:
+            return
+        self._chats, self._docs, self._lengths, self._postings = (
+            state["chats"], state["docs"], state["lengths"], state["postings"])
+        self._total_len, self._next_id = state["total_len"], state["next_id"]
+
+    def save(self):
+        """Write the index to CHAT_INDEX_FILE if it changed since the last save."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = pickle.dumps({
+                "version": CHAT_INDEX_VERSION, "chats": self._chats, "docs": self._docs,
+                "lengths": self._lengths, "postings": self._postings,
+                "total_len": self._total_len, "next_id": self._next_id,
+            }, protocol=pickle.HIGHEST_PROTOCOL)
+            self._dirty = False
+        try:
+            with open(self.path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError:
+            pass
+
+    # -- indexing -------------------------------------------------------------
+
+    def _signature(self, fname):
+        """[mtime_ns, size] of the chat's snapshot and journal."""
+        sig = []
+        for key in (fname, fname[:-5] + ".jsonl"):
+            try:
+                st = os.stat(os.path.join(self.directory, key))
+                sig += [st.st_mtime_ns, st.st_size]
+            except OSError:
+                sig += [0, 0]
+        return sig
+
+    def _add_doc(self, fname, seq, role, text):
+        tokens = _search_tokens(text)
+        if not tokens:
+            return None
+        doc_id = self._next_id
+        self._next_id += 1
+        self._docs[doc_id] = (fname, seq, role, text)
+        self._lengths[doc_id] = len(tokens)
+        self._total_len += len(tokens)
+        postings = self._postings
+        for token in tokens:
+            entry = postings.get(token)
+            if entry is None:
+                postings[token] = {doc_id: 1}
+            else:
+                entry[doc_id] = entry.get(doc_id, 0) + 1
+        return doc_id
+
+    def _remove_doc(self, doc_id):
+        text = self._docs.pop(doc_id)[3]
+        self._total_len -= self._lengths.pop(doc_id)
+        for token in set(_search_tokens(text)):
+            entry = self._postings.get(token)
+            if entry is not None:
+                entry.pop(doc_id, None)
+                if not entry:
+                    del self._postings[token]
+
+    def _apply(self, fname, name, model, signature, messages):
+        """Index `messages` as the chat `fname`, reusing the documents of
+        messages whose role and text are unchanged. Call with _lock held."""
+        chat = self._chats.get(fname)
+        old = chat["docs"] if chat else []
+        docs = []
+        skip_ids = _search_chats_call_ids(messages)
+        for seq, msg in enumerate(messages):
+            role = msg.get("role", "") if isinstance(msg, dict) else ""
+            text = _chat_message_text(msg, skip_ids)
+            doc_id = old[seq] if seq < len(old) else None
+            if doc_id is not None:
+                if self._docs[doc_id][2:] == (role, text):
+                    docs.append(doc_id)
+                    continue
+                self._remove_doc(doc_id)
+            docs.append(self._add_doc(fname, seq, role, text) if text else None)
+        for doc_id in old[len(messages):]:
+            if doc_id is not None:
+                self._remove_doc(doc_id)
+        self._chats[fname] = {"name": name, "model": model or "", "signature": signature,
+                              "mtime": max(signature[0], signature[2]) / 1e9, "docs": docs}
+        self._dirty = True
+
+    def _forget(self, fname):
+        chat = self._chats.pop(fname, None)
+        if chat is not None:
+            for doc_id in chat["docs"]:
+                if doc_id is not None:
+                    self._remove_doc(doc_id)
+            self._dirty = True
+
+    def update(self, store, model):
+        """Index a chat just saved through `store` without re-reading it."""
+        fname = os.path.basename(store.path)
+        signature = self._signature(fname)
+        with self._lock:
+            self._ensure_loaded()
+            self._apply(fname, store.name, model, signature, store.saved_messages)
+
+    def refresh(self, persist=False):
+        """Bring the index up to date with saved_chats/ (one scandir, then
+        only changed chats are read); returns the chat count. Searches leave
+        persist off so they never pay for pickling the index; the background
+        indexer and close save it."""
+        with self._refresh_lock:
+            with self._lock:
+                self._ensure_loaded()
+                known = {fname: chat["signature"] for fname, chat in self._chats.items()}
+            try:
+                with os.scandir(self.directory) as it:
+                    stats = {e.name: e.stat() for e in it
+                             if e.name.endswith((".json", ".jsonl")) and e.is_file()}
+            except OSError:
+                stats = {}
+            for fname in stats:
+                if not fname.endswith(".json"):
+                    continue
+                sig = []
+                for key in (fname, fname[:-5] + ".jsonl"):
+                    st = stats.get(key)
+                    sig += [st.st_mtime_ns, st.st_size] if st is not None else [0, 0]
+                if known.get(fname) == sig:
+                    continue
+                try:
+                    data = _ChatStore.load(os.path.join(self.directory, fname))
+                except (OSError, ValueError):
+                    data = None
+                with self._lock:
+                    if isinstance(data, dict) and isinstance(data.get("messages"), list):
+                        self._apply(fname, data.get("name", fname[:-5]), data.get("model", ""),
+                                    sig, data["messages"])
+                    else:
+                        self._forget(fname)
+            with self._lock:
+                for fname in [f for f in self._chats if f not in stats]:
+                    self._forget(fname)
+                count = len(self._chats)
+            if persist:
+                self.save()
+            return count
+
+    def start_refresh(self):
+        """refresh() and save on a background thread, unless one is already running."""
+        if self._indexer is not None and self._indexer.is_alive():
+            return
+        self._indexer = threading.Thread(target=self.refresh, kwargs={"persist": True},
+                                         name="chat-indexer", daemon=True)
+        self._indexer.start()
+
+    @property
+    def indexing(self):
+        return self._indexer is not None and self._indexer.is_alive()
+
+    # -- queries --------------------------------------------------------------
+
+    def models(self):
+        with self._lock:
+            self._ensure_loaded()
+            return sorted({chat["model"] for chat in self._chats.values() if chat["model"]})
+
+    def search(self, query, model=None, since=None, until=None,
+               limit=CHAT_SEARCH_MAX_RESULTS, exclude=None):
+        """Rank messages against `query` with BM25. Returns (total matches,
+        chats indexed, top `limit` results as dicts). `model` matches chats
+        whose model contains it; `since` / `until` bound the chat's
+        last-saved time (epoch seconds); the chat file `exclude` is left out."""
+        terms, phrases = _parse_chat_query(query)
+        with self._lock:
+            self._ensure_loaded()
+            n_chats = len(self._chats)
+            if not terms or not self._docs:
+                return 0, n_chats, []
+            allowed = None
+            if model or since is not None or until is not None or exclude:
+                model = (model or "").lower()
+                allowed = {fname for fname, chat in self._chats.items()
+                           if fname != exclude and model in chat["model"].lower()
+                           and (since is None or chat["mtime"] >= since)
+                           and (until is None or chat["mtime"] < until)}
+            docs, lengths, postings = self._docs, self._lengths, self._postings
+            n_docs = len(docs)
+            avgdl = self._total_len / n_docs
+            k1, b = CHAT_SEARCH_K1, CHAT_SEARCH_B
+
+            candidates = None
+            if phrases:
+                # Documents holding every phrase word, then checked word for word
+                for term in sorted({t for phrase in phrases for t in phrase},
+                                   key=lambda t: len(postings.get(t, ()))):
+                    ids = postings.get(term, {}).keys()
+                    candidates = set(ids) if candidates is None else candidates & ids
+                    if not candidates:
+                        return 0, n_chats, []
+                needles = [re.compile(r"(?<!\w)" + r"\W+".join(map(re.escape, p)) + r"(?!\w)", re.IGNORECASE)
+                           for p in phrases]
+                candidates = {d for d in candidates
+                              if (allowed is None or docs[d][0] in allowed)
+                              and all(n.search(docs[d][3]) for n in needles)}
+
+            scores = {}
+            for term in set(terms):
+                entry = postings.get(term)
+                if not entry:
+                    continue
+                idf = math.log(1 + (n_docs - len(entry) + 0.5) / (len(entry) + 0.5))
+                if candidates is not None:
+                    pairs = ((d, entry[d]) for d in candidates if d in entry)
+                else:
+                    pairs = entry.items()
+                for doc_id, tf in pairs:
+                    if allowed is not None and candidates is None and docs[doc_id][0] not in allowed:
+                        continue
+                    norm = k1 * (1 - b + b * lengths[doc_id] / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+            top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            results = []
+            for doc_id, score in top:
+                fname, seq, role, text = docs[doc_id]
+                chat = self._chats[fname]
+                results.append({
+                    "file": fname, "name": chat["name"], "model": chat["model"],
+                    "mtime": chat["mtime"], "seq": seq, "role": role, "score": score,
+                    "text": text, "snippet": self._snippet(text, terms, phrases),
+                })
+            return len(scores), n_chats, results
+
+    @staticmethod
+    def _snippet(text, terms, phrases):
+        """About CHAT_SEARCH_SNIPPET_CHARS of `text` around its first phrase
+        match, or else its first query word."""
+        match = None
+        for words in ([r"\W+".join(map(re.escape, p)) for p in phrases], [re.escape(t) for t in terms]):
+            if words and match is None:
+                match = re.search(r"(?<!\w)(?:" + "|".join(words) + r")(?!\w)", text, re.IGNORECASE)
+        start = max(0, (match.start() if match else 0) - CHAT_SEARCH_SNIPPET_CHARS // 3)
+        snippet = " ".join(text[start:start + CHAT_SEARCH_SNIPPET_CHARS].split())
+        if start:
+            snippet = "…" + snippet
+        if start + CHAT_SEARCH_SNIPPET_CHARS < len(text):
+            snippet += "…"
+        return snippet
+
+
+# ── CSV Index ───────────────────────────────────────────────────────────────
+
+def _sniff_delimiter(sample):
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=',\t|;').delimiter
+    except csv.Error:
+        return ','
+
+
+def _csv_lines(f, offsets):
+    """Yield decoded lines from a binary file, appending each line's byte
+    offset to `offsets` so csv.reader records can be located again with
+    seek(). Callers clear the list per record to keep memory flat."""
+    first = True
+    while True:
+        pos = f.tell()
+        line = f.readline()
+        if not line:
+            return
+        offsets.append(pos)
+        if first:
+            line = line.removeprefix(b"\xef\xbb\xbf")
+            first = False
+        yield line.decode("utf-8")
+
+
+def _csv_records(f, delimiter):
+    """Return (headers, records) for a binary file at its start. `records`
+    yields (byte offset, row) for every non-empty data row."""
+    marks = []
+    reader = csv.reader(_csv_lines(f, marks), delimiter=delimiter)
+    headers = next(reader, None) or []
+
+    def records():
+        for row in reader:
+            start = marks[0]
+            marks.clear()
+            if row:
+                yield start, row
+
+    marks.clear()
+    return headers, records()
+
+
+def _read_csv_records(path, delimiter, offsets, row_ids):
+    """Lazily re-read the raw records (lists of cells) at the given row ids."""
+    with open(path, "rb") as f:
+        for row_id in row_ids:
+            f.seek(int(offsets[row_id]))
+            reader = csv.reader(_csv_lines(f, []), delimiter=delimiter)
+            yield next(reader, [])
+
+
+def _read_csv_rows(path, delimiter, headers, offsets, row_ids):
+    """Re-read the original records at the given row ids as dicts."""
+    # Missing trailing cells read as None, as csv.DictReader reports them
+    return [dict(zip(headers, row + [None] * (len(headers) - len(row))))
+            for row in _read_csv_records(path, delimiter, offsets, row_ids)]
+
+
+class _CsvIndex:
+    """Sidecar index over one delimited file, built in a single pass.
+
+    Per column it keeps a dictionary-encoded, lowercased column store:
+    `keys` holds the sorted distinct lowercased values, `codes` the key id
+    of every row, `postings` the sorted row ids for every key (inverted
+    index for exact and starts_with) and `grams` maps each trigram to the
+    key ids containing it (n-gram index for contains). `offsets` holds the
+    byte offset of every record so matching rows are re-read from the file
+    instead of kept in memory. Pickled to CSV_INDEX_DIR and invalidated
+    when the source file's size or mtime changes.
+
+    A column with nearly one value per row (ids, emails, amounts) would
+    need an array per row and a trigram list per value, so past
+    CSV_INDEX_MAX_KEY_RATIO its postings and grams are None: its keys are
+    still matched, and `codes` is scanned for the rows holding them."""
+
+    def __init__(self, path, delimiter, size, mtime_ns):
+        self.version = CSV_INDEX_VERSION
+        self.path = path
+        self.delimiter = delimiter
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.headers = []
+        self.offsets = array("Q")
+        self.keys = []
+        self.codes = []
+        self.postings = []
+        self.grams = []
+        self._key_ids = None
+
+    # -- build / persist ----------------------------------------------------
+
+    @classmethod
+    def build(cls, path, delimiter=None):
+        st = os.stat(path)
+        with open(path, "rb") as f:
+            if delimiter is None:
+                delimiter = _sniff_delimiter(f.read(8192).decode("utf-8-sig", errors="ignore"))
+                f.seek(0)
+            index = cls(path, delimiter, st.st_size, st.st_mtime_ns)
+            index.headers, records = _csv_records(f, delimiter)
+            n_cols = len(index.headers)
+            distinct = [{} for _ in range(n_cols)]   # lowercased value -> provisional id
+            raw_codes = [array("I") for _ in range(n_cols)]
+            for start, row in records:
+                index.offsets.append(start)
+                for c in range(n_cols):
+                    value = row[c].lower() if c < len(row) else ""
+                    ids = distinct[c]
+                    code = ids.get(value)
+                    if code is None:
+                        code = ids[value] = len(ids)
+                    raw_codes[c].append(code)
+
+        for c in range(n_cols):
+            # Renumber keys in sorted order so starts_with is a bisect range
+            keys = sorted(distinct[c])
+            remap = array("I", [0]) * len(keys)
+            for new_id, key in enumerate(keys):
+                remap[distinct[c][key]] = new_id
+            codes = array("I", (remap[code] for code in raw_codes[c]))
+            postings = grams = None
+            if len(keys) <= max(CSV_INDEX_MIN_KEYS, CSV_INDEX_MAX_KEY_RATIO * len(codes)):
+                postings = [array("I") for _ in keys]
+                for row_id, code in enumerate(codes):
+                    postings[code].append(row_id)
+                grams = {}
+                for key_id, key in enumerate(keys):
+                    for gram in {key[i:i + CSV_NGRAM] for i in range(len(key) - CSV_NGRAM + 1)}:
+                        grams.setdefault(gram, array("I")).append(key_id)
+            index.keys.append(keys)
+            index.codes.append(codes)
+            index.postings.append(postings)
+            index.grams.append(grams)
+        return index
+
+    @staticmethod
+    def sidecar_path(path, delimiter):
+        digest = hashlib.sha1(f"{os.path.abspath(path)}|{delimiter}".encode("utf-8")).hexdigest()
+        return os.path.join(CSV_INDEX_DIR, digest + ".idx")
+
+    def is_current(self, st):
+        return self.size == st.st_size and self.mtime_ns == st.st_mtime_ns
+
+    @classmethod
+    def load(cls, path, delimiter):
+        try:
+            with open(cls.sidecar_path(path, delimiter), "rb") as f:
+                index = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return None
+        if getattr(index, "version", None) != CSV_INDEX_VERSION:
+            return None
+        return index
+
+    def save(self, requested_delimiter):
+        try:
+            os.makedirs(CSV_INDEX_DIR, exist_ok=True)
+            target = self.sidecar_path(self.path, requested_delimiter)
+            with open(target + ".tmp", "wb") as f:
+                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(target + ".tmp", target)
+        except OSError:
+            pass
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_key_ids"] = None
+        return state
+
+    # -- query --------------------------------------------------------------
+
+    def _matching_keys(self, col, needle, mode):
+        keys = self.keys[col]
+        if mode == "exact":
+            if self._key_ids is None:
+                self._key_ids = [None] * len(self.keys)
+            if self._key_ids[col] is None:
+                self._key_ids[col] = {k: i for i, k in enumerate(keys)}
+            key_id = self._key_ids[col].get(needle)
+            return [] if key_id is None else [key_id]
+        if mode == "starts_with":
+            lo = bisect.bisect_left(keys, needle)
+            hi = lo
+            while hi < len(keys) and keys[hi].startswith(needle):
+                hi += 1
+            return range(lo, hi)
+        # contains
+        grams = self.grams[col]
+        if len(needle) < CSV_NGRAM or grams is None:
+            return [i for i, k in enumerate(keys) if needle in k]
+        lists = []
+        for gram in {needle[i:i + CSV_NGRAM] for i in range(len(needle) - CSV_NGRAM + 1)}:
+            ids = grams.get(gram)
+            if ids is None:
+                return []
+            lists.append(ids)
+        lists.sort(key=len)
+        candidates = set(lists[0])
+        for ids in lists[1:]:
+            candidates.intersection_update(ids)
+            if not candidates:
+                return []
+        return [i for i in candidates if needle in keys[i]]
+
+    def match_rows(self, needle, columns, mode, limit):
+        """Row ids (in file order) of the first `limit` rows where any of
+        `columns` matches the lowercased needle."""
+        streams = []
+        for col in columns:
+            key_ids = self._matching_keys(col, needle, mode)
+            if self.postings[col] is not None:
+                streams.extend(self.postings[col][k] for k in key_ids)
+            elif key_ids:
+                streams.append(self._scan_codes(self.codes[col], key_ids))
+        rows = []
+        last = -1
+        for row_id in heapq.merge(*streams):
+            if row_id != last:
+                rows.append(row_id)
+                last = row_id
+                if len(rows) >= limit:
+                    break
+        return rows
+
+    @staticmethod
+    def _scan_codes(codes, key_ids):
+        """Yield, in file order, the rows whose value id is in `key_ids` (for
+        a column without postings). A single id is found with array.index,
+        which scans in C."""
+        if len(key_ids) == 1:
+            key = key_ids[0]
+            row_id = -1
+            while True:
+                try:
+                    row_id = codes.index(key, row_id + 1)
+                except ValueError:
+                    return
+                yield row_id
+        wanted = set(key_ids)
+        for row_id, code in enumerate(codes):
+            if code in wanted:
+                yield row_id
+
+    def read_rows(self, row_ids):
+        return _read_csv_rows(self.path, self.delimiter, self.headers, self.offsets, row_ids)
+
+
+class _CsvColumns:
+    """Columnar csv_search engine for big files (needs NumPy).
+
+    Each column is stored Arrow-style in CSV_INDEX_DIR: one contiguous
+    UTF-8 buffer of lowercased values, each preceded by a NUL separator
+    and closed by a final NUL, plus an int64 array of value start offsets.
+    Buffers and offset arrays are memory-mapped rather than read into
+    Python objects. A search scans the whole column buffer in C via
+    mmap.find for b"\\0value\\0" (exact), b"\\0value" (starts_with) or the
+    bare value (contains). Each hit is mapped back to a row ordinal with
+    np.searchsorted over the offsets. Hits come out in file order, so a
+    column scan stops as soon as it has `limit` rows."""
+
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.path = meta["path"]
+        self.delimiter = meta["delimiter"]
+        self.headers = meta["headers"]
+        self.rows = meta["rows"]
+        self.size = meta["size"]
+        self.mtime_ns = meta["mtime_ns"]
+        self._files = []
+        self.buffers = []
+        self.value_offsets = []
+        for c in range(len(self.headers)):
+            f = open(os.path.join(directory, f"c{c}.bin"), "rb")
+            self._files.append(f)
+            self.buffers.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            self.value_offsets.append(
+                np.memmap(os.path.join(directory, f"c{c}.off"), dtype=np.int64, mode="r"))
+        self.offsets = (np.memmap(os.path.join(directory, "rows.off"), dtype=np.int64, mode="r")
+                        if self.rows else np.zeros(0, dtype=np.int64))
+
+    @staticmethod
+    def directory_for(path, delimiter, st):
+        digest = hashlib.sha1(f"{os.path.abspath(path)}|{delimiter}".encode("utf-8")).hexdigest()
+        return os.path.join(CSV_INDEX_DIR, f"{digest}-{st.st_size}-{st.st_mtime_ns}.cols")
+
+    def is_current(self, st):
+        return self.size == st.st_size and self.mtime_ns == st.st_mtime_ns
+
+    @classmethod
+    def load(cls, path, delimiter, st=None):
+        """The column store for the file's current size/mtime, or None if
+        it has not been built."""
+        directory = cls.directory_for(path, delimiter, st or os.stat(path))
+        try:
+            with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") == CSV_INDEX_VERSION:
+                return cls(directory, meta)
+        except (OSError, ValueError):
+            pass
+        return None
+
+    @classmethod
+    def open(cls, path, delimiter):
+        """Load the column store for the file's current size/mtime, building
+        it first if needed. Stores for older versions of the file are removed."""
+        st = os.stat(path)
+        columns = cls.load(path, delimiter, st)
+        if columns is not None:
+            return columns
+        directory = cls.directory_for(path, delimiter, st)
+        meta_path = os.path.join(directory, "meta.json")
+        prefix = os.path.basename(directory).split("-", 1)[0] + "-"
+        if os.path.isdir(CSV_INDEX_DIR):
+            for name in os.listdir(CSV_INDEX_DIR):
+                if name.startswith(prefix) and name.endswith(".cols"):
+                    shutil.rmtree(os.path.join(CSV_INDEX_DIR, name), ignore_errors=True)
+        cls.build(path, delimiter, directory, st)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return cls(directory, json.load(f))
+
+    @staticmethod
+    def build(path, delimiter, directory, st):
+        tmp_dir = directory + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        flush_every = 65536
+        with open(path, "rb") as f:
+            sniffed = delimiter
+            if sniffed is None:
+                sniffed = _sniff_delimiter(f.read(8192).decode("utf-8-sig", errors="ignore"))
+                f.seek(0)
+            headers, records = _csv_records(f, sniffed)
+            n_cols = len(headers)
+            bin_files = [open(os.path.join(tmp_dir, f"c{c}.bin"), "wb") for c in range(n_cols)]
+            off_files = [open(os.path.join(tmp_dir, f"c{c}.off"), "wb") for c in range(n_cols)]
+            rows_file = open(os.path.join(tmp_dir, "rows.off"), "wb")
+            try:
+                positions = [0] * n_cols
+                chunks = [[] for _ in range(n_cols)]
+                col_offsets = [array("q") for _ in range(n_cols)]
+                row_offsets = array("q")
+                n_rows = 0
+                for start, row in records:
+                    row_offsets.append(start)
+                    for c in range(n_cols):
+                        value = b"\0" + (row[c].lower().replace("\0", "").encode("utf-8") if c < len(row) else b"")
+                        col_offsets[c].append(positions[c])
+                        positions[c] += len(value)
+                        chunks[c].append(value)
+                    n_rows += 1
+                    if n_rows % flush_every == 0:
+                        rows_file.write(row_offsets.tobytes())
+                        del row_offsets[:]
+                        for c in range(n_cols):
+                            bin_files[c].write(b"".join(chunks[c]))
+                            off_files[c].write(col_offsets[c].tobytes())
+                            chunks[c].clear()
+                            del col_offsets[c][:]
+                rows_file.write(row_offsets.tobytes())
+                for c in range(n_cols):
+                    # Closing NUL terminates the last value; its offset closes the last row
+                    chunks[c].append(b"\0")
+                    col_offsets[c].append(positions[c])
+                    bin_files[c].write(b"".join(chunks[c]))
+                    off_files[c].write(col_offsets[c].tobytes())
+            finally:
+                for fh in (*bin_files, *off_files, rows_file):
+                    fh.close()
+        meta = {
+            "version": CSV_INDEX_VERSION, "path": path, "delimiter": sniffed,
+            "headers": headers, "rows": n_rows, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_dir, directory)
+
+    def close(self):
+        """Unmap the column buffers now. Only for an owner sure no search is
+        still using them; otherwise dropping the last reference closes them."""
+        for buf in self.buffers:
+            buf.close()
+        for f in self._files:
+            f.close()
+        self.buffers, self._files, self.value_offsets = [], [], []
+
+    def scan_column(self, col, needle, mode, limit=None):
+        """Row ordinals (ascending) where column `col` matches; at most `limit`."""
+        if limit is None:
+            limit = self.rows
+        needle = needle.encode("utf-8")
+        if not needle and mode != "exact":
+            return np.arange(min(limit, self.rows), dtype=np.int64)
+        if mode == "exact":
+            pattern = b"\0" + needle + b"\0"
+        elif mode == "starts_with":
+            pattern = b"\0" + needle
+        else:
+            pattern = needle
+        buf = self.buffers[col]
+        offsets = self.value_offsets[col]
+        found = []
+        count = 0
+        pos = 0
+        while count < limit:
+            # Collect a batch of raw hits in C, then map them to rows in one searchsorted
+            batch = []
+            while len(batch) < CSV_SCAN_BATCH:
+                p = buf.find(pattern, pos)
+                if p < 0:
+                    break
+                batch.append(p)
+                pos = p + 1
+            if not batch:
+                break
+            rows = np.unique(np.searchsorted(offsets, np.asarray(batch, dtype=np.int64), side="right") - 1)
+            if found and found[-1][-1] == rows[0]:
+                rows = rows[1:]
+            if rows.size:
+                found.append(rows)
+                count += rows.size
+                # Resume at the next value instead of re-finding inside this one
+                pos = max(pos, int(offsets[rows[-1] + 1]))
+            if len(batch) < CSV_SCAN_BATCH:
+                break
+        return np.concatenate(found)[:limit] if found else np.zeros(0, dtype=np.int64)
+
+    def match_rows(self, needle, columns, mode, limit):
+        """Row ids (in file order) of the first `limit` rows where any of
+        `columns` matches the lowercased needle."""
+        per_column = [self.scan_column(col, needle, mode, limit) for col in columns]
+        if not per_column:
+            return []
+        return np.unique(np.concatenate(per_column))[:limit].tolist()
+
+    def read_rows(self, row_ids):
+        return _read_csv_rows(self.path, self.delimiter, self.headers, self.offsets, row_ids)
+
+
+class _CsvStream:
+    """Index-less stand-in for the engines above: just the file's headers
+    and delimiter, so a query falls back to one streaming pass. Used by
+    multi-file searches for files that have not been indexed yet."""
+
+    offsets = None
+
+    def __init__(self, path, delimiter=None):
+        self.path = path
+        with open(path, "rb") as f:
+            if delimiter is None:
+                delimiter = _sniff_delimiter(f.read(8192).decode("utf-8-sig", errors="ignore"))
+                f.seek(0)
+            self.headers, _ = _csv_records(f, delimiter)
+        self.delimiter = delimiter
+
+
+def _open_csv_engine(path, delimiter):
+    """The best engine for `path` without building anything: its current
+    _CsvIndex sidecar or _CsvColumns store if either exists, else a
+    _CsvStream."""
+    st = os.stat(path)
+    index = _CsvIndex.load(path, delimiter)
+    if index is not None and index.is_current(st):
+        return index
+    if np is not None and st.st_size >= CSV_COLUMNAR_MIN_BYTES:
+        columns = _CsvColumns.load(path, delimiter, st)
+        if columns is not None:
+            return columns
+    return _CsvStream(path, delimiter)
+
+
+# ── CSV Query ───────────────────────────────────────────────────────────────
+
+CSV_QUERY_AGGREGATES = ("COUNT", "SUM", "AVG", "MIN", "MAX")
+_CSV_QUERY_CLAUSES = ("SELECT", "WHERE", "GROUP", "ORDER", "LIMIT")
+_CSV_QUERY_TOKEN = re.compile(r"""\s*(?:
+      (?P<str>'(?:[^']|'')*')
+    | (?P<ident>"(?:[^"]|"")*"|`[^`]*`)
+    | (?P<num>-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)(?![\w.@-])
+    | (?P<op><=|>=|!=|<>|==|=|<|>|\(|\)|,|\*)
+    | (?P<word>[^\s'"`(),=<>!*]+)
+)""", re.VERBOSE)
+_CSV_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_CSV_COMPARE = {
+    "=": lambda a, b: a == b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+def _csv_number(value):
+    """Parse a cell such as "1,234.50", "$12" or "-3e2" as a float; None if
+    it is not a number."""
+    text = value.strip().replace(",", "") if value else ""
+    if text[:1] in ("$", "€", "£"):
+        text = text[1:]
+    return float(text) if _CSV_NUMBER.fullmatch(text) else None
+
+
+def _csv_sort_key(value):
+    """Numbers sort numerically ahead of text; empty cells sort last."""
+    if value is None or value == "":
+        return (2, 0.0, "")
+    if isinstance(value, (int, float)):
+        return (0, float(value), "")
+    number = _csv_number(value)
+    return (0, number, "") if number is not None else (1, 0.0, value.lower())
+
+
+def _csv_format_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        if value.is_integer() and abs(value) < 1e15:
+            return str(int(value))
+        return repr(round(value, 6))
+    return str(value)
+
+
+class _CsvSortKey:
+    """Multi-column ORDER BY key with a direction per column. Empty cells
+    stay last in both directions."""
+
+    __slots__ = ("parts", "descending")
+
+    def __init__(self, parts, descending):
+        self.parts = parts
+        self.descending = descending
+
+    def __lt__(self, other):
+        for a, b, desc in zip(self.parts, other.parts, self.descending):
+            if a == b:
+                continue
+            if a[0] == 2 or b[0] == 2:
+                return b[0] == 2
+            return a > b if desc else a < b
+        return False
+
+
+class _CsvAggregate:
+    """Running COUNT/SUM/AVG/MIN/MAX of one column within one group. SUM and
+    AVG skip cells that are not numbers; MIN and MAX compare as text when the
+    column holds any non-numeric value."""
+
+    __slots__ = ("func", "col", "count", "total", "low", "high", "text_low", "text_high", "numeric")
+
+    def __init__(self, func, col):
+        self.func = func
+        self.col = col            # None for COUNT(*)
+        self.count = 0
+        self.total = 0.0
+        self.low = self.high = None
+        self.text_low = self.text_high = None
+        self.numeric = True
+
+    def add(self, row):
+        if self.col is None:
+            self.count += 1
+            return
+        value = row[self.col] if self.col < len(row) else ""
+        if value == "":
+            return
+        if self.func == "COUNT":
+            self.count += 1
+            return
+        number = _csv_number(value)
+        if self.func in ("MIN", "MAX"):
+            if number is None:
+                self.numeric = False
+            else:
+                self.low = number if self.low is None else min(self.low, number)
+                self.high = number if self.high is None else max(self.high, number)
+            self.text_low = value if self.text_low is None else min(self.text_low, value)
+            self.text_high = value if self.text_high is None else max(self.text_high, value)
+        elif number is not None:
+            self.count += 1
+            self.total += number
+
+    def merge(self, other):
+        """Fold in the same aggregate computed over another file."""
+        self.count += other.count
+        self.total += other.total
+        for attr, pick in (("low", min), ("high", max), ("text_low", min), ("text_high", max)):
+            mine, theirs = getattr(self, attr), getattr(other, attr)
+            if theirs is not None:
+                setattr(self, attr, theirs if mine is None else pick(mine, theirs))
+        self.numeric = self.numeric and other.numeric
+
+    def result(self):
+        if self.func == "COUNT":
+            return self.count
+        if self.func == "SUM":
+            return self.total
+        if self.func == "AVG":
+            return self.total / self.count if self.count else None
+        if self.func == "MIN":
+            return self.low if self.numeric else self.text_low
+        return self.high if self.numeric else self.text_high
+
+
+class _CsvQuery:
+    """A csv_search `query`: a small SQL-like language run in one pass.
+
+        [SELECT col, ... | COUNT(*), SUM(col), AVG(col), MIN(col), MAX(col) [AS name]]
+        [WHERE expr] [GROUP BY col, ...] [ORDER BY col [ASC|DESC], ...] [LIMIT n]
+
+    `expr` combines predicates with AND, OR, NOT and parentheses:
+    `col = v`, `!=`, `<`, `<=`, `>`, `>=`, `BETWEEN a AND b`, `IN (a, b)`,
+    `CONTAINS v`, `STARTS WITH v`, `ENDS WITH v`, `LIKE 'a%b_'` and
+    `IS [NOT] EMPTY`. Text comparisons are case-insensitive. An unquoted
+    number compares numerically; a quoted value compares as text, which is
+    also what lets the index answer it. A query with no clause keyword is
+    taken as a WHERE expression. Column names with spaces go in "double
+    quotes" or `backticks`.
+
+    Parsing builds a predicate tree of tuples; execute() compiles it to
+    closures over raw csv.reader rows. Text predicates under AND/OR are
+    pushed down to the engine's match_rows, so a selective filter reads
+    only its candidate rows; otherwise the file is streamed once. Only
+    projected cells are kept, aggregates are folded as rows stream past,
+    and ORDER BY ... LIMIT keeps a bounded heap instead of sorting
+    everything."""
+
+    def __init__(self):
+        self.select = None      # None = every column, else [(func or None, column or None, name)]
+        self.where = None
+        self.group_by = []
+        self.order_by = []      # [(name, descending)]
+        self.limit = None
+
+    # -- parsing ------------------------------------------------------------
+
+    @classmethod
+    def parse(cls, text):
+        query = cls()
+        query._tokens = cls._tokenize(text)
+        query._pos = 0
+        if query._keyword("SELECT"):
+            query.select = query._parse_select()
+        if query._keyword("WHERE"):
+            query.where = query._parse_or()
+        elif query.select is None and query._peek() and not query._at_clause():
+            query.where = query._parse_or()
+        if query._keyword("GROUP"):
+            query._expect_keyword("BY")
+            query.group_by = query._parse_list(query._parse_column)
+        if query._keyword("ORDER"):
+            query._expect_keyword("BY")
+            query.order_by = query._parse_list(query._parse_order_item)
+        if query._keyword("LIMIT"):
+            token = query._next()
+            if token[0] != "num" or not token[1].isdigit():
+                raise ValueError("LIMIT needs a whole number")
+            query.limit = int(token[1])
+        if query._peek():
+            raise ValueError(f"Unexpected '{query._peek()[1]}'")
+        del query._tokens, query._pos
+        return query
+
+    @staticmethod
+    def _tokenize(text):
+        tokens = []
+        pos = 0
+        text = text.strip()
+        while pos < len(text):
+            m = _CSV_QUERY_TOKEN.match(text, pos)
+            if not m:
+                raise ValueError(f"Unexpected character at: {text[pos:pos + 20]!r}")
+            kind = m.lastgroup
+            value = m.group(kind)
+            if kind == "str":
+                value = value[1:-1].replace("''", "'")
+            elif kind == "ident":
+                value = value[1:-1].replace('""', '"')
+            tokens.append((kind, value))
+            pos = m.end()
+        return tokens
+
+    def _peek(self, ahead=0):
+        i = self._pos + ahead
+        return self._tokens[i] if i < len(self._tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise ValueError("Query ended unexpectedly")
+        self._pos += 1
+        return token
+
+    def _is_keyword(self, word, ahead=0):
+        token = self._peek(ahead)
+        return token is not None and token[0] == "word" and token[1].upper() == word
+
+    def _keyword(self, *words):
+        """Consume the keyword sequence if it is next; return whether it was."""
+        if all(self._is_keyword(w, i) for i, w in enumerate(words)):
+            self._pos += len(words)
+            return True
+        return False
+
+    def _expect_keyword(self, word):
+        if not self._keyword(word):
+            raise ValueError(f"Expected {word}")
+
+    def _expect_op(self, op):
+        token = self._next()
+        if token != ("op", op):
+            raise ValueError(f"Expected '{op}' but found '{token[1]}'")
+
+    def _at_clause(self):
+        return any(self._is_keyword(w) for w in _CSV_QUERY_CLAUSES)
+
+    def _parse_list(self, item):
+        items = [item()]
+        while self._peek() == ("op", ","):
+            self._pos += 1
+            items.append(item())
+        return items
+
+    def _parse_column(self):
+        kind, value = self._next()
+        if kind not in ("word", "ident"):
+            raise ValueError(f"Expected a column name but found '{value}'")
+        return value
+
+    def _parse_value(self):
+        kind, value = self._next()
+        if kind == "num":
+            return float(value)
+        if kind in ("str", "word"):
+            return value
+        raise ValueError(f"Expected a value but found '{value}'")
+
+    def _parse_aggregate(self):
+        """Parse FUNC(col) / COUNT(*) if it is next; return (func, column) or None."""
+        token = self._peek()
+        if not (token and token[0] == "word" and token[1].upper() in CSV_QUERY_AGGREGATES
+                and self._peek(1) == ("op", "(")):
+            return None
+        func = token[1].upper()
+        self._pos += 2
+        if self._peek() == ("op", "*"):
+            if func != "COUNT":
+                raise ValueError(f"{func}(*) is not supported; name a column")
+            self._pos += 1
+            column = None
+        else:
+            column = self._parse_column()
+        self._expect_op(")")
+        return func, column
+
+    def _parse_select(self):
+        if self._peek() == ("op", "*"):
+            self._pos += 1
+            return None
+
+        def item():
+            aggregate = self._parse_aggregate()
+            if aggregate:
+                func, column = aggregate
+                name = f"{func.lower()}({column or '*'})"
+            else:
+                func, column = None, self._parse_column()
+                name = column
+            if self._keyword("AS"):
+                name = self._parse_column()
+            return func, column, name
+
+        return self._parse_list(item)
+
+    def _parse_order_item(self):
+        aggregate = self._parse_aggregate()
+        if aggregate:
+            name = f"{aggregate[0].lower()}({aggregate[1] or '*'})"
+        else:
+            name = self._parse_column()
+        descending = False
+        if self._keyword("DESC"):
+            descending = True
+        else:
+            self._keyword("ASC")
+        return name, descending
+
+    def _parse_or(self):
+        nodes = [self._parse_and()]
+        while self._keyword("OR"):
+            nodes.append(self._parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def _parse_and(self):
+        nodes = [self._parse_not()]
+        while self._keyword("AND"):
+            nodes.append(self._parse_not())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def _parse_not(self):
+        if self._keyword("NOT"):
+            return ("not", self._parse_not())
+        if self._peek() == ("op", "("):
+            self._pos += 1
+            node = self._parse_or()
+            self._expect_op(")")
+            return node
+        return self._parse_predicate()
+
+    def _parse_predicate(self):
+        column = self._parse_column()
+        negate = self._keyword("NOT")
+        if self._keyword("BETWEEN"):
+            low = self._parse_value()
+            self._expect_keyword("AND")
+            node = ("and", [self._comparison(column, ">=", low), self._comparison(column, "<=", self._parse_value())])
+        elif self._keyword("IN"):
+            self._expect_op("(")
+            values = self._parse_list(self._parse_value)
+            self._expect_op(")")
+            node = ("or", [self._comparison(column, "=", v) for v in values])
+        elif self._keyword("CONTAINS"):
+            node = ("text", column, "contains", str(self._parse_text()).lower())
+        elif self._keyword("STARTS", "WITH"):
+            node = ("text", column, "starts_with", str(self._parse_text()).lower())
+        elif self._keyword("ENDS", "WITH"):
+            node = ("text", column, "ends_with", str(self._parse_text()).lower())
+        elif self._keyword("LIKE"):
+            pattern = "".join(".*" if ch == "%" else "." if ch == "_" else re.escape(ch)
+                              for ch in str(self._parse_text()))
+            node = ("like", column, re.compile(pattern, re.IGNORECASE | re.DOTALL))
+        elif not negate and self._keyword("IS"):
+            negate = self._keyword("NOT")
+            if not (self._keyword("EMPTY") or self._keyword("NULL")):
+                raise ValueError("Expected EMPTY after IS")
+            node = ("text", column, "exact", "")
+        elif not negate:
+            kind, op = self._next()
+            if kind != "op" or op not in ("=", "==", "!=", "<>", "<", "<=", ">", ">="):
+                raise ValueError(f"Expected a comparison after '{column}' but found '{op}'")
+            if op in ("!=", "<>"):
+                negate, op = True, "="
+            node = self._comparison(column, "=" if op == "==" else op, self._parse_value())
+        else:
+            raise ValueError("Expected BETWEEN, IN, CONTAINS or LIKE after NOT")
+        return ("not", node) if negate else node
+
+    def _parse_text(self):
+        """A value used as text, keeping a number's original spelling."""
+        kind, value = self._next()
+        if kind in ("str", "word", "num"):
+            return value
+        raise ValueError(f"Expected a value but found '{value}'")
+
+    @staticmethod
+    def _comparison(column, op, value):
+        if isinstance(value, float):
+            return ("num", column, op, value)
+        if op == "=":
+            return ("text", column, "exact", value.lower())
+        return ("str", column, op, value.lower())
+
+    def add_filter(self, column, match_mode, value):
+        """AND a plain csv_search value match (column None = any column)."""
+        node = ("text", column, match_mode, value.lower())
+        self.where = node if self.where is None else ("and", [self.where, node])
+
+    # -- execution ----------------------------------------------------------
+
+    @staticmethod
+    def _resolve(headers, name):
+        if name in headers:
+            return headers.index(name)
+        folded = [i for i, h in enumerate(headers) if h.lower() == name.lower()]
+        if len(folded) == 1:
+            return folded[0]
+        raise ValueError(f"Column '{name}' not found. Available columns: {', '.join(headers)}")
+
+    def _compile(self, node, headers):
+        kind = node[0]
+        if kind in ("and", "or"):
+            tests = [self._compile(child, headers) for child in node[1]]
+            if kind == "and":
+                return lambda row: all(test(row) for test in tests)
+            return lambda row: any(test(row) for test in tests)
+        if kind == "not":
+            test = self._compile(node[1], headers)
+            return lambda row: not test(row)
+        column = node[1]
+        if kind == "text":
+            mode, needle = node[2], node[3]
+            if mode == "exact":
+                match = needle.__eq__
+            elif mode == "starts_with":
+                match = lambda v: v.startswith(needle)
+            elif mode == "ends_with":
+                match = lambda v: v.endswith(needle)
+            else:
+                match = lambda v: needle in v
+            if column is None:
+                n_cols = len(headers)
+                return lambda row: any(match(cell.lower()) for cell in row[:n_cols])
+            i = self._resolve(headers, column)
+            return lambda row: match(row[i].lower() if i < len(row) else "")
+        i = self._resolve(headers, column)
+        if kind == "like":
+            pattern = node[2]
+            return lambda row: pattern.fullmatch(row[i] if i < len(row) else "") is not None
+        compare, value = _CSV_COMPARE[node[2]], node[3]
+        if kind == "num":
+            def test(row):
+                number = _csv_number(row[i]) if i < len(row) else None
+                return number is not None and compare(number, value)
+            return test
+        return lambda row: compare((row[i] if i < len(row) else "").lower(), value)
+
+    def _candidates(self, index, node, total):
+        """Sorted row ids that may satisfy `node`, from the engine's text
+        indexes; None when the predicate cannot be answered that way."""
+        kind = node[0]
+        if kind == "text":
+            mode = "contains" if node[2] == "ends_with" else node[2]
+            columns = (range(len(index.headers)) if node[1] is None
+                       else [self._resolve(index.headers, node[1])])
+            return index.match_rows(node[3], columns, mode, total)
+        if kind not in ("and", "or"):
+            return None
+        sets = [self._candidates(index, child, total) for child in node[1]]
+        if kind == "and":
+            sets = [set(s) for s in sets if s is not None]
+            if not sets:
+                return None
+            sets.sort(key=len)
+            return sorted(sets[0].intersection(*sets[1:]))
+        if any(s is None for s in sets):
+            return None
+        return sorted(set().union(*sets))
+
+    @property
+    def aggregating(self):
+        return bool(self.group_by) or any(func for func, _, _ in self.select or [])
+
+    def execute(self, index, limit, partial=False, stop=None):
+        """Run against a _CsvIndex, _CsvColumns or _CsvStream engine. Returns
+        a dict with `columns`, `rows` ([(row number or None, values)]),
+        `matched` (rows or groups that qualified, None when the scan stopped
+        at the limit), `aggregate` and a one-line `plan`.
+
+        With `partial`, ordered row results also carry their `sort_keys` and
+        aggregates come back as unfinished `groups`, so results from several
+        files can be merged with merge_results(). `stop` is polled while
+        streaming; returning True ends the pass early."""
+        headers = index.headers
+        if self.limit is not None:
+            limit = self.limit
+        test = self._compile(self.where, headers) if self.where is not None else None
+        if self.aggregating and self.select is None:
+            # GROUP BY without SELECT lists each group with its row count
+            self.select = [(None, c, c) for c in self.group_by] + [("COUNT", None, "count(*)")]
+        # Validate every column before touching the file
+        group_cols = [self._resolve(headers, c) for c in self.group_by]
+        specs = [(func, None if column is None else self._resolve(headers, column), name)
+                 for func, column, name in self.select or []]
+
+        total = len(index.offsets) if index.offsets is not None else None
+        candidates = None
+        if self.where is not None and total is not None:
+            candidates = self._candidates(index, self.where, total)
+        if candidates is not None and len(candidates) * 4 <= total:
+            plan = f"index pushdown, read {len(candidates):,} candidate row(s) of {total:,}"
+            source = zip(candidates, _read_csv_records(index.path, index.delimiter, index.offsets, candidates))
+            return self._run(source, test, headers, group_cols, specs, limit, plan, partial, stop)
+        plan = f"streaming pass over {total:,} row(s)" if total is not None else "streaming pass over the file"
+        with open(index.path, "rb") as f:
+            _, records = _csv_records(f, index.delimiter)
+            source = ((row_id, row) for row_id, (_, row) in enumerate(records))
+            return self._run(source, test, headers, group_cols, specs, limit, plan, partial, stop)
+
+    @staticmethod
+    def _until(source, stop):
+        for n, item in enumerate(source):
+            if n % 4096 == 0 and stop():
+                return
+            yield item
+
+    def _run(self, source, test, headers, group_cols, specs, limit, plan, partial, stop):
+        if stop is not None:
+            source = self._until(source, stop)
+        matches = source if test is None else ((row_id, row) for row_id, row in source if test(row))
+        if self.aggregating:
+            return self._run_aggregate(matches, group_cols, specs, limit, plan, partial)
+
+        projection = [i for _, i, _ in specs] if specs else list(range(len(headers)))
+        columns = [name for _, _, name in specs] if specs else list(headers)
+        aliases = {name.lower(): i for _, i, name in specs}
+
+        def project(row):
+            # Missing trailing cells read as None, like the plain search output
+            return [row[i] if i < len(row) else None for i in projection]
+
+        result = {"columns": columns, "aggregate": False, "plan": plan}
+        if self.order_by:
+            order = [aliases[name.lower()] if name.lower() in aliases else self._resolve(headers, name)
+                     for name, _ in self.order_by]
+            descending = [desc for _, desc in self.order_by]
+            matched = 0
+
+            def counted():
+                nonlocal matched
+                for row_id, row in matches:
+                    matched += 1
+                    yield row_id, [_csv_sort_key(row[i] if i < len(row) else "") for i in order], project(row)
+
+            top = heapq.nsmallest(limit, counted(), key=lambda item: _CsvSortKey(item[1], descending))
+            result["rows"] = [(row_id + 2, values) for row_id, _, values in top]
+            if partial:
+                result["sort_keys"] = [keys for _, keys, _ in top]
+        else:
+            rows = []
+            for row_id, row in matches:
+                if len(rows) >= limit:
+                    break
+                rows.append((row_id + 2, project(row)))
+            matched = len(rows) if len(rows) < limit else None
+            result["rows"] = rows
+        result["matched"] = matched
+        return result
+
+    def _run_aggregate(self, matches, group_cols, specs, limit, plan, partial):
+        # Where each output column comes from: a GROUP BY key position or an aggregate position
+        layout = []
+        n_aggs = 0
+        for func, i, name in specs:
+            if func is None:
+                if i not in group_cols:
+                    raise ValueError(f"Column '{name}' must be in GROUP BY or inside an aggregate")
+                layout.append(("group", group_cols.index(i)))
+            else:
+                layout.append(("agg", n_aggs))
+                n_aggs += 1
+        agg_specs = [(func, i) for func, i, _ in specs if func]
+        groups = {}
+        for _, row in matches:
+            key = tuple(row[i] if i < len(row) else "" for i in group_cols)
+            aggs = groups.get(key)
+            if aggs is None:
+                aggs = groups[key] = [_CsvAggregate(func, i) for func, i in agg_specs]
+            for agg in aggs:
+                agg.add(row)
+        if not groups and not group_cols:
+            groups[()] = [_CsvAggregate(func, i) for func, i in agg_specs]
+        columns = [name for _, _, name in specs]
+        if partial:
+            return {"columns": columns, "groups": groups, "layout": layout, "aggregate": True, "plan": plan}
+        return self._finish_aggregate(groups, layout, columns, limit, plan)
+
+    def _finish_aggregate(self, groups, layout, columns, limit, plan):
+        rows = []
+        for key, aggs in groups.items():
+            rows.append([key[pos] if source == "group" else aggs[pos].result() for source, pos in layout])
+        if self.order_by:
+            lowered = [c.lower() for c in columns]
+            order = []
+            for name, _ in self.order_by:
+                if name.lower() not in lowered:
+                    raise ValueError(f"ORDER BY '{name}' must be one of the selected columns: {', '.join(columns)}")
+                order.append(lowered.index(name.lower()))
+            descending = [desc for _, desc in self.order_by]
+            rows.sort(key=lambda values: _CsvSortKey([_csv_sort_key(values[i]) for i in order], descending))
+        return {"columns": columns, "rows": [(None, values) for values in rows[:limit]],
+                "matched": len(rows), "aggregate": True, "plan": plan}
+
+    def merge_results(self, named_results, limit, plan):
+        """Combine partial execute() results from several files, given as
+        [(file name, result)] in file order, into one result. Row results
+        gain `sources` (each row's file) and `row_columns` (its columns)."""
+        if self.limit is not None:
+            limit = self.limit
+        if not named_results:
+            return {"columns": [], "rows": [], "matched": 0, "aggregate": self.aggregating, "plan": plan}
+        if self.aggregating:
+            groups = {}
+            for _, result in named_results:
+                for key, aggs in result["groups"].items():
+                    mine = groups.get(key)
+                    if mine is None:
+                        groups[key] = aggs
+                    else:
+                        for agg, other in zip(mine, aggs):
+                            agg.merge(other)
+            first = named_results[0][1]
+            return self._finish_aggregate(groups, first["layout"], first["columns"], limit, plan)
+
+        entries = [(name, result["columns"], row, keys)
+                   for name, result in named_results
+                   for row, keys in zip(result["rows"], result.get("sort_keys") or [None] * len(result["rows"]))]
+        counts = [result["matched"] for _, result in named_results]
+        if self.order_by:
+            descending = [desc for _, desc in self.order_by]
+            entries = heapq.nsmallest(limit, entries, key=lambda e: _CsvSortKey(e[3], descending))
+            matched = sum(counts)
+        else:
+            matched = None if None in counts or len(entries) > limit else len(entries)
+            entries = entries[:limit]
+        columns = []
+        for _, result in named_results:
+            columns.extend(c for c in result["columns"] if c not in columns)
+        return {"columns": columns, "rows": [row for _, _, row, _ in entries],
+                "sources": [name for name, _, _, _ in entries],
+                "row_columns": [cols for _, cols, _, _ in entries],
+                "matched": matched, "aggregate": False, "plan": plan}
+
+
+# ── Multi-file CSV Search ───────────────────────────────────────────────────
+
+_csv_pool_cutoff = None   # shared file-number cutoff, installed in each pool worker
+
+
+def _expand_csv_paths(file_path):
+    """Files named by a csv_search file_path: the file itself, the delimited
+    files in a directory, or the matches of a glob pattern (** recurses).
+    Sorted, so multi-file results come back in a stable order."""
+    if os.path.isdir(file_path):
+        return sorted(os.path.join(file_path, name) for name in os.listdir(file_path)
+                      if name.lower().endswith(CSV_SEARCH_EXTENSIONS)
+                      and os.path.isfile(os.path.join(file_path, name)))
+    if any(ch in file_path for ch in "*?["):
+        return sorted(p for p in glob.glob(file_path, recursive=True) if os.path.isfile(p))
+    return [file_path] if os.path.isfile(file_path) else []
+
+
+def _csv_search_file(path, delimiter, query_text, search_value, column, match_mode, limit, stop=None):
+    """One file's share of a multi-file csv_search: a partial _CsvQuery
+    result, or {"error": reason} when the file cannot be searched."""
+    engine = None
+    try:
+        engine = _open_csv_engine(path, delimiter)
+        query = _CsvQuery.parse(query_text) if query_text else _CsvQuery()
+        if search_value or not query_text:
+            query.add_filter(column, match_mode, search_value)
+        return query.execute(engine, limit, partial=True, stop=stop)
+    except UnicodeDecodeError:
+        return {"error": "file encoding not supported, expected UTF-8"}
+    except (OSError, ValueError, csv.Error) as e:
+        return {"error": str(e)}
+    finally:
+        if isinstance(engine, _CsvColumns):
+            engine.close()
+
+
+def _csv_pool_init(cutoff):
+    global _csv_pool_cutoff
+    _csv_pool_cutoff = cutoff
+
+
+def _csv_pool_search(file_no, *args):
+    """Process pool entry point: _csv_search_file, abandoned as soon as the
+    parent lowers the shared cutoff below this file's number."""
+    cutoff = _csv_pool_cutoff
+    return _csv_search_file(*args, stop=lambda: file_no > cutoff.value)
+
+
 # ── Main Application ────────────────────────────────────────────────────────
 
 class App:
@@ -948,13 +4132,26 @@ class App:
         self.openai_client = openai.OpenAI(
             timeout=httpx.Timeout(600.0, connect=10.0, read=120.0),
         ) if self._has_openai else None
+        # Async twins used by the agent engine on self._async
+        self.async_client = anthropic.AsyncAnthropic() if self._has_anthropic else None
+        self.async_openai_client = openai.AsyncOpenAI(
+            timeout=httpx.Timeout(600.0, connect=10.0, read=120.0),
+        ) if self._has_openai else None
+        self._async = _AsyncLoop()
+        # Playwright's sync API only works on the thread that started it, so every
+        # browser tool runs on this one thread instead of the shared executor
+        self._browser_thread = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="agent-browser")
+        self._agent_future = None        # concurrent Future of the running stream_worker
+        self._threaded_tools = {}        # tool_use id -> future of a tool running on a worker thread
+        self._agent_started = False
         self.provider = "Anthropic" if self._has_anthropic else "OpenAI"
         self._openai_model_display_names = {}
         self.messages = []
         self.queue = queue.Queue()
         self.streaming = False
         self.stop_requested = False
-        self.pending_images = []   # list of (base64_data, media_type, filename)
+        self.pending_images = []   # list of (image ref, media_type, filename); data is read at START
         self._editor_images = []   # working copy while editor is open
         self._screenshot_scale = 1.0
         self.debug_enabled = tk.BooleanVar(value=False)
@@ -964,6 +4161,11 @@ class App:
         self.desktop_enabled = tk.BooleanVar(value=False)
         self.browser_enabled = tk.BooleanVar(value=False)
         self.meta_enabled = tk.BooleanVar(value=False)
+        self._tool_cache = {}            # _tool_cache_key() -> tuple of tool schemas
+        self._responses_tool_cache = {}  # _tool_cache_key() -> Responses API tool tuple
+        self._screen_size = None
+        for var in (self.desktop_enabled, self.browser_enabled, self.meta_enabled):
+            var.trace_add("write", self._invalidate_tool_cache)
         self._disabled_confirm_patterns = set()
         self._playwright = None
         self._browser = None
@@ -975,6 +4177,12 @@ class App:
         self.thinking_enabled = False
         self.thinking_effort = "high"
         self.thinking_budget = 8192
+        self.prompt_caching = False
+        self.speculative_tools = False
+        self.context_policy = _context_policy()
+        self._context_watermark = 0
+        self._context_view = []
+        self._context_folded = 0
         self.instruction_editor_window = None
         self.skills_editor_window = None
         self._skills_refresh_list = None
@@ -983,6 +4191,29 @@ class App:
 
         self._current_response_text = ""
         self._current_thinking_text = ""
+        self._render_budget_ms = RENDER_FRAME_BUDGET_MS
+        self._responses_cache = _ResponsesInputCache()
+        self._http_client = None         # shared keep-alive AsyncClient, created on first fetch
+        self._host_slots = {}            # host -> asyncio.Semaphore(HTTP_MAX_PER_HOST)
+        self._tool_limits = _ToolLimiter()
+        self._http_cache = _HttpCache(HTTP_CACHE_DIR)
+        self._search_backend = _make_search_backend()
+        self._screenshots = _ScreenshotPipeline(_make_screen_backend())
+        self._screen_delta = _ScreenDelta()
+        self._ocr = _make_ocr_backend()
+        self._ocr_cache = _OcrCache()
+        self._chat_store = None          # _ChatStore of the chat being auto-saved
+        self._chat_index = _ChatSearchIndex()
+        self._image_blobs = _ImageBlobStore()
+        self._templates = _TemplateMatcher()
+        self._search_cache = _SearchCache(SEARCH_CACHE_FILE)
+        self._search_limiter = _RateLimiter(SEARCH_RATE_PER_SEC, SEARCH_RATE_BURST)
+        self._csv_indexes = {}           # (abs path, delimiter) -> _CsvIndex
+        self._csv_build_locks = {}
+        self._csv_lock = threading.Lock()
+        self._csv_pool = None            # ProcessPoolExecutor for multi-file searches, started on first use
+        self._csv_pool_cutoff = None
+        self._csv_pool_lock = threading.Lock()
 
         # Agent instruction — the text injected as the first user message
         self.agent_instruction = DEFAULT_INSTRUCTION
@@ -995,8 +4226,9 @@ class App:
             self._save_last_state()
         except Exception:
             pass
-        self.root.after(50, self.check_queue)
+        self.root.after(RENDER_TICK_MS, self.check_queue)
         self.root.after(5000, self._periodic_save)
+        self.root.after(2000, self._chat_index.start_refresh)   # index chats saved while we were closed
         self.root.protocol("WM_DELETE_WINDOW", self._on_close)
 
         if self._headless:
@@ -1023,6 +4255,8 @@ class App:
         self._temp_var = tk.DoubleVar(value=self.temperature)
         self._thinking_var = tk.BooleanVar(value=False)
         self._thinking_strength_var = tk.StringVar(value="high")
+        self._prompt_cache_var = tk.BooleanVar(value=False)
+        self._speculate_var = tk.BooleanVar(value=False)
 
         # No model widgets until editor is opened
         self._provider_combo = None
@@ -1031,6 +4265,8 @@ class App:
         self._temp_spin = None
         self._thinking_check = None
         self._thinking_strength_combo = None
+        self._prompt_cache_check = None
+        self._speculate_check = None
 
         # Row 0: Chat toolbar — Instruction + model info + Save + START/STOP
         chat_toolbar = tk.Frame(self.root)
@@ -1151,6 +4387,11 @@ class App:
             command=self._open_ps_safety_dialog, relief="groove", padx=4, pady=0,
         ).pack(side=tk.LEFT, padx=(8, 0))
 
+        tk.Button(
+            checkbox_frame, text="Search Chats", font=("Arial", 8),
+            command=self._open_chat_search_dialog, relief="groove", padx=4, pady=0,
+        ).pack(side=tk.LEFT, padx=(4, 0))
+
     # ── Model / Thinking Helpers ────────────────────────────────────────
 
     def _fetch_available_models(self):
@@ -1233,9 +4474,23 @@ class App:
             if support is None:
                 self._thinking_var.set(False)
                 self.thinking_enabled = False
+        if self._prompt_cache_check is not None:
+            # OpenAI caches long prefixes automatically; the toggle only applies to Anthropic
+            self._prompt_cache_check.config(state="normal" if self.provider == "Anthropic" else "disabled")
+        if self._speculate_check is not None:
+            # Speculation is implemented for the Anthropic stream only
+            self._speculate_check.config(state="normal" if self.provider == "Anthropic" else "disabled")
         self._update_model_info_label()
         self._save_last_state()
 
+    def _on_prompt_cache_toggled(self):
+        self.prompt_caching = self._prompt_cache_var.get()
+        self._save_last_state()
+
+    def _on_speculate_toggled(self):
+        self.speculative_tools = self._speculate_var.get()
+        self._save_last_state()
+
     def _on_temp_changed(self):
         try:
             val = self._temp_var.get()
@@ -1313,6 +4568,14 @@ class App:
                             self._thinking_strength_var.set(k)
                             break
                 self._on_thinking_toggled()
+        # Restore prompt caching
+        if "prompt_caching" in entry:
+            self.prompt_caching = bool(entry["prompt_caching"])
+            self._prompt_cache_var.set(self.prompt_caching)
+        # Restore speculative tool execution
+        if "speculative_tools" in entry:
+            self.speculative_tools = bool(entry["speculative_tools"])
+            self._speculate_var.set(self.speculative_tools)
         self._update_model_info_label()
 
     def _on_thinking_toggled(self):
@@ -1445,6 +4708,8 @@ class App:
             "thinking_enabled": self.thinking_enabled,
             "thinking_effort": self.thinking_effort,
             "thinking_budget": self.thinking_budget,
+            "prompt_caching": self.prompt_caching,
+            "speculative_tools": self.speculative_tools,
             "geometry": self.root.geometry(),
             "screen_width": self.root.winfo_screenwidth(),
             "screen_height": self.root.winfo_screenheight(),
@@ -1491,13 +4756,11 @@ class App:
                 entry = instructions[instr_name]
                 self.agent_instruction = entry["text"]
                 self.agent_instruction_name = instr_name
-                self.pending_images = [
-                    (img["data"], img["media_type"], img["filename"])
-                    for img in entry.get("images", [])
-                ]
+                self.pending_images = self._instruction_images(entry)
                 self.desktop_enabled.set(entry.get("desktop", False))
                 self.browser_enabled.set(entry.get("browser", False))
                 self.meta_enabled.set(entry.get("meta", False))
+                self.context_policy = _context_policy(entry.get("context_policy"))
                 self._restore_skill_modes(entry)
                 self._update_model_info_label()
                 # Use instruction's model params if saved
@@ -1571,13 +4834,11 @@ class App:
         entry = instructions[name]
         self.agent_instruction = entry["text"]
         self.agent_instruction_name = name
-        self.pending_images = [
-            (img["data"], img["media_type"], img["filename"])
-            for img in entry.get("images", [])
-        ]
+        self.pending_images = self._instruction_images(entry)
         self.desktop_enabled.set(entry.get("desktop", False))
         self.browser_enabled.set(entry.get("browser", False))
         self.meta_enabled.set(entry.get("meta", False))
+        self.context_policy = _context_policy(entry.get("context_policy"))
         if "model" in entry:
             self._restore_model_params(entry)
         self._restore_skill_modes(entry)
@@ -1590,8 +4851,9 @@ class App:
     # ── Agent Instruction Editor ────────────────────────────────────────
 
     def _load_saved_instructions(self):
-        """Load instructions from disk. Each entry is {text: str, images: list}.
-        Migrates old string-only entries automatically."""
+        """Load instructions from disk. Each entry is {text: str, images: list},
+        where images are _ImageBlobStore references. Migrates old string-only
+        entries and embedded base64 images automatically."""
         if os.path.exists(INSTRUCTIONS_FILE):
             try:
                 with open(INSTRUCTIONS_FILE, "r", encoding="utf-8") as f:
@@ -1605,6 +4867,17 @@ class App:
                     elif isinstance(entry, dict) and "images" not in entry:
                         entry["images"] = []
                         migrated = True
+                    elif isinstance(entry, dict):
+                        # Embedded images: {data: base64, ...} → {blob: sha256, ...}
+                        for img in entry["images"]:
+                            if "data" not in img:
+                                continue
+                            try:
+                                img["blob"] = self._image_blobs.put(base64.standard_b64decode(img["data"]))
+                            except (OSError, ValueError):
+                                continue   # left embedded; retried on the next load
+                            del img["data"]
+                            migrated = True
                 if migrated:
                     self._save_instructions_to_disk(data)
                 return data
@@ -1614,9 +4887,35 @@ class App:
         self._save_instructions_to_disk(instructions)
         return instructions
 
+    @staticmethod
+    def _instruction_images(entry):
+        """(image ref, media_type, filename) for each of an instruction's images.
+        The ref is the blob digest, or "data:" + the embedded base64 for an
+        image that could not be moved to the blob store yet, so it is still
+        sent at START and written back on save."""
+        return [(img["blob"] if "blob" in img else "data:" + img["data"], img["media_type"], img["filename"])
+                for img in entry.get("images", []) if "blob" in img or "data" in img]
+
+    @staticmethod
+    def _instruction_image_entry(ref, media_type, filename):
+        """The agent_instructions.json form of an _instruction_images tuple."""
+        source = {"data": ref[5:]} if ref.startswith("data:") else {"blob": ref}
+        return {**source, "media_type": media_type, "filename": filename}
+
+    def _image_b64(self, ref):
+        """Base64 data of an image ref, read from the blob store unless embedded."""
+        if ref.startswith("data:"):
+            return ref[5:]
+        return self._image_blobs.get_b64(ref)
+
     def _save_instructions_to_disk(self, instructions):
         with open(INSTRUCTIONS_FILE, "w", encoding="utf-8") as f:
             json.dump(instructions, f, indent=2, ensure_ascii=False)
+        # Drop images no instruction (or this window's unsaved attachments) refers to
+        referenced = {img.get("blob") for entry in instructions.values() if isinstance(entry, dict)
+                      for img in entry.get("images", [])}
+        referenced.update(digest for digest, _mt, _fn in self.pending_images + self._editor_images)
+        self._image_blobs.prune(referenced)
 
     def do_manage_instructions(self, params):
         """CRUD operations on the saved instruction library."""
@@ -1656,6 +4955,7 @@ class App:
                 "model": entry.get("model", ""),
                 "image_count": len(entry.get("images", [])),
                 "skill_modes": entry.get("skill_modes", {}),
+                "context_policy": _context_policy(entry.get("context_policy")),
             }
             return json.dumps(info, indent=2)
 
@@ -1677,8 +4977,11 @@ class App:
                 "thinking_enabled": self.thinking_enabled,
                 "thinking_effort": self.thinking_effort,
                 "thinking_budget": self.thinking_budget,
+                "prompt_caching": self.prompt_caching,
+                "speculative_tools": self.speculative_tools,
                 "skill_modes": params.get("skill_modes",
                                {sn: sd["mode"] for sn, sd in self.skills.items()}),
+                "context_policy": _context_policy(params.get("context_policy")),
             }
             instructions[name] = entry
             self._save_instructions_to_disk(instructions)
@@ -1692,8 +4995,11 @@ class App:
             browser = params.get("browser")
             meta = params.get("meta")
             skill_modes = params.get("skill_modes")
-            if text is None and desktop is None and browser is None and meta is None and skill_modes is None:
-                return "Error: At least one of 'text', 'desktop', 'browser', 'meta', or 'skill_modes' must be provided for update."
+            context_policy = params.get("context_policy")
+            if text is None and desktop is None and browser is None and meta is None \
+                    and skill_modes is None and context_policy is None:
+                return ("Error: At least one of 'text', 'desktop', 'browser', 'meta', 'skill_modes', "
+                        "or 'context_policy' must be provided for update.")
             entry = instructions[name]
             if text is not None:
                 entry["text"] = text
@@ -1707,6 +5013,8 @@ class App:
                 existing = entry.get("skill_modes", {})
                 existing.update(skill_modes)
                 entry["skill_modes"] = existing
+            if context_policy is not None:
+                entry["context_policy"] = _context_policy({**entry.get("context_policy", {}), **context_policy})
             self._save_instructions_to_disk(instructions)
             return f"Instruction '{name}' updated successfully."
 
@@ -1832,6 +5140,18 @@ class App:
         self._thinking_strength_combo.pack(side=tk.LEFT, padx=(0, 10))
         self._thinking_strength_combo.bind("<<ComboboxSelected>>", lambda e: self._on_thinking_strength_changed())
 
+        self._prompt_cache_check = tk.Checkbutton(
+            model_frame, text="Cache", variable=self._prompt_cache_var,
+            font=("Arial", 10), command=self._on_prompt_cache_toggled,
+        )
+        self._prompt_cache_check.pack(side=tk.LEFT, padx=(0, 10))
+
+        self._speculate_check = tk.Checkbutton(
+            model_frame, text="Speculate", variable=self._speculate_var,
+            font=("Arial", 10), command=self._on_speculate_toggled,
+        )
+        self._speculate_check.pack(side=tk.LEFT, padx=(0, 10))
+
         # Apply current thinking/temp widget states
         self._on_model_selected()
 
@@ -1862,6 +5182,19 @@ class App:
             font=("Arial", 9),
         ).pack(side=tk.LEFT, padx=(5, 0))
 
+        self._editor_context_policy = dict(self.context_policy)
+        self._editor_keep_shots = tk.IntVar(value=self.context_policy["keep_screenshots"])
+        self._editor_summarize = tk.BooleanVar(value=self.context_policy["summarize"])
+        tk.Label(img_frame, text="Keep shots", font=("Arial", 9)).pack(side=tk.LEFT, padx=(15, 2))
+        tk.Spinbox(
+            img_frame, textvariable=self._editor_keep_shots,
+            from_=1, to=50, width=3, font=("Arial", 9),
+        ).pack(side=tk.LEFT)
+        tk.Checkbutton(
+            img_frame, text="Summarise", variable=self._editor_summarize,
+            font=("Arial", 9),
+        ).pack(side=tk.LEFT, padx=(5, 0))
+
         self.skills_button = tk.Button(
             img_frame, text="Skills", command=self.open_skills_editor, padx=10
         )
@@ -1915,6 +5248,8 @@ class App:
         self._temp_spin = None
         self._thinking_check = None
         self._thinking_strength_combo = None
+        self._prompt_cache_check = None
+        self._speculate_check = None
         try:
             self._save_last_state()
         except Exception:
@@ -1938,16 +5273,14 @@ class App:
         self.desktop_enabled.set(self._editor_desktop.get())
         self.browser_enabled.set(self._editor_browser.get())
         self.meta_enabled.set(self._editor_meta.get())
+        self.context_policy = self._read_editor_context_policy()
         self.agent_instruction = text
         self.agent_instruction_name = name
         # Persist to disk
         instructions = self._load_saved_instructions()
         instructions[name] = {
             "text": text,
-            "images": [
-                {"data": d, "media_type": mt, "filename": fn}
-                for d, mt, fn in self.pending_images
-            ],
+            "images": [self._instruction_image_entry(*img) for img in self.pending_images],
             "desktop": self.desktop_enabled.get(),
             "browser": self.browser_enabled.get(),
             "meta": self.meta_enabled.get(),
@@ -1957,6 +5290,9 @@ class App:
             "thinking_enabled": self.thinking_enabled,
             "thinking_effort": self.thinking_effort,
             "thinking_budget": self.thinking_budget,
+            "prompt_caching": self.prompt_caching,
+            "speculative_tools": self.speculative_tools,
+            "context_policy": dict(self.context_policy),
             "skill_modes": {sn: sk["mode"] for sn, sk in self.skills.items()},
         }
         self._save_instructions_to_disk(instructions)
@@ -1990,6 +5326,7 @@ class App:
         self._editor_desktop.set(False)
         self._editor_browser.set(False)
         self._editor_meta.set(False)
+        self._set_editor_context_policy(_context_policy())
         # Reset model controls to defaults
         if self._has_anthropic:
             default_provider = "Anthropic"
@@ -2007,8 +5344,27 @@ class App:
         self._on_temp_changed()
         self._thinking_var.set(False)
         self._on_thinking_toggled()
+        self._prompt_cache_var.set(False)
+        self._on_prompt_cache_toggled()
+        self._speculate_var.set(False)
+        self._on_speculate_toggled()
         self._refresh_image_listbox()
 
+    def _set_editor_context_policy(self, policy):
+        self._editor_context_policy = policy
+        self._editor_keep_shots.set(policy["keep_screenshots"])
+        self._editor_summarize.set(policy["summarize"])
+
+    def _read_editor_context_policy(self):
+        """Editor context policy with the Keep shots / Summarise widgets applied."""
+        policy = dict(self._editor_context_policy)
+        try:
+            policy["keep_screenshots"] = max(1, int(self._editor_keep_shots.get()))
+        except (tk.TclError, ValueError):
+            pass
+        policy["summarize"] = self._editor_summarize.get()
+        return policy
+
     def _on_instruction_selected(self, event):
         name = self._instr_combo_var.get()
         instructions = self._load_saved_instructions()
@@ -2019,13 +5375,11 @@ class App:
             self._instr_name_entry.delete(0, tk.END)
             self._instr_name_entry.insert(0, name)
             # Load this instruction's saved images and tool toggles into editor
-            self._editor_images = [
-                (img["data"], img["media_type"], img["filename"])
-                for img in entry.get("images", [])
-            ]
+            self._editor_images = self._instruction_images(entry)
             self._editor_desktop.set(entry.get("desktop", False))
             self._editor_browser.set(entry.get("browser", False))
             self._editor_meta.set(entry.get("meta", False))
+            self._set_editor_context_policy(_context_policy(entry.get("context_policy")))
             self._restore_model_params(entry)
             self._restore_skill_modes(entry)
             self._refresh_image_listbox()
@@ -2040,6 +5394,7 @@ class App:
         self.desktop_enabled.set(self._editor_desktop.get())
         self.browser_enabled.set(self._editor_browser.get())
         self.meta_enabled.set(self._editor_meta.get())
+        self.context_policy = self._read_editor_context_policy()
         self.agent_instruction = text
         self.agent_instruction_name = self._instr_name_entry.get().strip()
         # Restore skill modes from whichever instruction is loaded in editor
@@ -2064,6 +5419,8 @@ class App:
         self._temp_spin = None
         self._thinking_check = None
         self._thinking_strength_combo = None
+        self._prompt_cache_check = None
+        self._speculate_check = None
 
     # ── Skills System ───────────────────────────────────────────────────
 
@@ -2088,6 +5445,8 @@ class App:
     def _save_skills(self):
         with open(SKILLS_FILE, "w", encoding="utf-8") as f:
             json.dump(self.skills, f, indent=2, ensure_ascii=False)
+        # Every skill change is persisted here, so the get_skill schema is rebuilt next call
+        self._invalidate_tool_cache()
 
     def do_manage_skills(self, params):
         """CRUD operations on the shared skills library."""
@@ -2186,6 +5545,44 @@ class App:
         except Exception as e:
             return f"Error launching instruction '{name}': {e}"
 
+    def do_search_chats(self, params):
+        """Ranked full-text search over saved chats (_ChatSearchIndex)."""
+        query = str(params.get("query", "")).strip()
+        if not query:
+            return "Error: 'query' is required."
+        try:
+            since = _parse_date_bound(params.get("after"))
+            until = _parse_date_bound(params.get("before"), end=True)
+        except ValueError:
+            return "Error: 'after' and 'before' must be dates in YYYY-MM-DD format."
+        try:
+            limit = max(1, min(50, int(params.get("limit", CHAT_SEARCH_MAX_RESULTS))))
+        except (TypeError, ValueError):
+            return "Error: 'limit' must be an integer."
+        store = self._chat_store
+        exclude = None
+        if store is not None and not params.get("include_current"):
+            exclude = os.path.basename(store.path)
+        start = time.perf_counter()
+        try:
+            self._chat_index.refresh()   # a scandir when nothing changed
+        except Exception as e:
+            return f"Error indexing saved chats: {e}"
+        total, n_chats, results = self._chat_index.search(
+            query, model=params.get("model"), since=since, until=until, limit=limit, exclude=exclude)
+        elapsed = (time.perf_counter() - start) * 1000
+        if not results:
+            return f"No saved messages match {query!r} ({n_chats} chats searched, {elapsed:.0f} ms)."
+        lines = [f"{len(results)} of {total} matching messages for {query!r} "
+                 f"({n_chats} chats searched, {elapsed:.0f} ms):"]
+        for i, r in enumerate(results, 1):
+            saved = time.strftime("%Y-%m-%d %H:%M", time.localtime(r["mtime"]))
+            model = f", {r['model']}" if r["model"] else ""
+            body = r["text"] if params.get("full_text") else r["snippet"]
+            lines.append(f"\n{i}. Chat \"{r['name']}\" ({saved}{model}) — message {r['seq']} "
+                         f"({r['role']}), score {r['score']:.2f}\n{body}")
+        return "\n".join(lines)
+
     def _post_skill_ui_refresh(self):
         """Thread-safe refresh of Skills button and Skills Manager listbox."""
         def _refresh():
@@ -2272,104 +5669,117 @@ class App:
         - User images use input_text/input_image content types
         - Assistant tool calls become top-level function_call items
         - Tool results become top-level function_call_output items
+
+        Conversion is incremental: each message's items are memoized in
+        self._responses_cache, so only newly appended messages are converted;
+        entries for messages no longer in `messages` are then dropped.
+        The returned items are shared with the cache and must not be mutated.
         """
+        cache = self._responses_cache
         result = []
-
         for msg in messages:
-            role = msg["role"]
-            content = msg.get("content")
-
-            if role == "user":
-                if isinstance(content, str):
-                    result.append({"role": "user", "content": content})
-                elif isinstance(content, list):
-                    # Check if this is a tool_result list
-                    has_tool_result = any(
-                        (isinstance(b, dict) and b.get("type") == "tool_result") for b in content
-                    )
-                    if has_tool_result:
-                        for block in content:
-                            if isinstance(block, dict) and block.get("type") == "tool_result":
-                                tc_content = block.get("content", "")
-                                call_id = block.get("tool_use_id", "")
-                                # Handle content that is a list (e.g. with image blocks)
-                                if isinstance(tc_content, list):
-                                    parts = []
-                                    for part in tc_content:
-                                        if isinstance(part, dict) and part.get("type") == "image":
-                                            src = part.get("source", {})
-                                            data_url = f"data:{src.get('media_type', 'image/png')};base64,{src.get('data', '')}"
-                                            parts.append({
-                                                "type": "input_image",
-                                                "image_url": data_url,
-                                            })
-                                        elif isinstance(part, dict) and part.get("type") == "text":
-                                            parts.append({"type": "input_text", "text": part.get("text", "")})
-                                        else:
-                                            parts.append({"type": "input_text", "text": str(part)})
-                                    result.append({
-                                        "type": "function_call_output",
-                                        "call_id": call_id,
-                                        "output": parts,
-                                    })
-                                else:
-                                    result.append({
-                                        "type": "function_call_output",
-                                        "call_id": call_id,
-                                        "output": str(tc_content) if tc_content else "",
-                                    })
-                    else:
-                        # User message with text + images
-                        parts = []
-                        for block in content:
-                            if isinstance(block, dict):
-                                if block.get("type") == "text":
-                                    parts.append({"type": "input_text", "text": block.get("text", "")})
-                                elif block.get("type") == "image":
-                                    src = block.get("source", {})
-                                    data_url = f"data:{src.get('media_type', 'image/png')};base64,{src.get('data', '')}"
-                                    parts.append({
-                                        "type": "input_image",
-                                        "image_url": data_url,
-                                    })
-                            elif isinstance(block, str):
-                                parts.append({"type": "input_text", "text": block})
-                        result.append({"role": "user", "content": parts})
-
-            elif role == "assistant":
-                if isinstance(content, str):
-                    result.append({"role": "assistant", "content": [{"type": "output_text", "text": content}]})
-                elif isinstance(content, list):
-                    # Collect text and tool_use blocks separately
-                    text_parts = []
-                    func_calls = []
+            items = cache.get(msg)
+            if items is None:
+                items = self._message_to_responses(msg)
+                cache.put(msg, items)
+            result.extend(items)
+        cache.retain(messages)
+        return result
+
+    def _message_to_responses(self, msg):
+        """Convert a single Anthropic-format message to a list of Responses API items."""
+        result = []
+        role = msg["role"]
+        content = msg.get("content")
+        data_url = self._responses_cache.data_url
+
+        if role == "user":
+            if isinstance(content, str):
+                result.append({"role": "user", "content": content})
+            elif isinstance(content, list):
+                # Check if this is a tool_result list
+                has_tool_result = any(
+                    (isinstance(b, dict) and b.get("type") == "tool_result") for b in content
+                )
+                if has_tool_result:
                     for block in content:
-                        # Handle both Pydantic objects and dicts
-                        btype = getattr(block, "type", None) or (block.get("type") if isinstance(block, dict) else None)
-                        if btype == "text":
-                            t = getattr(block, "text", None) or (block.get("text") if isinstance(block, dict) else "")
-                            if t:
-                                text_parts.append(t)
-                        elif btype == "tool_use":
-                            bid = getattr(block, "id", None) or (block.get("id") if isinstance(block, dict) else "")
-                            bname = getattr(block, "name", None) or (block.get("name") if isinstance(block, dict) else "")
-                            binput = getattr(block, "input", None) or (block.get("input") if isinstance(block, dict) else {})
-                            func_calls.append({
-                                "type": "function_call",
-                                "call_id": bid,
-                                "name": bname,
-                                "arguments": json.dumps(binput),
-                            })
-                        # Skip thinking/redacted_thinking blocks
-                    combined_text = "\n".join(text_parts)
-                    if combined_text:
-                        result.append({"role": "assistant", "content": [{"type": "output_text", "text": combined_text}]})
-                    # Function calls are top-level items in Responses API
-                    result.extend(func_calls)
+                        if isinstance(block, dict) and block.get("type") == "tool_result":
+                            tc_content = block.get("content", "")
+                            call_id = block.get("tool_use_id", "")
+                            # Handle content that is a list (e.g. with image blocks)
+                            if isinstance(tc_content, list):
+                                parts = []
+                                for part in tc_content:
+                                    if isinstance(part, dict) and part.get("type") == "image":
+                                        parts.append({
+                                            "type": "input_image",
+                                            "image_url": data_url(part.get("source", {})),
+                                        })
+                                    elif isinstance(part, dict) and part.get("type") == "text":
+                                        parts.append({"type": "input_text", "text": part.get("text", "")})
+                                    else:
+                                        parts.append({"type": "input_text", "text": str(part)})
+                                result.append({
+                                    "type": "function_call_output",
+                                    "call_id": call_id,
+                                    "output": parts,
+                                })
+                            else:
+                                result.append({
+                                    "type": "function_call_output",
+                                    "call_id": call_id,
+                                    "output": str(tc_content) if tc_content else "",
+                                })
+                else:
+                    # User message with text + images
+                    parts = []
+                    for block in content:
+                        if isinstance(block, dict):
+                            if block.get("type") == "text":
+                                parts.append({"type": "input_text", "text": block.get("text", "")})
+                            elif block.get("type") == "image":
+                                parts.append({
+                                    "type": "input_image",
+                                    "image_url": data_url(block.get("source", {})),
+                                })
+                        elif isinstance(block, str):
+                            parts.append({"type": "input_text", "text": block})
+                    result.append({"role": "user", "content": parts})
+
+        elif role == "assistant":
+            if isinstance(content, str):
+                result.append({"role": "assistant", "content": [{"type": "output_text", "text": content}]})
+            elif isinstance(content, list):
+                # Collect text and tool_use blocks separately
+                text_parts = []
+                func_calls = []
+                for block in content:
+                    # Handle both Pydantic objects and dicts
+                    btype = getattr(block, "type", None) or (block.get("type") if isinstance(block, dict) else None)
+                    if btype == "text":
+                        t = getattr(block, "text", None) or (block.get("text") if isinstance(block, dict) else "")
+                        if t:
+                            text_parts.append(t)
+                    elif btype == "tool_use":
+                        bid = getattr(block, "id", None) or (block.get("id") if isinstance(block, dict) else "")
+                        bname = getattr(block, "name", None) or (block.get("name") if isinstance(block, dict) else "")
+                        binput = getattr(block, "input", None) or (block.get("input") if isinstance(block, dict) else {})
+                        func_calls.append({
+                            "type": "function_call",
+                            "call_id": bid,
+                            "name": bname,
+                            "arguments": json.dumps(binput),
+                        })
+                    # Skip thinking/redacted_thinking blocks
+                combined_text = "\n".join(text_parts)
+                if combined_text:
+                    result.append({"role": "assistant", "content": [{"type": "output_text", "text": combined_text}]})
+                # Function calls are top-level items in Responses API
+                result.extend(func_calls)
 
         return result
 
-    def _stream_responses(self, api_kwargs, label_emitted):
+    async def _stream_responses(self, api_kwargs, label_emitted):
         """Stream an OpenAI Responses API call, accumulating text and tool calls.
         Returns (full_text, stop_reason, content_blocks, had_thinking, label_emitted)."""
         full_text = ""
@@ -2377,8 +5787,8 @@ class App:
         tool_calls_acc = {}  # output_index -> {call_id, name, arguments}
         in_thinking = False
 
-        with self.openai_client.responses.stream(**api_kwargs) as stream:
-            for event in stream:
+        async with self.async_openai_client.responses.stream(**api_kwargs) as stream:
+            async for event in stream:
                 # Reasoning summary deltas (thinking)
                 if event.type == "response.reasoning_summary_text.delta":
                     if not in_thinking:
@@ -2640,17 +6050,6 @@ class App:
         safe = safe.strip('. ')
         return (safe or '_') + ext
 
-    @staticmethod
-    def _chat_file_path(name):
-        return os.path.join(CHATS_DIR, App._sanitize_filename(name))
-
-    def _save_chat_file(self, name, data):
-        os.makedirs(CHATS_DIR, exist_ok=True)
-        data['name'] = name
-        fpath = self._chat_file_path(name)
-        with open(fpath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-
     @staticmethod
     def _clean_content_block(block):
         if not isinstance(block, dict):
@@ -2685,40 +6084,41 @@ class App:
             return {"type": "redacted_thinking", "data": block.get("data", "")}
         return block
 
-    def _serialize_messages(self):
-        serialized = []
-        for msg in self.messages:
-            content = msg["content"]
-            if isinstance(content, str):
-                serialized.append({"role": msg["role"], "content": content})
-            elif isinstance(content, list):
-                blocks = []
-                for block in content:
-                    if isinstance(block, dict):
-                        if block.get("type") in ("thinking", "redacted_thinking"):
-                            continue
-                        blocks.append(self._clean_content_block(block))
-                    elif hasattr(block, "model_dump"):
-                        d = block.model_dump()
-                        if d.get("type") in ("thinking", "redacted_thinking"):
-                            continue
-                        blocks.append(self._clean_content_block(d))
-                    else:
-                        blocks.append({"type": "text", "text": str(block)})
-                if blocks:
-                    serialized.append({"role": msg["role"], "content": blocks})
+    @staticmethod
+    def _serialize_message(msg):
+        """Saved form of one message, or None when nothing in it is saved."""
+        content = msg["content"]
+        if isinstance(content, str):
+            return {"role": msg["role"], "content": content}
+        if not isinstance(content, list):
+            return {"role": msg["role"], "content": str(content)}
+        blocks = []
+        for block in content:
+            if isinstance(block, dict):
+                if block.get("type") in ("thinking", "redacted_thinking"):
+                    continue
+                blocks.append(App._clean_content_block(block))
+            elif hasattr(block, "model_dump"):
+                d = block.model_dump()
+                if d.get("type") in ("thinking", "redacted_thinking"):
+                    continue
+                blocks.append(App._clean_content_block(d))
             else:
-                serialized.append({"role": msg["role"], "content": str(content)})
-        return serialized
+                blocks.append({"type": "text", "text": str(block)})
+        return {"role": msg["role"], "content": blocks} if blocks else None
 
-    def _auto_save_on_close(self):
+    def _auto_save_on_close(self, final=False):
+        """Save the chat through its _ChatStore: new messages are appended to
+        the journal. On close (final) the journal is folded into the snapshot."""
         if not self.messages:
             return
         name = self.chat_name_entry.get().strip()
         if not name:
             return
-        self._save_chat_file(name, {
-            "messages": self._serialize_messages(),
+        store = self._chat_store
+        if store is None or store.name != name:
+            store = self._chat_store = _ChatStore(name)
+        store.save(self.messages, {
             "system_prompt": self.system_prompt,
             "agent_instruction_name": self.agent_instruction_name,
             "provider": self.provider,
@@ -2727,12 +6127,12 @@ class App:
             "thinking_enabled": self.thinking_enabled,
             "thinking_effort": self.thinking_effort,
             "thinking_budget": self.thinking_budget,
-        })
-        txt_path = os.path.join(CHATS_DIR, self._sanitize_filename(name, '.txt'))
+            "prompt_caching": self.prompt_caching,
+            "speculative_tools": self.speculative_tools,
+        }, self._serialize_message, compact=final)
+        self._chat_index.update(store, self.model)
         try:
-            output_text = self.chat_display.get("1.0", tk.END).rstrip()
-            with open(txt_path, "w", encoding="utf-8") as f:
-                f.write(output_text)
+            store.save_transcript(self.chat_display)
         except Exception:
             pass
 
@@ -2798,9 +6198,13 @@ class App:
             # Compress if over the API size limit
             if len(raw) > self.MAX_IMAGE_BYTES:
                 raw, media_type = self._compress_image(raw, self.MAX_IMAGE_BYTES)
-            image_data = base64.standard_b64encode(raw).decode("utf-8")
             filename = os.path.basename(filepath)
-            self._editor_images.append((image_data, media_type, filename))
+            try:
+                digest = self._image_blobs.put(raw)
+            except OSError as e:
+                messagebox.showwarning("Attach failed", f"Could not store {filename}: {e}")
+                continue
+            self._editor_images.append((digest, media_type, filename))
         self._refresh_image_listbox()
 
     def _refresh_image_listbox(self):
@@ -2839,6 +6243,7 @@ class App:
 
         # Reset for a new run
         self.messages = []
+        self._responses_cache.clear()
         self.stop_requested = False
         self.chat_display.config(state="normal")
         self.chat_display.delete("1.0", tk.END)
@@ -2846,8 +6251,14 @@ class App:
 
         user_text = self.agent_instruction.strip()
 
-        # Build content with the instruction's images (keep originals for re-runs)
-        images = list(self.pending_images)
+        # Build content with the instruction's images, read from the blob store now
+        images = []
+        for ref, media_type, filename in self.pending_images:
+            try:
+                images.append((self._image_b64(ref), media_type, filename))
+            except (OSError, ValueError) as e:
+                # Reported in the chat, not a dialog, so a headless -l run never blocks on it
+                self.queue.put({"type": "warning", "content": f"\u26a0 Skipping attached image {filename}: {e}\n"})
         if images:
             content = []
             for image_data, media_type, _filename in images:
@@ -2872,14 +6283,21 @@ class App:
         self._stop_button.config(state="normal")
         self.instruction_button.config(state="disabled")
 
-        thread = threading.Thread(
-            target=self.stream_worker, args=(self.messages,), daemon=True
-        )
-        thread.start()
+        self._agent_started = False
+        self._agent_future = self._async.submit(self.stream_worker(self.messages))
+        self._agent_future.add_done_callback(self._on_agent_done)
+
+    def _on_agent_done(self, future):
+        # A Stop that lands before the task's first step never reaches stream_worker's handler
+        if future.cancelled() and not self._agent_started:
+            self.queue.put({"type": "complete"})
 
     def _stop_agent(self):
         self.stop_requested = True
         self._stop_button.config(state="disabled")
+        if self._agent_future is not None:
+            # Cancels the stream_worker task on the loop, interrupting the current stream or tool
+            self._agent_future.cancel()
 
     def append_message(self, role, content, filenames=None):
         self.chat_display.config(state="normal")
@@ -2894,9 +6312,19 @@ class App:
 
     # ── Core Tools ──────────────────────────────────────────────────────
 
+    def _search_results(self, query, max_results=SEARCH_MAX_RESULTS):
+        """Cached, rate-limited search returning the backend's result dicts."""
+        results = self._search_cache.get(query, max_results)
+        if results is None:
+            self._search_limiter.acquire()
+            results = self._search_backend.search(query, max_results)
+            if results:
+                self._search_cache.put(query, max_results, results)
+        return results
+
     def search_web(self, query):
         try:
-            results = DDGS().text(query, max_results=5)
+            results = self._search_results(query)
             if not results:
                 return "No results found."
             formatted = []
@@ -2906,21 +6334,103 @@ class App:
         except Exception as e:
             return f"Search error: {e}"
 
-    def fetch_url(self, url):
+    async def search_web_many_async(self, queries):
+        """Run several searches concurrently and group the results per query.
+        Queries that normalise to the same key are searched once. The search
+        client is synchronous, so each search runs on the loop's shared
+        executor, at most SEARCH_MAX_CONCURRENCY at a time."""
+        unique = {}
+        for q in queries:
+            if q.strip():
+                unique.setdefault(_normalize_query(q), q)
+        if not unique:
+            return "Error: 'queries' contains no search terms."
+        slots = asyncio.Semaphore(SEARCH_MAX_CONCURRENCY)
+
+        async def one(query):
+            async with slots:
+                return await asyncio.to_thread(self.search_web, query)
+
+        results = await asyncio.gather(*(one(q) for q in unique.values()))
+        return "\n".join(f"=== Results for: {q} ===\n{r}" for q, r in zip(unique.values(), results))
+
+    def _get_http_client(self):
+        # Only touched on the event loop thread, so no lock is needed
+        if self._http_client is None:
+            self._http_client = _make_http_client()
+        return self._http_client
+
+    def _host_slot(self, url):
+        """Semaphore limiting concurrent requests to one host."""
+        host = urlsplit(url).netloc.lower()
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(HTTP_MAX_PER_HOST)
+        return slot
+
+    async def fetch_url_async(self, url):
         try:
-            response = httpx.get(url, follow_redirects=True, timeout=15)
-            response.raise_for_status()
-            content_type = response.headers.get("content-type", "")
+            cached = self._http_cache.get(url)
+            if cached is not None and _HttpCache.is_fresh(cached):
+                content_type, body = cached["content_type"], cached["text"]
+            else:
+                headers = {}
+                if cached is not None:
+                    if cached.get("etag"):
+                        headers["If-None-Match"] = cached["etag"]
+                    if cached.get("last_modified"):
+                        headers["If-Modified-Since"] = cached["last_modified"]
+                async with self._host_slot(url):
+                    async with self._get_http_client().stream("GET", url, headers=headers) as response:
+                        if response.status_code == 304 and cached is not None:
+                            self._http_cache.refresh(url, cached, response)
+                            content_type, body = cached["content_type"], cached["text"]
+                        else:
+                            response.raise_for_status()
+                            content_type = response.headers.get("content-type", "")
+                            text, truncated, body = await self._read_text_stream(response, content_type)
+                            self._http_cache.put(url, response, body, partial=truncated)
+                            return self._format_fetched_text(text, truncated)
             if "html" in content_type:
-                text = extract_text_from_html(response.text)
+                extractor = HTMLTextExtractor(budget=FETCH_TEXT_BUDGET)
+                extractor.feed(body)
+                text, truncated = extractor.get_text(), extractor.done
             else:
-                text = response.text
-            if len(text) > 20000:
-                text = text[:20000] + "\n\n[Content truncated...]"
-            return text
+                text, truncated = body, len(body) > FETCH_TEXT_BUDGET
+            return self._format_fetched_text(text, truncated)
         except Exception as e:
             return f"Error fetching URL: {e}"
 
+    @staticmethod
+    async def _read_text_stream(response, content_type):
+        """Decode the body chunk by chunk, feeding HTML to the extractor as it
+        arrives, and stop reading once FETCH_TEXT_BUDGET characters of text
+        are collected. Returns (text, truncated, raw body read so far)."""
+        chunks = []
+        if "html" in content_type:
+            extractor = HTMLTextExtractor(budget=FETCH_TEXT_BUDGET)
+            async for chunk in response.aiter_text():
+                chunks.append(chunk)
+                extractor.feed(chunk)
+                if extractor.done:
+                    break
+            extractor.close()
+            return extractor.get_text(), extractor.done, "".join(chunks)
+        size = 0
+        async for chunk in response.aiter_text():
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > FETCH_TEXT_BUDGET:
+                break
+        body = "".join(chunks)
+        return body, size > FETCH_TEXT_BUDGET, body
+
+    @staticmethod
+    def _format_fetched_text(text, truncated):
+        if truncated or len(text) > FETCH_TEXT_BUDGET:
+            return text[:FETCH_TEXT_BUDGET] + "\n\n[Content truncated...]"
+        return text
+
     def _open_ps_safety_dialog(self):
         dlg = tk.Toplevel(self.root)
         dlg.title("PowerShell Safety — Confirm Patterns")
@@ -2975,6 +6485,132 @@ class App:
 
         dlg.protocol("WM_DELETE_WINDOW", _on_close)
 
+    def _open_chat_search_dialog(self):
+        dlg = tk.Toplevel(self.root)
+        dlg.title("Search Saved Chats")
+        dlg.transient(self.root)
+        dlg.geometry("900x650")
+        dlg.grid_columnconfigure(0, weight=1)
+        dlg.grid_rowconfigure(2, weight=1)
+        dlg.grid_rowconfigure(3, weight=2)
+
+        top = tk.Frame(dlg)
+        top.grid(row=0, column=0, sticky="ew", padx=10, pady=(10, 5))
+        query_entry = tk.Entry(top, font=("Arial", 10))
+        query_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 8))
+        tk.Label(top, text="Model", font=("Arial", 9)).pack(side=tk.LEFT)
+        model_var = tk.StringVar()
+        model_combo = ttk.Combobox(top, textvariable=model_var, width=22, font=("Arial", 9),
+                                   postcommand=lambda: model_combo.configure(
+                                       values=[""] + self._chat_index.models()))
+        model_combo.pack(side=tk.LEFT, padx=(3, 8))
+        tk.Label(top, text="After", font=("Arial", 9)).pack(side=tk.LEFT)
+        after_entry = tk.Entry(top, font=("Arial", 9), width=11)
+        after_entry.pack(side=tk.LEFT, padx=(3, 8))
+        tk.Label(top, text="Before", font=("Arial", 9)).pack(side=tk.LEFT)
+        before_entry = tk.Entry(top, font=("Arial", 9), width=11)
+        before_entry.pack(side=tk.LEFT, padx=(3, 8))
+        search_button = tk.Button(top, text="Search", width=8)
+        search_button.pack(side=tk.LEFT)
+
+        status = tk.Label(dlg, text='Words rank matches; "quoted phrases" must match exactly. '
+                                    'Dates are YYYY-MM-DD.', font=("Arial", 9), anchor="w")
+        status.grid(row=1, column=0, sticky="ew", padx=10)
+
+        result_list = tk.Listbox(dlg, font=("Consolas", 9), activestyle="none")
+        result_list.grid(row=2, column=0, sticky="nsew", padx=10, pady=5)
+        detail = tk.Text(dlg, wrap=tk.WORD, font=("Arial", 10), state="disabled")
+        detail.grid(row=3, column=0, sticky="nsew", padx=10, pady=(0, 10))
+        detail.tag_config("match", background="#fff59d")
+        results = []
+        terms = []
+
+        def show_results(outcome, elapsed):
+            if not dlg.winfo_exists():
+                return
+            search_button.configure(state="normal")
+            if isinstance(outcome, Exception):
+                status.configure(text=f"Search failed: {outcome}")
+                return
+            total, n_chats, found = outcome
+            results[:] = found
+            result_list.delete(0, tk.END)
+            for r in found:
+                saved = time.strftime("%Y-%m-%d", time.localtime(r["mtime"]))
+                result_list.insert(tk.END, f"{saved}  {r['name'][:30]:<30}  #{r['seq']:<4} {r['role']:<9} {r['snippet']}")
+            status.configure(text=f"{len(found)} of {total} matching messages in {n_chats} chats ({elapsed:.0f} ms)"
+                                  " — double-click to open the transcript")
+            if found:
+                result_list.selection_set(0)
+                show_detail()
+
+        def run_search(*_):
+            query = query_entry.get().strip()
+            if not query:
+                return
+            try:
+                since = _parse_date_bound(after_entry.get())
+                until = _parse_date_bound(before_entry.get(), end=True)
+            except ValueError:
+                status.configure(text="Dates must be in YYYY-MM-DD format.")
+                return
+            terms[:] = _search_tokens(query)
+            model = model_var.get().strip()
+            search_button.configure(state="disabled")
+            status.configure(text="Searching...")
+
+            def work():
+                start = time.perf_counter()
+                try:
+                    self._chat_index.refresh()
+                    outcome = self._chat_index.search(query, model=model, since=since, until=until, limit=50)
+                except Exception as e:
+                    outcome = e
+                elapsed = (time.perf_counter() - start) * 1000
+                self.root.after(0, lambda: show_results(outcome, elapsed))
+
+            threading.Thread(target=work, daemon=True).start()
+
+        def show_detail(*_):
+            sel = result_list.curselection()
+            if not sel:
+                return
+            r = results[sel[0]]
+            detail.configure(state="normal")
+            detail.delete("1.0", tk.END)
+            detail.insert("1.0", f"{r['name']} — message {r['seq']} ({r['role']})\n\n{r['text']}")
+            if terms:
+                pattern = r"\m(" + "|".join(re.escape(t) for t in set(terms)) + r")\M"
+                count = tk.IntVar()
+                index = "1.0"
+                while True:
+                    index = detail.search(pattern, index, tk.END, regexp=True, nocase=True, count=count)
+                    if not index or not count.get():
+                        break
+                    end = f"{index}+{count.get()}c"
+                    detail.tag_add("match", index, end)
+                    index = end
+            detail.configure(state="disabled")
+
+        def open_transcript(*_):
+            sel = result_list.curselection()
+            if not sel:
+                return
+            path = os.path.join(CHATS_DIR, results[sel[0]]["file"][:-5] + ".txt")
+            if not os.path.exists(path):
+                path = path[:-4] + ".json"
+            try:
+                os.startfile(path)
+            except (OSError, AttributeError) as e:
+                status.configure(text=f"Cannot open {os.path.basename(path)}: {e}")
+
+        search_button.configure(command=run_search)
+        query_entry.bind("<Return>", run_search)
+        result_list.bind("<<ListboxSelect>>", show_detail)
+        result_list.bind("<Double-Button-1>", open_transcript)
+        query_entry.focus_set()
+        self._chat_index.start_refresh()
+
     def _toggle_confirm_pattern(self, pattern, var):
         if var.get():
             self._disabled_confirm_patterns.discard(pattern)
@@ -3232,46 +6868,66 @@ class App:
 
     # ── CSV Search Tool ─────────────────────────────────────────────────
 
-    def do_csv_search(self, file_path, search_value, column=None, match_mode="contains", max_results=50, delimiter=None):
+    def _get_csv_index(self, file_path, delimiter):
+        """Return a current search engine for the file. Files of at least
+        CSV_COLUMNAR_MIN_BYTES get the memory-mapped _CsvColumns store
+        (when NumPy is available); smaller ones get a _CsvIndex from
+        memory, else from its sidecar on disk, else built in one pass."""
+        path = os.path.abspath(file_path)
+        st = os.stat(path)
+        columnar = np is not None and st.st_size >= CSV_COLUMNAR_MIN_BYTES
+        cache_key = (path, delimiter, columnar)
+        with self._csv_lock:
+            lock = self._csv_build_locks.setdefault(cache_key, threading.Lock())
+        with lock:
+            st = os.stat(path)
+            index = self._csv_indexes.get(cache_key)
+            if index is not None and index.is_current(st):
+                return index
+            if columnar:
+                # A stale store is only dropped, not closed: a search on another thread
+                # may still be reading its mmaps, which close once its last user lets go
+                self.queue.put({"type": "tool_info", "content": f"Loading CSV columns: {os.path.basename(path)}...\n"})
+                index = self._csv_indexes[cache_key] = _CsvColumns.open(path, delimiter)
+                return index
+            index = _CsvIndex.load(path, delimiter)
+            if index is None or not index.is_current(st):
+                self.queue.put({"type": "tool_info", "content": f"Indexing CSV: {os.path.basename(path)}...\n"})
+                index = _CsvIndex.build(path, delimiter)
+                index.save(delimiter)
+            self._csv_indexes[cache_key] = index
+            return index
+
+    def do_csv_search(self, file_path, search_value="", column=None, match_mode="contains", max_results=50, delimiter=None, query=None):
         try:
+            if delimiter == '\\t':
+                delimiter = '\t'
+            if match_mode not in ("exact", "starts_with", "contains"):
+                return f"Error: Invalid match_mode '{match_mode}'. Use exact, starts_with or contains."
             if not os.path.isfile(file_path):
-                return f"Error: File not found: {file_path}"
-            with open(file_path, "r", encoding="utf-8-sig", newline="") as f:
-                if delimiter is None:
-                    sample = f.read(8192)
-                    f.seek(0)
-                    try:
-                        dialect = csv.Sniffer().sniff(sample, delimiters=',\t|;')
-                        delimiter = dialect.delimiter
-                    except csv.Error:
-                        delimiter = ','
-                elif delimiter == '\\t':
-                    delimiter = '\t'
-                reader = csv.DictReader(f, delimiter=delimiter)
-                headers = reader.fieldnames
-                if not headers:
-                    return "Error: CSV file has no headers."
-                if column and column not in headers:
-                    return f"Error: Column '{column}' not found. Available columns: {', '.join(headers)}"
-                search_lower = search_value.lower()
-                matches = []
-                for row_num, row in enumerate(reader, start=2):
-                    cells_to_check = [row.get(column, "")] if column else row.values()
-                    for cell in cells_to_check:
-                        cell_lower = (cell or "").lower()
-                        if match_mode == "exact" and cell_lower == search_lower:
-                            matched = True
-                        elif match_mode == "starts_with" and cell_lower.startswith(search_lower):
-                            matched = True
-                        elif match_mode == "contains" and search_lower in cell_lower:
-                            matched = True
-                        else:
-                            matched = False
-                        if matched:
-                            matches.append((row_num, row))
-                            break
-                    if len(matches) >= max_results:
-                        break
+                files = _expand_csv_paths(file_path)
+                if not files:
+                    return f"Error: File not found: {file_path}"
+                return self._csv_search_many(files, search_value, column, match_mode, max_results, delimiter, query)
+            index = self._get_csv_index(file_path, delimiter)
+            headers = index.headers
+            if not headers:
+                return "Error: CSV file has no headers."
+            if column and column not in headers:
+                return f"Error: Column '{column}' not found. Available columns: {', '.join(headers)}"
+            columns = [headers.index(column)] if column else range(len(headers))
+            if query:
+                try:
+                    parsed = _CsvQuery.parse(query)
+                    if search_value:
+                        parsed.add_filter(column, match_mode, search_value)
+                    result = parsed.execute(index, max_results)
+                except ValueError as e:
+                    return f"Error: Invalid query: {e}"
+                return self._format_csv_query(result, max_results if parsed.limit is None else parsed.limit)
+            row_ids = index.match_rows(search_value.lower(), columns, match_mode, max_results)
+            # Row numbers count the header as row 1
+            matches = [(row_id + 2, row) for row_id, row in zip(row_ids, index.read_rows(row_ids))]
             if not matches:
                 scope = f"in column '{column}'" if column else "in any column"
                 return f"No matches found for '{search_value}' {scope}.\nColumns: {', '.join(headers)}"
@@ -3291,6 +6947,136 @@ class App:
         except Exception as e:
             return f"Error reading CSV: {e}"
 
+    def _get_csv_pool(self):
+        if self._csv_pool is None:
+            # spawn everywhere: forking a process that runs Tk and worker threads is unsafe
+            ctx = multiprocessing.get_context("spawn")
+            self._csv_pool_cutoff = ctx.Value("q", 0, lock=False)
+            self._csv_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=CSV_POOL_WORKERS, mp_context=ctx,
+                initializer=_csv_pool_init, initargs=(self._csv_pool_cutoff,))
+        return self._csv_pool
+
+    def _csv_search_many(self, files, search_value, column, match_mode, max_results, delimiter, query):
+        """Search several files and merge the results, labelling each row
+        with its file. Big jobs are spread over a process pool (parsing is
+        CPU-bound, so threads would serialise on the GIL). A plain row
+        search stops every worker once the files before the cutoff hold
+        max_results rows; queries that sort or aggregate read every file."""
+        try:
+            parsed = _CsvQuery.parse(query) if query else _CsvQuery()
+        except ValueError as e:
+            return f"Error: Invalid query: {e}"
+        limit = max_results if parsed.limit is None else parsed.limit
+        early = not parsed.aggregating and not parsed.order_by
+        args = [(path, delimiter, query, search_value, column, match_mode, max_results) for path in files]
+        results = [None] * len(files)
+
+        def covered():
+            """Last file needed once the finished prefix of files holds `limit` rows."""
+            rows = 0
+            for i, result in enumerate(results):
+                if result is None:
+                    return None
+                rows += len(result.get("rows", ()))
+                if rows >= limit:
+                    return i
+            return None
+
+        cutoff = None
+        total_bytes = sum(os.path.getsize(path) for path in files)
+        if len(files) > 1 and CSV_POOL_WORKERS > 1 and total_bytes >= CSV_POOL_MIN_BYTES:
+            workers = min(CSV_POOL_WORKERS, len(files))
+            self.queue.put({"type": "tool_info", "content": f"Searching {len(files)} files on {workers} worker processes...\n"})
+            with self._csv_pool_lock:
+                pool = self._get_csv_pool()
+                self._csv_pool_cutoff.value = len(files)
+                futures = {pool.submit(_csv_pool_search, i, *a): i for i, a in enumerate(args)}
+                pending = set(futures)
+                try:
+                    while pending:
+                        done, pending = concurrent.futures.wait(
+                            pending, timeout=0.25, return_when=concurrent.futures.FIRST_COMPLETED)
+                        for future in done:
+                            if not future.cancelled():
+                                results[futures[future]] = future.result()
+                        if cutoff is None:
+                            cutoff = -1 if self.stop_requested else covered() if early else None
+                            if cutoff is not None:
+                                self._csv_pool_cutoff.value = cutoff
+                                for future in pending:
+                                    if futures[future] > cutoff:
+                                        future.cancel()
+                except concurrent.futures.BrokenExecutor as e:
+                    self._csv_pool = None
+                    return f"Error: CSV worker processes failed: {e}"
+            plan = f"{len(files)} file(s) on {workers} worker processes"
+        else:
+            for i, a in enumerate(args):
+                if self.stop_requested:
+                    cutoff = i - 1
+                    break
+                results[i] = _csv_search_file(*a, stop=lambda: self.stop_requested)
+                if early and covered() is not None:
+                    cutoff = i
+                    break
+            plan = f"{len(files)} file(s) in-process"
+        if self.stop_requested:
+            plan += ", stopped"
+        elif cutoff is not None and cutoff < len(files) - 1:
+            plan += f", limit reached after {cutoff + 1}"
+
+        base = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in files])
+        named, skipped = [], []
+        for i, (path, result) in enumerate(zip(files, results)):
+            if result is None or (cutoff is not None and i > cutoff):
+                continue
+            name = os.path.relpath(os.path.abspath(path), base)
+            if "error" in result:
+                skipped.append(f"[Skipped {name}: {result['error']}]")
+            else:
+                named.append((name, result))
+        if not named and skipped:
+            return "Error: No file could be searched.\n" + "\n".join(skipped)
+        try:
+            merged = parsed.merge_results(named, max_results, plan)
+        except ValueError as e:
+            return f"Error: Invalid query: {e}"
+        if not query and not merged["rows"]:
+            scope = f"in column '{column}'" if column else "in any column"
+            output = f"No matches found for '{search_value}' {scope} of {len(named)} file(s)."
+        else:
+            output = self._format_csv_query(merged, limit)
+        return "\n".join([output] + skipped)
+
+    @staticmethod
+    def _format_csv_query(result, limit):
+        columns, rows, matched = result["columns"], result["rows"], result["matched"]
+        if result["aggregate"]:
+            shown = f"; showing {len(rows)}" if len(rows) < matched else ""
+            lines = [f"{matched} result row(s){shown}.", " | ".join(columns)]
+            lines.extend(" | ".join(_csv_format_value(v) for v in values) for _, values in rows)
+        elif not rows:
+            return f"No rows match the query.\nColumns: {', '.join(columns)}\n[Plan: {result['plan']}]"
+        else:
+            if matched is None:
+                lines = [f"Found {len(rows)} match(es). Columns: {', '.join(columns)}\n"]
+            else:
+                shown = f"; showing {len(rows)}" if len(rows) < matched else ""
+                lines = [f"Found {matched} match(es){shown}. Columns: {', '.join(columns)}\n"]
+            sources, row_columns = result.get("sources"), result.get("row_columns")
+            for k, (row_num, values) in enumerate(rows):
+                lines.append(f"--- {sources[k]}, Row {row_num} ---" if sources else f"--- Row {row_num} ---")
+                for name, value in zip(row_columns[k] if row_columns else columns, values):
+                    lines.append(f"  {name}: {value}")
+            if matched is None or len(rows) < matched:
+                lines.append(f"\n[Results limited to {limit}. Use LIMIT or max_results to change.]")
+        lines.append(f"[Plan: {result['plan']}]")
+        output = "\n".join(lines)
+        if len(output) > 20000:
+            output = output[:20000] + "\n\n[Output truncated...]"
+        return output
+
     # ── Desktop Automation Tools ────────────────────────────────────────
 
     KNOWN_APPS = {
@@ -3315,33 +7101,72 @@ class App:
         "teams": "start msteams:",
     }
 
-    def do_screenshot(self, region=None):
+    def do_screenshot(self, region=None, full=False):
         try:
-            if region:
-                img = pyautogui.screenshot(region=region)
-            else:
-                img = pyautogui.screenshot()
-            orig_w, orig_h = img.size
-            max_w = 1280
-            if orig_w > max_w:
-                ratio = orig_w / max_w
-                new_h = int(orig_h / ratio)
-                img = img.resize((max_w, new_h))
-                self._screenshot_scale = ratio
-                img_w, img_h = max_w, new_h
-            else:
-                self._screenshot_scale = 1.0
-                img_w, img_h = orig_w, orig_h
-            buf = io.BytesIO()
-            img.save(buf, format="PNG")
-            b64_data = base64.standard_b64encode(buf.getvalue()).decode("utf-8")
+            pipeline = self._screenshots
+            start = time.perf_counter()
+            img = pipeline.backend.grab(region)
+            capture = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            frame = pipeline.downscale(img)
+            resize = (time.perf_counter() - start) * 1000
+
+            delta = None
+            if region is None and SCREENSHOT_DELTAS:
+                start = time.perf_counter()
+                delta = self._screen_delta.compare(frame, self.context_policy["keep_screenshots"], full)
+                diff = (time.perf_counter() - start) * 1000
+            if delta is not None:
+                self._screenshot_scale = img.width / frame.width
+                return self._screenshot_delta(frame, *delta, {"capture": capture, "resize": resize, "diff": diff})
+
+            shot = pipeline.encode(frame)
+            shot["timings"] = {"capture": capture, "resize": resize + shot["timings"]["resize"],
+                               "encode": shot["timings"]["encode"], "b64": shot["timings"]["b64"]}
+            if region is None and shot["width"] != frame.width:
+                self._screen_delta.reset()   # shrunk to fit the byte budget; deltas would not line up
+            self._screenshot_scale = img.width / shot["width"]
+            self.queue.put({"type": "tool_info", "content": f"Screenshot: {_ScreenshotPipeline.describe(shot)}\n"})
             return [
-                {"type": "text", "text": f"Screenshot captured ({img_w}x{img_h}). Click coordinates are automatically mapped to the screen — just use the pixel positions you see in this image."},
-                {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": b64_data}},
+                {"type": "text", "text": f"Screenshot captured ({shot['width']}x{shot['height']}). Click coordinates are automatically mapped to the screen — just use the pixel positions you see in this image."},
+                {"type": "image", "source": {"type": "base64", "media_type": shot["media_type"], "data": shot["data"]}},
             ]
         except Exception as e:
             return f"Screenshot error: {e}"
 
+    def _screenshot_delta(self, frame, boxes, fraction, timings):
+        """Tool result for a screenshot that changed little: a thumbnail of
+        the whole screen plus full-resolution crops of the changed regions,
+        positioned in the same image space as the last full screenshot."""
+        size = f"{frame.width}x{frame.height}"
+        if not boxes:
+            self.queue.put({"type": "tool_info", "content": "Screenshot delta: no change\n"})
+            return (f"No visible change since the previous screenshot ({size}). "
+                    "Call screenshot with full=true for a complete image.")
+        pipeline = self._screenshots
+        shots = [pipeline.encode(frame, max_width=SCREENSHOT_THUMB_WIDTH, quality=50)]
+        shots += [pipeline.encode(frame.crop(box)) for box in boxes]
+        content = [
+            {"type": "text", "text": (
+                f"Screenshot delta: {len(boxes)} region(s) changed since the previous screenshot "
+                f"({fraction:.1%} of the screen); everything else is unchanged. Region positions are "
+                f"pixel coordinates in the same {size} image as a full screenshot, so use them for "
+                "clicks as usual. The first image is a low-resolution thumbnail of the whole screen. "
+                "Call screenshot with full=true for a complete image.")},
+            {"type": "image", "source": {"type": "base64", "media_type": shots[0]["media_type"], "data": shots[0]["data"]}},
+        ]
+        for n, (box, shot) in enumerate(zip(boxes, shots[1:]), start=1):
+            x0, y0, x1, y1 = box
+            content.append({"type": "text", "text": f"Region {n}: x={x0}, y={y0}, {x1 - x0}x{y1 - y0}"})
+            content.append({"type": "image", "source": {"type": "base64", "media_type": shot["media_type"], "data": shot["data"]}})
+        for stage in ("encode", "b64"):
+            timings[stage] = sum(shot["timings"][stage] for shot in shots)
+        stages = ", ".join(f"{stage} {ms:.1f} ms" for stage, ms in timings.items())
+        total = sum(shot["bytes"] for shot in shots)
+        self.queue.put({"type": "tool_info", "content": (
+            f"Screenshot delta: {len(boxes)} region(s), {fraction:.1%} changed, {total / 1024:.0f} KB ({stages})\n")})
+        return content
+
     def do_mouse_click(self, x, y, button="left", clicks=1):
         try:
             scale = self._screenshot_scale
@@ -3462,44 +7287,131 @@ class App:
         except Exception as e:
             return f"Wait for window error: {e}"
 
-    def do_read_screen_text(self, x, y, width, height):
+    @staticmethod
+    def _read_screen_regions(inp):
+        """Return read_screen_text's regions as (x, y, width, height) tuples,
+        or an error string when one is incomplete."""
+        raw = inp.get("regions")
+        if not isinstance(raw, list) or not raw:
+            raw = [inp]
+        regions = []
+        for r in raw:
+            values = (r.get("x"), r.get("y"), r.get("width"), r.get("height")) if isinstance(r, dict) else ()
+            if len(values) != 4 or None in values:
+                return f"read_screen_text error: missing region parameters. Got: {inp}"
+            regions.append(values)
+        return regions
+
+    def _capture_ocr_regions(self, regions):
+        """Grab the screen once around every region and crop each one out.
+        Returns the (box, hash) cache keys and crops. Blocking."""
+        scale = self._screenshot_scale
+        boxes = [tuple(int(v * scale) for v in region) for region in regions]
+        left = min(b[0] for b in boxes)
+        top = min(b[1] for b in boxes)
+        right = max(b[0] + b[2] for b in boxes)
+        bottom = max(b[1] + b[3] for b in boxes)
+        capture = self._screenshots.backend.grab((left, top, right - left, bottom - top))
+        crops = [capture.crop((sx - left, sy - top, sx - left + sw, sy - top + sh))
+                 for sx, sy, sw, sh in boxes]
+        keys = [(box, _perceptual_hash(img)) for box, img in zip(boxes, crops)]
+        return keys, crops
+
+    async def do_read_screen_text_async(self, regions):
+        """OCR (x, y, width, height) regions given in screenshot coordinates.
+
+        The screen is captured once, covering every region, on a worker
+        thread. Regions that look the same as when last read come from
+        self._ocr_cache; the rest are recognised concurrently on the agent
+        event loop this coroutine runs on."""
         try:
-            import winocr
-            import asyncio
-            scale = self._screenshot_scale
-            sx = int(x * scale)
-            sy = int(y * scale)
-            sw = int(width * scale)
-            sh = int(height * scale)
-            img = pyautogui.screenshot(region=(sx, sy, sw, sh))
-            result = asyncio.run(winocr.recognize_pil(img, lang="en"))
-            text = result.text.strip()
-            if not text:
-                return "OCR returned no text for the specified region."
-            return f"OCR text from ({x},{y} {width}x{height}):\n{text}"
+            start = time.perf_counter()
+            keys, crops = await asyncio.to_thread(self._capture_ocr_regions, regions)
+            texts = [self._ocr_cache.get(key) for key in keys]
+            missing = [i for i, text in enumerate(texts) if text is None]
+            captured = time.perf_counter()
+            if missing:
+                results = await self._recognize_all([crops[i] for i in missing])
+                for i, result in zip(missing, results):
+                    if isinstance(result, Exception):
+                        texts[i] = result
+                    else:
+                        texts[i] = result.strip()
+                        self._ocr_cache.put(keys[i], texts[i])
+            self.queue.put({"type": "tool_info", "content": (
+                f"OCR: {len(regions)} region(s), {len(regions) - len(missing)} cached, "
+                f"{len(missing)} recognised (capture {(captured - start) * 1000:.1f} ms, "
+                f"OCR {(time.perf_counter() - captured) * 1000:.1f} ms)\n")})
         except Exception as e:
             return f"OCR error: {e}"
 
-    def do_find_image_on_screen(self, image_path, confidence=0.8):
+        if len(regions) == 1:
+            text = texts[0]
+            if isinstance(text, Exception):
+                return f"OCR error: {text}"
+            if not text:
+                return "OCR returned no text for the specified region."
+            x, y, width, height = regions[0]
+            return f"OCR text from ({x},{y} {width}x{height}):\n{text}"
+        parts = []
+        for n, ((x, y, width, height), text) in enumerate(zip(regions, texts), start=1):
+            if isinstance(text, Exception):
+                text = f"OCR error: {text}"
+            parts.append(f"[{n}] ({x},{y} {width}x{height}):\n{text or '(no text)'}")
+        return f"OCR text from {len(regions)} regions:\n\n" + "\n\n".join(parts)
+
+    async def _recognize_all(self, images):
+        return await asyncio.gather(*(self._ocr.recognize(img) for img in images),
+                                    return_exceptions=True)
+
+    def do_find_image_on_screen(self, image_paths, confidence=0.8, region=None):
+        """Find each reference image in a single capture of the screen, or of
+        `region` (x, y, width, height in screenshot coordinates) when given."""
         try:
-            if not os.path.isfile(image_path):
-                return f"Image file not found: {image_path}"
-            location = pyautogui.locateOnScreen(image_path, confidence=confidence)
-            if location is None:
-                return f"Image not found on screen (confidence={confidence}): {image_path}"
-            cx = location.left + location.width // 2
-            cy = location.top + location.height // 2
+            if cv2 is None:
+                return "Find image error: opencv-python is not installed (pip install opencv-python)"
+            for path in image_paths:
+                if not os.path.isfile(path):
+                    return f"Image file not found: {path}"
             scale = self._screenshot_scale
+            start = time.perf_counter()
+            if region:
+                left, top = int(region[0] * scale), int(region[1] * scale)
+                img = self._screenshots.backend.grab(
+                    (left, top, int(region[2] * scale), int(region[3] * scale)))
+            else:
+                left = top = 0
+                img = self._screenshots.backend.grab()
+            screen = np.asarray(img if img.mode == "RGB" else img.convert("RGB"))
+            captured = time.perf_counter()
+            matches = self._templates.locate_all(screen, image_paths, confidence)
+            self.queue.put({"type": "tool_info", "content": (
+                f"Template match: {len(image_paths)} image(s) in {img.width}x{img.height} "
+                f"(capture {(captured - start) * 1000:.1f} ms, "
+                f"match {(time.perf_counter() - captured) * 1000:.1f} ms)\n")})
+        except Exception as e:
+            return f"Find image error: {e}"
+
+        parts = []
+        for path, (box, score) in zip(image_paths, matches):
+            if box is None:
+                parts.append(f"Image not found on screen (confidence={confidence}, "
+                             f"best match {score:.2f}): {path}")
+                continue
+            bx, by, bw, bh = box[0] + left, box[1] + top, box[2], box[3]
+            cx = bx + bw // 2
+            cy = by + bh // 2
             img_cx = int(cx / scale) if scale else cx
             img_cy = int(cy / scale) if scale else cy
-            return (
-                f"Image found at region ({location.left}, {location.top}, "
-                f"{location.width}x{location.height})\n"
+            parts.append(
+                f"Image found at region ({bx}, {by}, {bw}x{bh}), match {score:.2f}\n"
                 f"Center (screen coords): ({cx}, {cy})\n"
                 f"Center (image coords for clicking): ({img_cx}, {img_cy})"
             )
-        except Exception as e:
-            return f"Find image error: {e}"
+        if len(parts) == 1:
+            return parts[0]
+        return "\n\n".join(f"[{n}] {os.path.basename(path)}:\n{part}"
+                            for n, (path, part) in enumerate(zip(image_paths, parts), start=1))
 
     def do_mouse_drag(self, start_x, start_y, end_x, end_y, duration=0.5, button="left"):
         try:
@@ -3667,23 +7579,17 @@ class App:
         try:
             if not self._page:
                 return "No browser connected. Call browser_open first."
+            start = time.perf_counter()
             raw = self._page.screenshot(type="png")
             img = Image.open(io.BytesIO(raw))
-            orig_w, orig_h = img.size
-            max_w = 1280
-            if orig_w > max_w:
-                ratio = orig_w / max_w
-                new_h = int(orig_h / ratio)
-                img = img.resize((max_w, new_h))
-                img_w, img_h = max_w, new_h
-            else:
-                img_w, img_h = orig_w, orig_h
-            buf = io.BytesIO()
-            img.save(buf, format="PNG")
-            b64_data = base64.standard_b64encode(buf.getvalue()).decode("utf-8")
+            img.load()
+            capture = (time.perf_counter() - start) * 1000
+            shot = self._screenshots.encode(img)
+            shot["timings"] = {"capture": capture, **shot["timings"]}
+            self.queue.put({"type": "tool_info", "content": f"Browser screenshot: {_ScreenshotPipeline.describe(shot)}\n"})
             return [
-                {"type": "text", "text": f"Browser screenshot ({img_w}x{img_h})."},
-                {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": b64_data}},
+                {"type": "text", "text": f"Browser screenshot ({shot['width']}x{shot['height']})."},
+                {"type": "image", "source": {"type": "base64", "media_type": shot["media_type"], "data": shot["data"]}},
             ]
         except Exception as e:
             return f"Browser screenshot error: {e}"
@@ -3767,53 +7673,15 @@ class App:
         return str(obj)
 
     def _payload_for_display(self, messages):
-        display_msgs = []
-        for msg in messages:
-            content = msg.get("content", msg.get("content"))
-            if isinstance(content, list):
-                content = [
-                    self._make_serializable(block) if not isinstance(block, dict) else block
-                    for block in content
-                ]
-            display_msgs.append({"role": msg["role"], "content": content})
-        display_msgs = copy.deepcopy(display_msgs)
-
-        def _truncate_images(blocks):
-            for block in blocks:
-                if isinstance(block, dict):
-                    if block.get("type") == "image":
-                        src = block.get("source", {})
-                        if src.get("data"):
-                            src["data"] = src["data"][:40] + "...[truncated]"
-                    if block.get("type") == "tool_result" and isinstance(block.get("content"), list):
-                        _truncate_images(block["content"])
-
-        for msg in display_msgs:
-            content = msg.get("content")
-            if isinstance(content, list):
-                _truncate_images(content)
+        """Render the API payload as indented JSON for the Debug view.
 
+        The history is encoded in place by _iter_display_json, which swaps
+        base64 image data for short placeholders as it goes, so the messages
+        (and their screenshots) are never copied."""
         if self.provider == "OpenAI":
             system_prompt = self._build_system_prompt()
-            tools = self._get_tools()
-            responses_tools = self._tools_to_responses(tools) if tools else None
-            responses_input = self._messages_to_responses(display_msgs)
-            # Truncate input_image data in Responses API input
-            for item in responses_input:
-                c = item.get("content")
-                if isinstance(c, list):
-                    for part in c:
-                        if isinstance(part, dict) and part.get("type") == "input_image":
-                            url = part.get("image_url", "")
-                            if isinstance(url, str) and url.startswith("data:"):
-                                part["image_url"] = url[:60] + "...[truncated]"
-                # Also truncate images in function_call_output
-                if item.get("type") == "function_call_output" and isinstance(item.get("output"), list):
-                    for part in item["output"]:
-                        if isinstance(part, dict) and part.get("type") == "input_image":
-                            url = part.get("image_url", "")
-                            if isinstance(url, str) and url.startswith("data:"):
-                                part["image_url"] = url[:60] + "...[truncated]"
+            responses_tools = self._get_responses_tools()
+            responses_input = self._messages_to_responses(messages)
             payload = {
                 "model": self.model,
                 "input": responses_input,
@@ -3833,8 +7701,10 @@ class App:
                 "stream": True,
                 "system": self._build_system_prompt(),
                 "tools": self._get_tools(),
-                "messages": display_msgs,
+                "messages": messages,
             }
+            if self.prompt_caching:
+                payload.update(_with_cache_breakpoints(payload["system"], payload["tools"], messages))
             if self.thinking_enabled:
                 support = self._model_supports_thinking()
                 payload["max_tokens"] = MAX_TOKENS_THINKING
@@ -3846,14 +7716,53 @@ class App:
             else:
                 payload["max_tokens"] = MAX_TOKENS
                 payload["temperature"] = self.temperature
-        return json.dumps(payload, indent=2)
+        return "".join(_iter_display_json(payload, default=self._make_serializable))
+
+    def _tool_cache_key(self):
+        """Everything the assembled tool list depends on."""
+        desktop = self.desktop_enabled.get()
+        size = None
+        if desktop:
+            # One read: _invalidate_tool_cache may reset the attribute meanwhile
+            size = self._screen_size or tuple(pyautogui.size())
+            self._screen_size = size
+        od_names = tuple(n for n, s in self.skills.items() if s.get("mode") == "on_demand")
+        return (desktop, self.browser_enabled.get(), self.meta_enabled.get(), od_names, size)
+
+    def _invalidate_tool_cache(self, *_args):
+        """Drop cached tool schemas (checkbox toggled or skills changed).
+        Also re-reads the screen size on next use. Usable as a Tk var trace."""
+        self._tool_cache.clear()
+        self._responses_tool_cache.clear()
+        self._screen_size = None
 
     def _get_tools(self):
+        """Return the tool schemas for the current toggles and skills.
+
+        The list is assembled once per cache key and returned as a shared
+        tuple — callers must not modify it."""
+        key = self._tool_cache_key()
+        tools = self._tool_cache.get(key)
+        if tools is None:
+            tools = self._build_tools(*key)
+            self._tool_cache[key] = tools
+        return tools
+
+    def _get_responses_tools(self):
+        """Return _get_tools() converted to Responses API format (cached), or None."""
+        key = self._tool_cache_key()
+        if key not in self._responses_tool_cache:
+            tools = self._get_tools()
+            self._responses_tool_cache[key] = tuple(self._tools_to_responses(tools)) if tools else None
+        return self._responses_tool_cache[key]
+
+    @staticmethod
+    def _build_tools(desktop, browser, meta, od_names, screen_size):
         tools = copy.deepcopy(TOOLS)
-        if self.desktop_enabled.get():
-            desktop = copy.deepcopy(DESKTOP_TOOLS)
-            screen_w, screen_h = pyautogui.size()
-            for tool in desktop:
+        if desktop:
+            desktop_tools = copy.deepcopy(DESKTOP_TOOLS)
+            screen_w, screen_h = screen_size
+            for tool in desktop_tools:
                 if tool["name"] == "screenshot":
                     tool["description"] = (
                         f"Take a screenshot of the screen (resolution {screen_w}x{screen_h}). "
@@ -3863,12 +7772,11 @@ class App:
                         "Optionally capture only a region by specifying x, y, width, height."
                     )
                     break
-            tools.extend(desktop)
-        if self.browser_enabled.get():
+            tools.extend(desktop_tools)
+        if browser:
             tools.extend(copy.deepcopy(BROWSER_TOOLS))
-        if self.meta_enabled.get():
+        if meta:
             tools.extend(copy.deepcopy(META_TOOLS))
-        od_names = [n for n, s in self.skills.items() if s.get("mode") == "on_demand"]
         if od_names:
             tools.append({
                 "name": "get_skill",
@@ -3879,29 +7787,69 @@ class App:
                         "skill_name": {
                             "type": "string",
                             "description": "Name of the skill to retrieve.",
-                            "enum": od_names,
+                            "enum": list(od_names),
                         }
                     },
                     "required": ["skill_name"],
                 },
             })
-        return tools
+        return tuple(tools)
+
+    async def _execute_tool_async(self, block):
+        """Run one tool_use block from the event loop, once the tool limiter
+        grants it a slot. fetch_webpage, multi-query web_search and
+        read_screen_text are native coroutines, awaited here rather than from
+        a worker thread, so Stop cancels them mid-request; every other tool
+        is a blocking call handed to the loop's shared executor. A thread
+        cannot be interrupted, so Stop only stops waiting for it: the call
+        stays in self._threaded_tools until it returns, and stream_worker
+        waits for it there before ending the run."""
+        async with self._tool_limits.slot(block.name):
+            if block.name == "fetch_webpage":
+                url = block.input.get("url", "")
+                self.queue.put({"type": "tool_info", "content": f"Fetching: {url}\n"})
+                return await self.fetch_url_async(url)
+            queries = block.input.get("queries") if block.name == "web_search" else None
+            if isinstance(queries, list) and queries:
+                queries = [str(q) for q in queries]
+                self.queue.put({"type": "tool_info", "content": f"Searching ({len(queries)} queries): {' | '.join(queries)}\n"})
+                return await self.search_web_many_async(queries)
+            if block.name == "read_screen_text":
+                if not self.desktop_enabled.get():
+                    return "Desktop control is disabled. Enable the Desktop checkbox to use this tool."
+                regions = self._read_screen_regions(block.input)
+                if isinstance(regions, str):
+                    return regions
+                if len(regions) == 1:
+                    rx, ry, rw, rh = regions[0]
+                    self.queue.put({"type": "tool_info", "content": f"OCR region ({rx},{ry} {rw}x{rh})...\n"})
+                else:
+                    self.queue.put({"type": "tool_info", "content": f"OCR {len(regions)} regions...\n"})
+                return await self.do_read_screen_text_async(regions)
+            executor = self._browser_thread if block.name in BROWSER_TOOL_NAMES else None
+            future = asyncio.get_running_loop().run_in_executor(executor, self._execute_tool, block)
+            self._threaded_tools[block.id] = future
+            future.add_done_callback(lambda _: self._threaded_tools.pop(block.id, None))
+            return await asyncio.shield(future)
 
     def _execute_tool(self, block):
         """Execute a single tool_use block and return the result.
 
-        Thread-safe for parallel-safe tools (web_search, fetch_webpage,
-        csv_search, get_skill). Sequential tools (desktop, browser,
-        run_powershell, user_prompt) must only be called from one thread.
+        May be called from several threads at once for calls that
+        _tool_dependencies() lets overlap: independent tools (web_search,
+        csv_search, get_skill) and read-only observers. Browser tools must
+        be called on self._browser_thread. fetch_webpage, multi-query
+        web_search and read_screen_text are coroutines on the agent loop,
+        awaited directly by _execute_tool_async, and are not handled here:
+        blocking a worker thread on them could starve the executor they
+        themselves need.
         """
         if block.name == "web_search":
             query = block.input.get("query", "")
+            if not query:
+                return "Error: 'query' or 'queries' is required."
             self.queue.put({"type": "tool_info", "content": f"Searching: {query}\n"})
             return self.search_web(query)
-        elif block.name == "fetch_webpage":
-            url = block.input.get("url", "")
-            self.queue.put({"type": "tool_info", "content": f"Fetching: {url}\n"})
-            return self.fetch_url(url)
         elif block.name == "run_powershell":
             cmd = block.input.get("command", "")
             self.queue.put({"type": "tool_info", "content": f"Running: {cmd}\n"})
@@ -3910,13 +7858,18 @@ class App:
             inp = block.input
             fp = inp.get("file_path", "")
             sv = inp.get("search_value", "")
-            self.queue.put({"type": "tool_info", "content": f"Searching CSV: {os.path.basename(fp)} for '{sv}'\n"})
+            q = inp.get("query")
+            if q:
+                self.queue.put({"type": "tool_info", "content": f"Querying CSV: {os.path.basename(fp)}: {q}\n"})
+            else:
+                self.queue.put({"type": "tool_info", "content": f"Searching CSV: {os.path.basename(fp)} for '{sv}'\n"})
             return self.do_csv_search(
                 fp, sv,
                 column=inp.get("column"),
                 match_mode=inp.get("match_mode", "contains"),
                 max_results=inp.get("max_results", 50),
                 delimiter=inp.get("delimiter"),
+                query=q,
             )
         elif block.name == "user_prompt":
             prompt_msg = block.input.get("message", "")
@@ -3925,7 +7878,7 @@ class App:
         elif block.name in ("screenshot", "mouse_click", "type_text",
                              "press_key", "mouse_scroll", "open_application",
                              "find_window", "clipboard_read", "clipboard_write",
-                             "wait_for_window", "read_screen_text",
+                             "wait_for_window",
                              "find_image_on_screen", "mouse_drag"):
             if not self.desktop_enabled.get():
                 return "Desktop control is disabled. Enable the Desktop checkbox to use this tool."
@@ -3935,7 +7888,7 @@ class App:
                 region = None
                 if all(k in inp for k in ("x", "y", "width", "height")):
                     region = (inp["x"], inp["y"], inp["width"], inp["height"])
-                return self.do_screenshot(region)
+                return self.do_screenshot(region, full=bool(inp.get("full")))
             elif block.name == "mouse_click":
                 cx, cy = inp.get("x"), inp.get("y")
                 if cx is None or cy is None:
@@ -3985,16 +7938,21 @@ class App:
                 timeout = inp.get("timeout", 10)
                 self.queue.put({"type": "tool_info", "content": f"Waiting for window: {title}\n"})
                 return self.do_wait_for_window(title, timeout=timeout)
-            elif block.name == "read_screen_text":
-                rx, ry, rw, rh = inp.get("x"), inp.get("y"), inp.get("width"), inp.get("height")
-                if None in (rx, ry, rw, rh):
-                    return f"read_screen_text error: missing region parameters. Got: {inp}"
-                self.queue.put({"type": "tool_info", "content": f"OCR region ({rx},{ry} {rw}x{rh})...\n"})
-                return self.do_read_screen_text(rx, ry, rw, rh)
             elif block.name == "find_image_on_screen":
-                path = inp.get("image_path", "")
-                self.queue.put({"type": "tool_info", "content": f"Finding image: {os.path.basename(path)}\n"})
-                return self.do_find_image_on_screen(path, confidence=inp.get("confidence", 0.8))
+                paths = inp.get("image_paths")
+                if not isinstance(paths, list) or not paths:
+                    paths = [inp.get("image_path", "")]
+                paths = [str(p) for p in paths]
+                region = inp.get("region")
+                if isinstance(region, dict):
+                    region = (region.get("x"), region.get("y"), region.get("width"), region.get("height"))
+                    if None in region:
+                        return f"find_image_on_screen error: incomplete region. Got: {inp}"
+                else:
+                    region = None
+                names = ", ".join(os.path.basename(p) for p in paths)
+                self.queue.put({"type": "tool_info", "content": f"Finding image: {names}\n"})
+                return self.do_find_image_on_screen(paths, confidence=inp.get("confidence", 0.8), region=region)
             elif block.name == "mouse_drag":
                 sx, sy = inp.get("start_x"), inp.get("start_y")
                 ex, ey = inp.get("end_x"), inp.get("end_y")
@@ -4084,12 +8042,141 @@ class App:
             mode = "headless" if headless else "GUI"
             self.queue.put({"type": "tool_info", "content": f"run_instruction: {name} ({mode})\n"})
             return self.do_run_instruction(block.input)
+        elif block.name == "search_chats":
+            query = block.input.get("query", "")
+            self.queue.put({"type": "tool_info", "content": f"Searching saved chats: {query}\n"})
+            return self.do_search_chats(block.input)
         else:
             return f"Unknown tool: {block.name}"
 
-    def _stream_anthropic_call(self, messages, max_retries, label_emitted):
+    async def _manage_context(self, messages):
+        """Context-window stage run before each API call; returns the list of
+        messages to send.
+
+        That list is self._context_view, a per-run copy of `messages` that is
+        extended with new messages on each call, so `messages` itself (the
+        history that is saved) keeps full tool outputs and screenshots. In
+        the view, screenshots older than keep_screenshots turns are replaced
+        with [Screenshot] placeholders and tool outputs older than
+        truncate_after turns are truncated. Both rules move in steps of their
+        N turns (a whole block is compacted at once), so the compacted prefix
+        changes only every N turns instead of on every call. Changed
+        messages are swapped for new dicts; messages that every rule has
+        finished with are skipped on later calls via _context_watermark. With summarize on, the oldest
+        turns are folded into a summary once the estimate passes the budget."""
+        view = self._context_view
+        view.extend(messages[len(view) + self._context_folded:])
+        messages = view
+        policy = self.context_policy
+        keep_shots = max(1, int(policy["keep_screenshots"]))
+        truncate_after = max(1, int(policy["truncate_after"]))
+        max_chars = int(policy["max_tool_output"])
+
+        # Turn of a message = number of user messages up to and including it.
+        # A rule with window N covers turns up to the last multiple of N that
+        # is at least N turns old, so it keeps between N and 2N-1 turns.
+        turns = [0] * len(messages)
+        turn = 0
+        for i, msg in enumerate(messages):
+            if msg.get("role") == "user":
+                turn += 1
+            turns[i] = turn
+        shots_upto = (turn - keep_shots) // keep_shots * keep_shots
+        truncate_upto = (turn - truncate_after) // truncate_after * truncate_after
+        final_turn = min(shots_upto, truncate_upto)
+
+        shots = truncated = 0
+        watermark = self._context_watermark
+        for i in range(self._context_watermark, len(messages)):
+            if turns[i] > max(shots_upto, truncate_upto):
+                break
+            new_msg, s, t = _compact_tool_results(
+                messages[i], turns[i] <= shots_upto, max_chars if turns[i] <= truncate_upto else 0)
+            if new_msg is not messages[i]:
+                messages[i] = new_msg
+                shots += s
+                truncated += t
+            if watermark == i and turns[i] <= final_turn:
+                watermark = i + 1
+        self._context_watermark = watermark
+
+        if shots or truncated:
+            self.queue.put({"type": "tool_info", "content": (
+                f"Context: replaced {shots} old screenshot(s), truncated {truncated} tool output(s) "
+                f"(~{_estimate_tokens(messages):,} tokens)\n"
+            )})
+        if policy["summarize"] and _estimate_tokens(messages) > int(policy["token_budget"]):
+            before = len(messages)
+            await self._summarize_oldest_turns(messages)
+            self._context_folded += before - len(messages)
+        return messages
+
+    async def _summarize_oldest_turns(self, messages):
+        """Fold the oldest half of the turns after the instruction message into
+        a summary appended to that message. Cuts only before an assistant
+        message, so tool_use/tool_result pairs are never split."""
+        n_turns = (len(messages) - 1) // 2
+        cut = 1 + 2 * (n_turns // 2)
+        while cut < len(messages) - 1 and not (
+                messages[cut].get("role") == "assistant" and messages[cut - 1].get("role") == "user"):
+            cut += 1
+        if cut <= 1 or cut >= len(messages) - 1:
+            return
+
+        lines = []
+        for msg in messages[1:cut]:
+            content = msg["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            for block in content:
+                if not isinstance(block, dict):
+                    block = self._make_serializable(block)
+                btype = block.get("type")
+                if btype == "text":
+                    lines.append(f"{msg['role']}: {block.get('text', '')[:1000]}")
+                elif btype == "tool_use":
+                    lines.append(f"tool call {block.get('name')}: {json.dumps(block.get('input'), default=str)[:500]}")
+                elif btype == "tool_result":
+                    result = block.get("content")
+                    if isinstance(result, list):
+                        result = " ".join(b.get("text", "") for b in result if isinstance(b, dict))
+                    lines.append(f"tool result: {str(result)[:1000]}")
+        prompt = (
+            "Summarise these earlier steps of an agent run so the agent can continue the task "
+            "without them. Keep facts, results, file paths, URLs, decisions and what remains to do. "
+            "Be concise.\n\n" + "\n".join(lines)
+        )
+
+        self.queue.put({"type": "tool_info", "content": f"Context: summarising {cut - 1} oldest messages...\n"})
+        try:
+            if self.provider == "OpenAI":
+                summary = (await self.async_openai_client.responses.create(
+                    model=self.model, input=prompt, store=False)).output_text
+            else:
+                response = await self.async_client.messages.create(
+                    model=self.model, max_tokens=2048,
+                    messages=[{"role": "user", "content": prompt}])
+                summary = "".join(b.text for b in response.content if b.type == "text")
+        except Exception as e:
+            self.queue.put({"type": "tool_info", "content": f"Context summary failed: {e}\n"})
+            return
+
+        first = messages[0]
+        content = first["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        summary_block = {"type": "text", "text": f"[Summary of earlier steps]\n{summary}"}
+        messages[0:cut] = [{**first, "content": [*content, summary_block]}]
+        self._context_watermark = 0
+        self._screen_delta.reset()   # the last full screenshot may have been folded away
+
+    async def _stream_anthropic_call(self, messages, max_retries, label_emitted, speculative=None):
         """Execute one Anthropic API call with streaming and retry logic.
-        Returns (stop_reason, content_blocks, full_text, had_thinking, label_emitted)."""
+        Returns (stop_reason, content_blocks, full_text, had_thinking, label_emitted).
+
+        When `speculative` is a dict, each parallel-safe tool_use block is
+        started as soon as its content_block_stop arrives; the running task
+        is stored under the block's id for stream_worker to pick up."""
         full_text = ""
         had_thinking = False
 
@@ -4099,6 +8186,9 @@ class App:
             "messages": messages,
             "tools": self._get_tools(),
         }
+        if self.prompt_caching:
+            api_kwargs.update(_with_cache_breakpoints(
+                api_kwargs["system"], api_kwargs["tools"], messages))
         if self.thinking_enabled:
             support = self._model_supports_thinking()
             api_kwargs["max_tokens"] = MAX_TOKENS_THINKING
@@ -4113,12 +8203,21 @@ class App:
 
         for attempt in range(max_retries):
             try:
-                with self.client.messages.stream(**api_kwargs) as stream:
+                async with self.async_client.messages.stream(**api_kwargs) as stream:
                     in_thinking = False
-                    for event in stream:
+                    tool_inputs = {}  # block index -> (name, id, [partial_json, ...])
+                    state_changed = False  # a state-changing call was requested; later ones must wait for it
+                    async for event in stream:
                         if event.type == "content_block_start":
                             block = event.content_block
-                            if hasattr(block, "type") and block.type == "thinking":
+                            # Input is not known yet, so read find_window as activating
+                            if getattr(block, "type", None) == "tool_use" \
+                                    and not _tool_capabilities(block.name, {"activate": True})["read_only"]:
+                                state_changed = True
+                            if speculative is not None and getattr(block, "type", None) == "tool_use" \
+                                    and block.name in PARALLEL_SAFE_TOOLS and not state_changed:
+                                tool_inputs[event.index] = (block.name, block.id, [])
+                            elif hasattr(block, "type") and block.type == "thinking":
                                 in_thinking = True
                                 had_thinking = True
                                 self.queue.put({"type": "thinking_start"})
@@ -4136,43 +8235,64 @@ class App:
                             elif hasattr(delta, "type") and delta.type == "text_delta":
                                 full_text += delta.text
                                 self.queue.put({"type": "text_delta", "content": delta.text})
+                            elif tool_inputs and event.index in tool_inputs and delta.type == "input_json_delta":
+                                tool_inputs[event.index][2].append(delta.partial_json)
                         elif event.type == "content_block_stop":
                             if in_thinking:
                                 self.queue.put({"type": "thinking_end"})
                                 in_thinking = False
-                    final_message = stream.get_final_message()
+                            if tool_inputs and event.index in tool_inputs:
+                                name, tool_id, parts = tool_inputs.pop(event.index)
+                                try:
+                                    tool_input = json.loads("".join(parts) or "{}")
+                                except json.JSONDecodeError:
+                                    continue  # run it normally once the message is complete
+                                speculative[tool_id] = asyncio.ensure_future(
+                                    self._timed_tool(_ToolBlock(name, tool_id, tool_input)))
+                    final_message = await stream.get_final_message()
                 break  # success
             except anthropic.RateLimitError as e:
+                if speculative:
+                    self._cancel_speculative(speculative)
                 if attempt < max_retries - 1:
                     wait = min(2 ** attempt * 5, 60)
                     self.queue.put({
                         "type": "tool_info",
                         "content": f"Rate limited — retrying in {wait}s (attempt {attempt + 1}/{max_retries})...\n",
                     })
-                    time.sleep(wait)
+                    await asyncio.sleep(wait)
                     full_text = ""
                 else:
                     raise
             except anthropic.APIStatusError as e:
+                if speculative:
+                    self._cancel_speculative(speculative)
                 if e.status_code == 529 and attempt < max_retries - 1:
                     wait = min(2 ** attempt * 10, 90)
                     self.queue.put({
                         "type": "tool_info",
                         "content": f"API overloaded — retrying in {wait}s (attempt {attempt + 1}/{max_retries})...\n",
                     })
-                    time.sleep(wait)
+                    await asyncio.sleep(wait)
                     full_text = ""
                 else:
                     raise
 
+        if self.prompt_caching:
+            usage = final_message.usage
+            self.queue.put({"type": "tool_info", "content": (
+                f"Prompt cache: {getattr(usage, 'cache_read_input_tokens', 0) or 0:,} read, "
+                f"{getattr(usage, 'cache_creation_input_tokens', 0) or 0:,} written, "
+                f"{usage.input_tokens:,} uncached input tokens\n"
+            )})
+
         return final_message.stop_reason, final_message.content, full_text, had_thinking, label_emitted
 
-    def _stream_responses_call(self, messages, max_retries, label_emitted):
+    async def _stream_responses_call(self, messages, max_retries, label_emitted):
         """Execute one OpenAI Responses API call with streaming and retry logic.
         Returns (stop_reason, content_blocks, full_text, had_thinking, label_emitted)."""
         system_prompt = self._build_system_prompt()
-        tools = self._get_tools()
-        responses_tools = self._tools_to_responses(tools) if tools else None
+        responses_tools = self._get_responses_tools()
         responses_input = self._messages_to_responses(messages)
         is_reasoning = self._is_openai_reasoning_model()
 
@@ -4192,7 +8312,7 @@ class App:
         for attempt in range(max_retries):
             try:
                 full_text, stop_reason, content_blocks, had_thinking, label_emitted = \
-                    self._stream_responses(api_kwargs, label_emitted)
+                    await self._stream_responses(api_kwargs, label_emitted)
                 break  # success
             except openai.APITimeoutError:
                 if attempt < max_retries - 1:
@@ -4209,7 +8329,7 @@ class App:
                         "type": "tool_info",
                         "content": f"Rate limited — retrying in {wait}s (attempt {attempt + 1}/{max_retries})...\n",
                     })
-                    time.sleep(wait)
+                    await asyncio.sleep(wait)
                 else:
                     raise
             except openai.APIError as e:
@@ -4219,13 +8339,19 @@ class App:
                         "type": "tool_info",
                         "content": f"API error — retrying in {wait}s (attempt {attempt + 1}/{max_retries})...\n",
                     })
-                    time.sleep(wait)
+                    await asyncio.sleep(wait)
                 else:
                     raise
 
         return stop_reason, content_blocks, full_text, had_thinking, label_emitted
 
-    def stream_worker(self, messages):
+    async def stream_worker(self, messages):
+        """The agent loop, run as a task on the app's event loop (self._async).
+        Pressing Stop cancels the task, which interrupts the in-flight stream,
+        retry wait or async tool where it stands."""
+        self._agent_started = True
+        self._screen_delta.reset()   # the first screenshot of a run is always a full frame
+        speculative = {}  # tool_use id -> task started while the message was streaming
         try:
             # Sync temperature from spinbox
             try:
@@ -4239,26 +8365,36 @@ class App:
                 label_emitted = True
 
             call_num = 0
+            self._context_watermark = 0
+            self._context_view = []      # what the API sees: `messages`, compacted
+            self._context_folded = 0     # messages of `messages` folded into a summary
             while True:
                 # Check stop request between API calls
                 if self.stop_requested:
                     self.queue.put({"type": "tool_info", "content": "Agent stopped by user.\n"})
                     break
 
+                api_messages = await self._manage_context(messages)
                 call_num += 1
-                payload_text = self._payload_for_display(messages)
                 self.queue.put({"type": "call_counter", "content": call_num})
-                self.queue.put({"type": "debug", "content": payload_text})
+                self._tool_limits.reset_peak()
+                # Payload rendering is only worth its cost when the Debug view will show it
+                if self.debug_enabled.get():
+                    self.queue.put({"type": "debug", "content": self._payload_for_display(api_messages)})
 
                 max_retries = 10
 
                 # Dispatch to provider-specific streaming
                 if self.provider == "OpenAI":
                     stop_reason, content_blocks, full_text, had_thinking, label_emitted = \
-                        self._stream_responses_call(messages, max_retries, label_emitted)
+                        await self._stream_responses_call(api_messages, max_retries, label_emitted)
                 else:
                     stop_reason, content_blocks, full_text, had_thinking, label_emitted = \
-                        self._stream_anthropic_call(messages, max_retries, label_emitted)
+                        await self._stream_anthropic_call(
+                            api_messages, max_retries, label_emitted,
+                            speculative if self.speculative_tools else None)
+
+                message_done = time.perf_counter()
 
                 if self.stop_requested:
                     self.queue.put({"type": "tool_info", "content": "Agent stopped by user.\n"})
@@ -4276,9 +8412,6 @@ class App:
                     else:
                         tool_blocks = [b for b in content_blocks if b.type == "tool_use"]
 
-                    # -- Parallel-safe tools (network I/O, pure lookups) --
-                    PARALLEL_SAFE = {"web_search", "fetch_webpage", "csv_search", "get_skill"}
-
                     # Log all tool calls up front
                     for block in tool_blocks:
                         tool_call_detail = json.dumps(
@@ -4287,53 +8420,60 @@ class App:
                         )
                         self.queue.put({"type": "tool_call_debug", "content": tool_call_detail})
 
-                    # Partition into parallel-safe vs sequential, preserving original index
-                    parallel_items = []   # [(index, block), ...]
-                    sequential_items = [] # [(index, block), ...]
-                    for idx, block in enumerate(tool_blocks):
-                        if block.name in PARALLEL_SAFE:
-                            parallel_items.append((idx, block))
-                        else:
-                            sequential_items.append((idx, block))
-
-                    # Pre-allocate results list to preserve original order
-                    tool_results_ordered = [None] * len(tool_blocks)
-
-                    # Execute parallel-safe tools concurrently
-                    if parallel_items:
-                        if len(parallel_items) > 1:
-                            self.queue.put({"type": "tool_info", "content": f"Running {len(parallel_items)} tools in parallel...\n"})
-                        with concurrent.futures.ThreadPoolExecutor(max_workers=len(parallel_items)) as executor:
-                            future_map = {}
-                            for idx, block in parallel_items:
-                                future = executor.submit(self._execute_tool, block)
-                                future_map[future] = (idx, block)
-                            for future in concurrent.futures.as_completed(future_map):
-                                idx, block = future_map[future]
-                                result = future.result()
-                                tool_results_ordered[idx] = {
-                                    "type": "tool_result",
-                                    "tool_use_id": block.id,
-                                    "content": result,
-                                }
-
-                    # Execute sequential tools one at a time, in order
-                    had_user_prompt = False
-                    for idx, block in sequential_items:
-                        result = self._execute_tool(block)
-                        tool_results_ordered[idx] = {
-                            "type": "tool_result",
-                            "tool_use_id": block.id,
-                            "content": result,
-                        }
-                        if block.name == "user_prompt":
-                            had_user_prompt = True
+                    # Dependency-aware schedule from TOOL_CAPABILITIES: every call starts as a
+                    # task and waits only for the earlier calls it conflicts with, so independent
+                    # tools and read-only observers overlap while state changes keep their order.
+                    # Tools already started speculatively during the stream are awaited, not re-run.
+                    deps = _tool_dependencies([(block.name, block.input) for block in tool_blocks])
+                    steps = []   # dependency depth of each call
+                    for prereqs in deps:
+                        steps.append(1 + max((steps[i] for i in prereqs), default=0))
+                    if len(tool_blocks) > 1 and max(steps) < len(tool_blocks):
+                        self.queue.put({"type": "tool_info", "content": (
+                            f"Running {len(tool_blocks)} tools in parallel...\n" if max(steps) == 1 else
+                            f"Running {len(tool_blocks)} tools in {max(steps)} ordered steps...\n")})
+
+                    async def run_after(prereqs, block):
+                        if prereqs:
+                            await asyncio.wait(prereqs)
+                        return await self._timed_tool(block)
+
+                    early = sum(block.id in speculative for block in tool_blocks)
+                    tasks = []
+                    for block, prereqs in zip(tool_blocks, deps):
+                        task = speculative.pop(block.id, None)
+                        if task is None:
+                            task = asyncio.ensure_future(run_after([tasks[i] for i in prereqs], block))
+                        tasks.append(task)
+                    self._cancel_speculative(speculative)
+                    timed = await asyncio.gather(*tasks)
+
+                    # Results stay in the order the API requested them
+                    tool_results_ordered = [
+                        {"type": "tool_result", "tool_use_id": block.id, "content": result}
+                        for block, (result, _, _) in zip(tool_blocks, timed)
+                    ]
+                    if early:
+                        # Without speculation these tools would have started when the
+                        # message completed and lasted as long as the slowest of them
+                        spec = [t for block, t in zip(tool_blocks, timed) if block.name in PARALLEL_SAFE_TOOLS]
+                        slowest = max(end - started for _, started, end in spec)
+                        saved = max(0.0, message_done + slowest - max(end for _, _, end in spec))
+                        self.queue.put({"type": "tool_info", "content": (
+                            f"Speculative tools: {early}/{len(spec)} started while streaming, "
+                            f"{saved:.2f}s saved this turn\n")})
+                    if self._tool_limits.peak_waiting:
+                        self.queue.put({"type": "tool_info", "content": (
+                            f"Tool queue: peak depth {self._tool_limits.peak_waiting} this turn "
+                            f"(limits: {self._tool_limits.describe()})\n")})
+                    had_user_prompt = any(block.name == "user_prompt" for block in tool_blocks)
 
                     # After user_prompt, reset label so next response gets a fresh "Agent:" heading
                     if had_user_prompt:
                         label_emitted = False
 
                     messages.append({"role": "user", "content": tool_results_ordered})
+                    self._screen_delta.next_turn()
                 else:
                     # Normal end_turn — check if instruction expects interactivity
                     # If the instruction mentions user_prompt, the model likely forgot
@@ -4341,7 +8481,8 @@ class App:
                     if "user_prompt" in self.agent_instruction:
                         self.queue.put({"type": "tool_info",
                                         "content": "Auto-prompting (agent ended turn without user_prompt)...\n"})
-                        auto_response = self.do_user_prompt(
+                        auto_response = await asyncio.to_thread(
+                            self.do_user_prompt,
                             "The agent ended its turn. What would you like to do next? (Leave blank to stop)")
                         if not auto_response.strip():
                             break
@@ -4358,12 +8499,78 @@ class App:
             if self._headless:
                 self.root.after(500, self._on_close)
 
+        except asyncio.CancelledError:
+            results = await self._wait_threaded_tools()
+            self._cancel_pending_tool_calls(messages, results)
+            self.queue.put({"type": "tool_info", "content": "Agent stopped by user.\n"})
+            self.queue.put({"type": "complete"})
+            raise
         except Exception as e:
             self.queue.put({"type": "error", "content": str(e)})
+        finally:
+            self._cancel_speculative(speculative)
+
+    async def _timed_tool(self, block):
+        """Run a tool and return (result, started, finished) perf_counter times."""
+        started = time.perf_counter()
+        result = await self._execute_tool_async(block)
+        return result, started, time.perf_counter()
+
+    @staticmethod
+    def _cancel_speculative(speculative):
+        """Cancel speculative tool tasks nobody will await (a retried stream,
+        a turn that ended without tool use, Stop) and forget them."""
+        for task in speculative.values():
+            if not task.cancel() and not task.cancelled():
+                task.exception()  # mark a failure as retrieved so asyncio does not log it
+        speculative.clear()
+
+    async def _wait_threaded_tools(self):
+        """After Stop, wait for tools still running on worker threads (a
+        PowerShell command, a click or keystrokes) so no result is written and
+        no new run starts while they act. Returns {tool_use id: result} for
+        those that finished normally."""
+        running = dict(self._threaded_tools)
+        if not running:
+            return {}
+        self.queue.put({"type": "tool_info", "content": (
+            f"Waiting for {len(running)} running tool(s) to finish...\n")})
+        await asyncio.wait(running.values())
+        return {tool_id: future.result() for tool_id, future in running.items()
+                if not future.cancelled() and future.exception() is None}
+
+    @staticmethod
+    def _cancel_pending_tool_calls(messages, results=None):
+        """After Stop, answer any tool calls left without results so the
+        history (and a chat saved from it) stays a valid conversation. Calls
+        that ran to completion on a worker thread keep their real result
+        from `results`; the rest are marked cancelled."""
+        if not messages or messages[-1].get("role") != "assistant":
+            return
+        content = messages[-1]["content"]
+        if isinstance(content, str):
+            return
+        ids = []
+        for block in content:
+            if isinstance(block, dict):
+                if block.get("type") == "tool_use":
+                    ids.append(block["id"])
+            elif getattr(block, "type", None) == "tool_use":
+                ids.append(block.id)
+        if ids:
+            messages.append({"role": "user", "content": [
+                {"type": "tool_result", "tool_use_id": i,
+                 "content": (results or {}).get(i, "Cancelled: the agent was stopped by the user.")}
+                for i in ids
+            ]})
 
     def check_queue(self):
+        """Render stage: drain the worker queue once per tick into a single
+        batched chat_display update, bounded by the frame budget."""
+        batch = _RenderBatch()
+        deadline = time.perf_counter() + self._render_budget_ms / 1000.0
         try:
-            while True:
+            while time.perf_counter() < deadline:
                 msg = self.queue.get_nowait()
                 if msg["type"] == "debug" and not self.debug_enabled.get():
                     pass
@@ -4371,91 +8578,52 @@ class App:
                     pass
                 elif msg["type"] == "call_counter":
                     tag = "call_counter" if self.debug_enabled.get() else "call_counter_subtle"
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(tk.END, f"  Call #{msg['content']}  ", tag)
-                    self.chat_display.insert(tk.END, "\n", "debug")
-                    self.chat_display.see(tk.END)
-                    self.chat_display.config(state="disabled")
+                    batch.add(f"  Call #{msg['content']}  ", tag)
+                    batch.add("\n", "debug")
                 elif msg["type"] == "debug":
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(tk.END, "--- PAYLOAD SENT TO API ---\n", "debug_label")
-                    self.chat_display.insert(tk.END, msg["content"] + "\n", "debug")
-                    self.chat_display.insert(tk.END, "--- END PAYLOAD ---\n\n", "debug_label")
-                    self.chat_display.see(tk.END)
-                    self.chat_display.config(state="disabled")
+                    batch.add("--- PAYLOAD SENT TO API ---\n", "debug_label")
+                    batch.add(msg["content"] + "\n", "debug")
+                    batch.add("--- END PAYLOAD ---\n\n", "debug_label")
                 elif msg["type"] == "tool_call_debug" and not self.tool_calls_enabled.get():
                     pass
                 elif msg["type"] == "tool_call_debug":
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(tk.END, "--- TOOL CALL ---\n", "tool_debug_label")
-                    self.chat_display.insert(tk.END, msg["content"] + "\n", "tool_debug")
-                    self.chat_display.insert(tk.END, "--- END TOOL CALL ---\n", "tool_debug_label")
-                    self.chat_display.see(tk.END)
-                    self.chat_display.config(state="disabled")
+                    batch.add("--- TOOL CALL ---\n", "tool_debug_label")
+                    batch.add(msg["content"] + "\n", "tool_debug")
+                    batch.add("--- END TOOL CALL ---\n", "tool_debug_label")
                 elif msg["type"] == "thinking_start":
                     self._current_thinking_text = ""
                     if self.show_thinking.get():
-                        self.chat_display.config(state="normal")
-                        self.chat_display.insert(tk.END, "Thinking:\n", "thinking_label")
-                        self.chat_display.see(tk.END)
-                        self.chat_display.config(state="disabled")
+                        batch.add("Thinking:\n", "thinking_label")
                 elif msg["type"] == "thinking_delta":
                     self._current_thinking_text += msg["content"]
                     if self.show_thinking.get():
-                        self.chat_display.config(state="normal")
-                        self.chat_display.insert(tk.END, msg["content"], "thinking")
-                        self.chat_display.see(tk.END)
-                        self.chat_display.config(state="disabled")
+                        batch.add(msg["content"], "thinking")
                 elif msg["type"] == "thinking_end":
                     if self.show_thinking.get():
-                        self.chat_display.config(state="normal")
-                        self.chat_display.insert(tk.END, "\n\n", "thinking")
-                        self.chat_display.see(tk.END)
-                        self.chat_display.config(state="disabled")
+                        batch.add("\n\n", "thinking")
                 elif msg["type"] == "label":
                     self._current_response_text = ""
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(tk.END, "Agent:\n", "assistant_label")
-                    self.chat_display.config(state="disabled")
+                    batch.add("Agent:\n", "assistant_label", scroll=False)
                 elif msg["type"] == "text_delta":
                     self._current_response_text += msg["content"]
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(tk.END, msg["content"], "assistant")
-                    self.chat_display.see(tk.END)
-                    self.chat_display.config(state="disabled")
+                    batch.add(msg["content"], "assistant")
                 elif msg["type"] == "user_prompt_echo":
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(tk.END, "\nYou:\n", "user_label")
-                    self.chat_display.insert(tk.END, msg["content"] + "\n\n", "user")
-                    self.chat_display.see(tk.END)
-                    self.chat_display.config(state="disabled")
+                    batch.add("\nYou:\n", "user_label")
+                    batch.add(msg["content"] + "\n\n", "user")
                 elif msg["type"] == "tool_info" and not self.show_activity.get():
                     pass
                 elif msg["type"] == "tool_info":
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(tk.END, msg["content"], "tool_info")
-                    self.chat_display.see(tk.END)
-                    self.chat_display.config(state="disabled")
+                    batch.add(msg["content"], "tool_info")
                 elif msg["type"] == "warning":
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(tk.END, msg["content"], "warning")
-                    self.chat_display.see(tk.END)
-                    self.chat_display.config(state="disabled")
+                    batch.add(msg["content"], "warning")
                 elif msg["type"] == "complete":
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(tk.END, "\n\n")
-                    self.chat_display.config(state="disabled")
+                    batch.add("\n\n", scroll=False)
                     self.streaming = False
                     self._start_button.config(state="normal")
                     self._stop_button.config(state="disabled")
                     self.instruction_button.config(state="normal")
                 elif msg["type"] == "error":
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(
-                        tk.END, f"Error: {msg['content']}\n\n", "error"
-                    )
-                    self.chat_display.see(tk.END)
-                    self.chat_display.config(state="disabled")
+                    batch.add(f"Error: {msg['content']}\n\n", "error")
                     self.streaming = False
                     self._start_button.config(state="normal")
                     self._stop_button.config(state="disabled")
@@ -4464,7 +8632,13 @@ class App:
             pass
         except Exception:
             pass
-        self.root.after(50, self.check_queue)
+        try:
+            batch.flush(self.chat_display)
+        except Exception:
+            pass
+        # Budget exhausted with work still queued — yield to Tk briefly, then continue
+        delay = 1 if not self.queue.empty() else RENDER_TICK_MS
+        self.root.after(delay, self.check_queue)
 
     # ── Window Close ────────────────────────────────────────────────────
 
@@ -4478,18 +8652,34 @@ class App:
             return
         self._finish_close()
 
+    async def _close_async_clients(self):
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        for client in (self.async_client, self.async_openai_client):
+            if client is not None:
+                await client.close()
+
     def _finish_close(self):
         if self.streaming:
             self.root.after(200, self._finish_close)
             return
         self._save_last_state()
-        self._auto_save_on_close()
-        self._cleanup_browser()
+        self._auto_save_on_close(final=True)
+        self._chat_index.save()
+        try:
+            self._browser_thread.submit(self._cleanup_browser).result(timeout=5)
+        except Exception:
+            pass
+        self._browser_thread.shutdown(wait=False, cancel_futures=True)
+        self._async.close(self._close_async_clients())
+        if self._csv_pool is not None:
+            self._csv_pool.shutdown(wait=False, cancel_futures=True)
         self._release_instance_lock()
         self.root.destroy()
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()   # csv_search worker processes in frozen builds
     import argparse
     import signal
     signal.signal(signal.SIGINT, signal.SIG_IGN)
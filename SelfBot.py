@@ -655,6 +655,8 @@ MANUAL_THINKING_PREFIXES = ("claude-3-5-sonnet", "claude-sonnet-4-5", "claude-ha
 EFFORT_LEVELS = ["low", "medium", "high", "max"]
 BUDGET_PRESETS = {"1K": 1024, "4K": 4096, "8K": 8192, "16K": 16384, "32K": 32768}
 DEFAULT_GEOMETRY = "1050x930"
+RENDER_TICK_MS = 50           # check_queue polling interval
+RENDER_FRAME_BUDGET_MS = 12   # max main-thread time spent draining the queue per tick
 
 DEFAULT_SYSTEM_PROMPT = (
     "You are a capable personal assistant for Roman with access to a rich set of tools. "
@@ -714,6 +716,9 @@ DEFAULT_SYSTEM_PROMPT = (
 
 PROMPTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "system_prompts.json")
 CHATS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "saved_chats")
+CHAT_JOURNAL_MIN_COMPACT_BYTES = 256 * 1024   # a chat's journal is folded into its snapshot above max(this, snapshot size)
+CHAT_CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_catalog.json")
+CHAT_PREVIEW_CHARS = 80
 APP_STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app_state.json")
 APP_STATE_FILE_2 = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app_state_2.json")
 SKILLS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "skills.json")
@@ -761,6 +766,344 @@ def _get_window_pid(hwnd):
     return pid.value
 
 
+class _RenderBatch:
+    """Collects chat_display inserts for one check_queue frame.
+
+    Consecutive runs that share a tag are merged, and the whole frame is
+    written with a single Text.insert call (Tk accepts alternating
+    text/tag pairs), one state toggle and at most one scroll."""
+
+    def __init__(self):
+        self._runs = []      # [[parts, tag], ...]
+        self._scroll = False
+        self.inserts = 0     # logical inserts queued this frame
+
+    def add(self, text, tag="", scroll=True):
+        if not text:
+            return
+        if self._runs and self._runs[-1][1] == tag:
+            self._runs[-1][0].append(text)
+        else:
+            self._runs.append([[text], tag])
+        self.inserts += 1
+        if scroll:
+            self._scroll = True
+
+    def flush(self, widget):
+        """Write pending runs to widget. Returns the number of Tk inserts made."""
+        if not self._runs:
+            return 0
+        args = []
+        for parts, tag in self._runs:
+            args.append("".join(parts))
+            args.append(tag)
+        widget.config(state="normal")
+        widget.insert(tk.END, *args)
+        widget.config(state="disabled")
+        if self._scroll:
+            widget.see(tk.END)
+        self._runs = []
+        self._scroll = False
+        self.inserts = 0
+        return 1
+
+
+class _ChatStore:
+    """One saved chat on disk: the JSON snapshot (saved_chats/<name>.json,
+    the format every reader already understands), an append-only JSONL
+    journal (<name>.jsonl) of what changed since, and the .txt transcript.
+
+    save() serialises only messages it has not written yet. New messages
+    are appended to the journal. Messages swapped for new dicts (context
+    truncation) are journalled as replacements at their index. Anything
+    else (summarisation, a new run) is compacted into a fresh snapshot.
+    Each batch is one write and one fsync. The journal is folded into the
+    snapshot once it outgrows it, so total I/O stays linear in the chat's
+    length. The snapshot and the journal's first line share a journal_id,
+    so load() skips a journal left behind by an interrupted compaction."""
+
+    TRANSCRIPT_MARK = "transcript_saved"
+
+    def __init__(self, name, directory=CHATS_DIR, min_compact_bytes=CHAT_JOURNAL_MIN_COMPACT_BYTES):
+        self.name = name
+        self.directory = directory
+        self.min_compact_bytes = min_compact_bytes
+        self.path = os.path.join(directory, App._sanitize_filename(name))
+        self.journal_path = os.path.splitext(self.path)[0] + ".jsonl"
+        self.txt_path = os.path.join(directory, App._sanitize_filename(name, '.txt'))
+        self._sources = None     # message objects already written; None until the first save
+        self._slots = []         # per source message: its index in _messages, or None if not saved
+        self._messages = []      # serialised messages, as on disk
+        self._meta = {}
+        self._snapshot_bytes = 0
+        self._journal_bytes = 0
+        self._journal_ops = 0
+        self._transcript_started = False
+        self.bytes_written = 0   # across snapshot, journal and transcript
+
+    def save(self, messages, meta, serialize, compact=False):
+        """Bring the files up to date with `messages` and the `meta` fields.
+        `serialize(msg)` returns a message's saved form, or None to skip it.
+        With compact=True, a non-empty journal is folded into the snapshot."""
+        ops = self._changes(messages, serialize)
+        if ops is None:
+            self._sources = list(messages)
+            self._slots, self._messages = [], []
+            for msg in messages:
+                saved = serialize(msg)
+                self._slots.append(None if saved is None else len(self._messages))
+                if saved is not None:
+                    self._messages.append(saved)
+            self._meta = dict(meta)
+            self.compact()
+            return
+        changed = {k: v for k, v in meta.items() if k not in self._meta or self._meta[k] != v}
+        if changed:
+            self._meta.update(changed)
+            ops.insert(0, {"meta": changed})
+        if ops:
+            data = "".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops).encode("utf-8")
+            with open(self.journal_path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_bytes += len(data)
+            self._journal_ops += len(ops)
+            self.bytes_written += len(data)
+        if self._journal_ops and (compact or self._journal_bytes > max(self.min_compact_bytes, self._snapshot_bytes)):
+            self.compact()
+
+    @property
+    def saved_messages(self):
+        """The chat's messages as saved (read-only)."""
+        return self._messages
+
+    def _changes(self, messages, serialize):
+        """Journal ops turning what was written into `messages`, or None when
+        the history was restructured and needs a new snapshot."""
+        if self._sources is None or len(messages) < len(self._sources):
+            return None
+        ops = []
+        for i, old in enumerate(self._sources):
+            msg = messages[i]
+            if msg is old:
+                continue
+            saved = serialize(msg)
+            slot = self._slots[i]
+            if (saved is None) != (slot is None):
+                return None
+            self._sources[i] = msg
+            if saved is not None and saved != self._messages[slot]:
+                self._messages[slot] = saved
+                ops.append({"seq": slot, "message": saved})
+        for msg in messages[len(self._sources):]:
+            saved = serialize(msg)
+            self._sources.append(msg)
+            if saved is None:
+                self._slots.append(None)
+                continue
+            self._slots.append(len(self._messages))
+            ops.append({"seq": len(self._messages), "message": saved})
+            self._messages.append(saved)
+        return ops
+
+    def compact(self):
+        """Write the snapshot from memory, then start an empty journal."""
+        os.makedirs(self.directory, exist_ok=True)
+        journal_id = os.urandom(8).hex()
+        data = {"messages": self._messages, **self._meta, "name": self.name, "journal_id": journal_id}
+        snapshot = json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+        header = (json.dumps({"journal_id": journal_id}) + "\n").encode("utf-8")
+        # Snapshot first: a crash in between leaves an old journal whose id no longer matches
+        for path, body in ((self.path, snapshot), (self.journal_path, header)):
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        self._snapshot_bytes = len(snapshot)
+        self._journal_bytes = len(header)
+        self._journal_ops = 0
+        self.bytes_written += len(snapshot) + len(header)
+
+    def save_transcript(self, display):
+        """Append the chat display's text added since the last call to the
+        .txt transcript. A left-gravity Tk mark records how far has been
+        written. The file is rewritten on this store's first call, and when
+        the display was cleared since (the mark has collapsed to the start)."""
+        mark = self.TRANSCRIPT_MARK
+        rewrite = not self._transcript_started or display.compare(mark, "==", "1.0")
+        text = display.get("1.0" if rewrite else mark, "end-1c")
+        if rewrite or text:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.txt_path, "w" if rewrite else "a", encoding="utf-8") as f:
+                f.write(text)
+            self.bytes_written += len(text)
+        display.mark_set(mark, "end-1c")
+        display.mark_gravity(mark, "left")
+        self._transcript_started = True
+
+    @staticmethod
+    def load(path):
+        """Read a saved chat: the snapshot with its journal replayed. A torn
+        last journal line (a crash mid-write) ends the replay."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        try:
+            with open(os.path.splitext(path)[0] + ".jsonl", "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return data
+        try:
+            header = json.loads(lines[0]) if lines else {}
+        except ValueError:
+            return data
+        if not data.get("journal_id") or header.get("journal_id") != data["journal_id"]:
+            return data
+        messages = data.setdefault("messages", [])
+        for line in lines[1:]:
+            try:
+                op = json.loads(line)
+            except ValueError:
+                break
+            if "meta" in op:
+                data.update(op["meta"])
+            elif op.get("seq", -1) < len(messages):
+                messages[op["seq"]] = op["message"]
+            elif op["seq"] == len(messages):
+                messages.append(op["message"])
+            else:
+                break
+        return data
+
+
+class _ChatCatalog:
+    """Index of saved_chats/ for the Load Chat list, kept in chat_catalog.json:
+    per chat file its name, mtime, size, model, message count and the first
+    line of its first user message.
+
+    refresh() stats the directory (one scandir) and re-reads only chats
+    whose .json or .jsonl changed since they were indexed, so listing chats
+    doesn't parse every file. Chats written by other processes (MyAgent, the
+    peer instance) are picked up the same way. record() and forget() update
+    an entry directly after a save or delete."""
+
+    VERSION = 1
+
+    def __init__(self, path=CHAT_CATALOG_FILE, directory=CHATS_DIR):
+        self.path = path
+        self.directory = directory
+        self._entries = None     # chat file name -> entry, read on first use
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._entries = dict(data["chats"]) if data.get("version") == self.VERSION else {}
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                self._entries = {}
+        return self._entries
+
+    def _write(self):
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "chats": self._entries}, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _signature(stats, fname):
+        """(mtime_ns, size) of the chat's snapshot and journal."""
+        sig = []
+        for key in (fname, fname[:-5] + ".jsonl"):
+            st = stats.get(key)
+            sig += [st.st_mtime_ns, st.st_size] if st is not None else [0, 0]
+        return sig
+
+    @staticmethod
+    def _entry(fname, data, signature):
+        preview = ""
+        for msg in data.get("messages", []):
+            if not isinstance(msg, dict) or msg.get("role") != "user":
+                continue
+            content = msg.get("content", "")
+            if isinstance(content, list):
+                content = " ".join(b.get("text", "") for b in content
+                                   if isinstance(b, dict) and b.get("type") == "text")
+            lines = str(content).strip().splitlines()
+            if lines:
+                preview = lines[0].strip()[:CHAT_PREVIEW_CHARS]
+                break
+        return {
+            "name": data.get("name", fname[:-5]),
+            "mtime": max(signature[0], signature[2]) / 1e9,
+            "size": signature[1] + signature[3],
+            "model": data.get("model", ""),
+            "messages": len(data.get("messages", [])),
+            "preview": preview,
+            "signature": signature,
+        }
+
+    def _scan(self):
+        try:
+            with os.scandir(self.directory) as it:
+                return {e.name: e.stat() for e in it
+                        if e.name.endswith((".json", ".jsonl")) and e.is_file()}
+        except OSError:
+            return {}
+
+    def refresh(self):
+        """Bring the index up to date with the directory; returns its entries."""
+        entries = self._load()
+        stats = self._scan()
+        changed = False
+        for fname in stats:
+            if not fname.endswith(".json"):
+                continue
+            sig = self._signature(stats, fname)
+            entry = entries.get(fname)
+            if entry is not None and entry.get("signature") == sig:
+                continue
+            try:
+                data = _ChatStore.load(os.path.join(self.directory, fname))
+            except (OSError, ValueError):
+                data = None
+            if isinstance(data, dict):
+                entries[fname] = self._entry(fname, data, sig)
+            else:
+                entries.pop(fname, None)
+            changed = True
+        for fname in [f for f in entries if f not in stats]:
+            del entries[fname]
+            changed = True
+        if changed:
+            self._write()
+        return entries
+
+    def record(self, store, model):
+        """Index a chat just saved through `store` without re-reading it."""
+        fname = os.path.basename(store.path)
+        entries = self._load()
+        stats = {}
+        for key in (fname, fname[:-5] + ".jsonl"):
+            try:
+                stats[key] = os.stat(os.path.join(self.directory, key))
+            except OSError:
+                pass
+        sig = self._signature(stats, fname)
+        entries[fname] = self._entry(fname, {"name": store.name, "model": model,
+                                             "messages": store.saved_messages}, sig)
+        self._write()
+
+    def forget(self, name):
+        if self._load().pop(App._sanitize_filename(name), None) is not None:
+            self._write()
+
+
 class App:
     def __init__(self, root):
         self.root = root
@@ -779,6 +1122,8 @@ class App:
         # Initialize API client and state
         self.client = anthropic.Anthropic()
         self.messages = []
+        self._chat_store = None  # _ChatStore of the chat being auto-saved
+        self._chat_catalog = _ChatCatalog()
         self.queue = queue.Queue()
         self.streaming = False
         self.pending_images = []  # list of (base64_data, media_type, filename)
@@ -823,6 +1168,7 @@ class App:
         self._first_message_text = ""
         self._current_response_text = ""
         self._current_thinking_text = ""
+        self._render_budget_ms = RENDER_FRAME_BUDGET_MS
         self._duo_mode = "--no-geometry" in sys.argv
 
         self.setup_ui()
@@ -833,7 +1179,7 @@ class App:
             self._save_last_state()
         except Exception:
             pass
-        self.root.after(50, self.check_queue)
+        self.root.after(RENDER_TICK_MS, self.check_queue)
         self.root.after(5000, self._periodic_save)
         self.root.protocol("WM_DELETE_WINDOW", self._on_close)
         # Instance 2: start polling for injected chat content
@@ -965,7 +1311,7 @@ class App:
         self._chat_combo_var = tk.StringVar()
         self._chat_combo = ttk.Combobox(
             chat_toolbar, textvariable=self._chat_combo_var, state="readonly",
-            font=("Arial", 10), width=20
+            font=("Arial", 10), width=20, postcommand=self._refresh_chat_list
         )
         self._chat_combo.pack(side=tk.LEFT, padx=(0, 5))
         self._chat_combo.bind("<<ComboboxSelected>>", lambda e: self._load_chat())
@@ -1793,46 +2139,37 @@ class App:
     def _chat_file_path(name):
         return os.path.join(CHATS_DIR, App._sanitize_filename(name))
 
-    def _load_saved_chats(self):
-        """Load all saved chats from individual files in saved_chats directory."""
-        chats = {}
-        if not os.path.isdir(CHATS_DIR):
-            return chats
-        for fname in os.listdir(CHATS_DIR):
-            if not fname.endswith('.json'):
-                continue
-            fpath = os.path.join(CHATS_DIR, fname)
-            try:
-                with open(fpath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                name = data.get('name', fname[:-5])
-                chats[name] = data
-            except (json.JSONDecodeError, OSError):
-                continue
-        return chats
-
     def _load_single_chat(self, name):
-        """Load a single chat by name."""
+        """Load a single chat by name (snapshot plus journal)."""
         fpath = self._chat_file_path(name)
         if not os.path.exists(fpath):
             return None
         try:
-            with open(fpath, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return _ChatStore.load(fpath)
         except (json.JSONDecodeError, OSError):
             return None
 
-    def _save_chat_file(self, name, data):
-        """Save a single chat to its own file."""
-        os.makedirs(CHATS_DIR, exist_ok=True)
-        data['name'] = name
-        fpath = self._chat_file_path(name)
-        with open(fpath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+    def _chat_store_for(self, name):
+        """The _ChatStore for `name`, reused while the same chat is saved."""
+        if self._chat_store is None or self._chat_store.name != name:
+            self._chat_store = _ChatStore(name)
+        return self._chat_store
+
+    def _chat_meta(self):
+        return {
+            "system_prompt": self.system_prompt,
+            "system_prompt_name": self.system_prompt_name,
+            "model": self.model,
+            "temperature": self.temperature,
+            "thinking_enabled": self.thinking_enabled,
+            "thinking_effort": self.thinking_effort,
+            "thinking_budget": self.thinking_budget,
+        }
 
     def _refresh_chat_list(self):
-        chats = self._load_saved_chats()
-        self._chat_combo["values"] = sorted(chats.keys())
+        """Fill the Load Chat list from the chat catalog (bodies load in _load_chat)."""
+        entries = self._chat_catalog.refresh()
+        self._chat_combo["values"] = sorted({e["name"] for e in entries.values()})
 
     @staticmethod
     def _clean_content_block(block):
@@ -1870,32 +2207,29 @@ class App:
             return {"type": "redacted_thinking", "data": block.get("data", "")}
         return block
 
-    def _serialize_messages(self):
-        """Convert messages to JSON-serializable format, stripping image data, thinking, and extra fields."""
-        serialized = []
-        for msg in self.messages:
-            content = msg["content"]
-            if isinstance(content, str):
-                serialized.append({"role": msg["role"], "content": content})
-            elif isinstance(content, list):
-                blocks = []
-                for block in content:
-                    if isinstance(block, dict):
-                        if block.get("type") in ("thinking", "redacted_thinking"):
-                            continue
-                        blocks.append(self._clean_content_block(block))
-                    elif hasattr(block, "model_dump"):
-                        d = block.model_dump()
-                        if d.get("type") in ("thinking", "redacted_thinking"):
-                            continue
-                        blocks.append(self._clean_content_block(d))
-                    else:
-                        blocks.append({"type": "text", "text": str(block)})
-                if blocks:
-                    serialized.append({"role": msg["role"], "content": blocks})
+    @staticmethod
+    def _serialize_message(msg):
+        """Convert a message to JSON-serializable format, stripping image data, thinking, and extra fields.
+        Returns None when nothing in it is saved."""
+        content = msg["content"]
+        if isinstance(content, str):
+            return {"role": msg["role"], "content": content}
+        if not isinstance(content, list):
+            return {"role": msg["role"], "content": str(content)}
+        blocks = []
+        for block in content:
+            if isinstance(block, dict):
+                if block.get("type") in ("thinking", "redacted_thinking"):
+                    continue
+                blocks.append(App._clean_content_block(block))
+            elif hasattr(block, "model_dump"):
+                d = block.model_dump()
+                if d.get("type") in ("thinking", "redacted_thinking"):
+                    continue
+                blocks.append(App._clean_content_block(d))
             else:
-                serialized.append({"role": msg["role"], "content": str(content)})
-        return serialized
+                blocks.append({"type": "text", "text": str(block)})
+        return {"role": msg["role"], "content": blocks} if blocks else None
 
     def _save_chat(self):
         name = self.chat_name_entry.get().strip()
@@ -1906,20 +2240,10 @@ class App:
             messagebox.showwarning("Empty chat", "There is no chat to save.")
             return
         save_name = self._save_name(name)
-        self._save_chat_file(save_name, {
-            "messages": self._serialize_messages(),
-            "system_prompt": self.system_prompt,
-            "system_prompt_name": self.system_prompt_name,
-            "model": self.model,
-            "temperature": self.temperature,
-            "thinking_enabled": self.thinking_enabled,
-            "thinking_effort": self.thinking_effort,
-            "thinking_budget": self.thinking_budget,
-        })
-        txt_path = os.path.join("saved_chats", self._sanitize_filename(save_name, '.txt'))
-        output_text = self.chat_display.get("1.0", tk.END).rstrip()
-        with open(txt_path, "w", encoding="utf-8") as f:
-            f.write(output_text)
+        store = self._chat_store_for(save_name)
+        store.save(self.messages, self._chat_meta(), self._serialize_message, compact=True)
+        store.save_transcript(self.chat_display)
+        self._chat_catalog.record(store, self.model)
         self._refresh_chat_list()
         self._chat_combo_var.set(save_name)
 
@@ -1994,12 +2318,15 @@ class App:
             messagebox.showwarning("Not found", f"No saved chat named '{name}'.")
             return
         os.remove(fpath)
-        # Also remove the associated .txt export if it exists
-        txt_path = os.path.join(CHATS_DIR, self._sanitize_filename(name, '.txt'))
-        try:
-            os.remove(txt_path)
-        except OSError:
-            pass
+        # Also remove the associated journal and .txt export if they exist
+        for ext in ('.jsonl', '.txt'):
+            try:
+                os.remove(os.path.join(CHATS_DIR, self._sanitize_filename(name, ext)))
+            except OSError:
+                pass
+        if self._chat_store is not None and self._chat_store.name == name:
+            self._chat_store = None
+        self._chat_catalog.forget(name)
         self._refresh_chat_list()
         self._chat_combo_var.set("")
         self.chat_name_entry.delete(0, tk.END)
@@ -2917,8 +3244,9 @@ class App:
             return
         self.send_message()
 
-    def _auto_save_on_close(self):
-        """Silently save the current chat (like pressing SAVE) before closing."""
+    def _auto_save_on_close(self, final=False):
+        """Silently save the current chat (like pressing SAVE). New messages are
+        appended to the chat's journal; on close (final) it is folded into the snapshot."""
         if not self.messages:
             return
         name = self.chat_name_entry.get().strip()
@@ -2939,22 +3267,14 @@ class App:
             if not name:
                 name = time.strftime("SelfBot_%Y%m%d_%H%M%S")
         save_name = self._save_name(name)
-        self._save_chat_file(save_name, {
-            "messages": self._serialize_messages(),
-            "system_prompt": self.system_prompt,
-            "system_prompt_name": self.system_prompt_name,
-            "model": self.model,
-            "temperature": self.temperature,
-            "thinking_enabled": self.thinking_enabled,
-            "thinking_effort": self.thinking_effort,
-            "thinking_budget": self.thinking_budget,
-        })
+        store = self._chat_store_for(save_name)
+        store.save(self.messages, self._chat_meta(), self._serialize_message, compact=final)
+        # Periodic saves are picked up by the catalog's change check; index the final one now
+        if final:
+            self._chat_catalog.record(store, self.model)
         # Always export the output .txt on close-save
-        txt_path = os.path.join("saved_chats", self._sanitize_filename(save_name, '.txt'))
         try:
-            output_text = self.chat_display.get("1.0", tk.END).rstrip()
-            with open(txt_path, "w", encoding="utf-8") as f:
-                f.write(output_text)
+            store.save_transcript(self.chat_display)
         except Exception:
             pass
 
@@ -2986,7 +3306,7 @@ class App:
             return
         self._save_last_state()
         # Auto-save the chat on close (all instances)
-        self._auto_save_on_close()
+        self._auto_save_on_close(final=True)
         # Find any remaining peer windows to close
         peer_windows = []
         try:
@@ -3641,8 +3961,12 @@ class App:
             self.queue.put({"type": "error", "content": str(e)})
 
     def check_queue(self):
+        """Render stage: drain the worker queue once per tick into a single
+        batched chat_display update, bounded by the frame budget."""
+        batch = _RenderBatch()
+        deadline = time.perf_counter() + self._render_budget_ms / 1000.0
         try:
-            while True:
+            while time.perf_counter() < deadline:
                 msg = self.queue.get_nowait()
                 if msg["type"] == "debug" and not self.debug_enabled.get():
                     pass  # skip payload dump when disabled
@@ -3650,71 +3974,42 @@ class App:
                     pass  # skip call counter only when activity, debug, and tool calls all disabled
                 elif msg["type"] == "call_counter":
                     tag = "call_counter" if self.debug_enabled.get() else "call_counter_subtle"
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(
-                        tk.END, f"  Call #{msg['content']}  ", tag
-                    )
-                    self.chat_display.insert(tk.END, "\n", "debug")
-                    self.chat_display.see(tk.END)
-                    self.chat_display.config(state="disabled")
+                    batch.add(f"  Call #{msg['content']}  ", tag)
+                    batch.add("\n", "debug")
                 elif msg["type"] == "debug":
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(tk.END, "--- PAYLOAD SENT TO API ---\n", "debug_label")
-                    self.chat_display.insert(tk.END, msg["content"] + "\n", "debug")
-                    self.chat_display.insert(tk.END, "--- END PAYLOAD ---\n\n", "debug_label")
-                    self.chat_display.see(tk.END)
-                    self.chat_display.config(state="disabled")
+                    batch.add("--- PAYLOAD SENT TO API ---\n", "debug_label")
+                    batch.add(msg["content"] + "\n", "debug")
+                    batch.add("--- END PAYLOAD ---\n\n", "debug_label")
                 elif msg["type"] == "tool_call_debug" and not self.tool_calls_enabled.get():
                     pass  # skip when tool calls display disabled
                 elif msg["type"] == "tool_call_debug":
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(tk.END, "--- TOOL CALL ---\n", "tool_debug_label")
-                    self.chat_display.insert(tk.END, msg["content"] + "\n", "tool_debug")
-                    self.chat_display.insert(tk.END, "--- END TOOL CALL ---\n", "tool_debug_label")
-                    self.chat_display.see(tk.END)
-                    self.chat_display.config(state="disabled")
+                    batch.add("--- TOOL CALL ---\n", "tool_debug_label")
+                    batch.add(msg["content"] + "\n", "tool_debug")
+                    batch.add("--- END TOOL CALL ---\n", "tool_debug_label")
                 elif msg["type"] == "thinking_start":
                     self._current_thinking_text = ""
                     if self.show_thinking.get():
-                        self.chat_display.config(state="normal")
-                        self.chat_display.insert(tk.END, "Thinking:\n", "thinking_label")
-                        self.chat_display.see(tk.END)
-                        self.chat_display.config(state="disabled")
+                        batch.add("Thinking:\n", "thinking_label")
                 elif msg["type"] == "thinking_delta":
                     self._current_thinking_text += msg["content"]
                     if self.show_thinking.get():
-                        self.chat_display.config(state="normal")
-                        self.chat_display.insert(tk.END, msg["content"], "thinking")
-                        self.chat_display.see(tk.END)
-                        self.chat_display.config(state="disabled")
+                        batch.add(msg["content"], "thinking")
                 elif msg["type"] == "thinking_end":
                     if self.show_thinking.get():
-                        self.chat_display.config(state="normal")
-                        self.chat_display.insert(tk.END, "\n\n", "thinking")
-                        self.chat_display.see(tk.END)
-                        self.chat_display.config(state="disabled")
+                        batch.add("\n\n", "thinking")
                 elif msg["type"] == "label":
                     self._current_response_text = ""
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(tk.END, f"{self._get_friend_label()}:\n", "assistant_label")
-                    self.chat_display.config(state="disabled")
+                    batch.add(f"{self._get_friend_label()}:\n", "assistant_label", scroll=False)
                 elif msg["type"] == "text_delta":
                     self._current_response_text += msg["content"]
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(tk.END, msg["content"], "assistant")
-                    self.chat_display.see(tk.END)
-                    self.chat_display.config(state="disabled")
+                    batch.add(msg["content"], "assistant")
                 elif msg["type"] == "tool_info" and not self.show_activity.get():
                     pass  # skip tool activity when activity display disabled
                 elif msg["type"] == "tool_info":
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(tk.END, msg["content"], "tool_info")
-                    self.chat_display.see(tk.END)
-                    self.chat_display.config(state="disabled")
+                    batch.add(msg["content"], "tool_info")
                 elif msg["type"] == "complete":
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(tk.END, "\n\n")
-                    self.chat_display.config(state="disabled")
+                    batch.add("\n\n", scroll=False)
+                    batch.flush(self.chat_display)
                     self.streaming = False
                     self._response_count += 1
                     # First instance: after first response, inject chat into instance 2
@@ -3729,16 +4024,14 @@ class App:
                             self._pending_injection = True
                     self.input_field.focus_set()
                 elif msg["type"] == "error":
-                    self.chat_display.config(state="normal")
-                    self.chat_display.insert(
-                        tk.END, f"Error: {msg['content']}\n\n", "error"
-                    )
-                    self.chat_display.see(tk.END)
-                    self.chat_display.config(state="disabled")
+                    batch.add(f"Error: {msg['content']}\n\n", "error")
                     self.streaming = False
         except queue.Empty:
             pass
-        self.root.after(50, self.check_queue)
+        batch.flush(self.chat_display)
+        # Budget exhausted with work still queued — yield to Tk briefly, then continue
+        delay = 1 if not self.queue.empty() else RENDER_TICK_MS
+        self.root.after(delay, self.check_queue)
 
     def append_message(self, role, content, filenames=None):
         self.chat_display.config(state="normal")
@@ -0,0 +1,93 @@
+"""Compare SelfBot's old Load Chat list with the _ChatCatalog index.
+
+Writes --chats synthetic saved chats of --messages messages each and
+times filling the Load Chat list:
+
+  legacy — the old _load_saved_chats: json.load every file for its name
+  cold   — _ChatCatalog.refresh() with no index yet (reads every chat once)
+  warm   — refresh() with an up-to-date index (one directory scan)
+  1 new  — refresh() after another process appended to one chat's journal
+
+Usage:
+    python benchmarks/bench_catalog.py [--chats 200] [--messages 100]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import SelfBot  # noqa: E402
+
+
+def write_chats(directory, chats, messages):
+    for c in range(chats):
+        history = []
+        for i in range(messages // 2):
+            history.append({"role": "user", "content": f"Question {i} for chat {c}: " + "context " * 40})
+            history.append({"role": "assistant", "content": [{"type": "text", "text": "An answer. " * 80}]})
+        store = SelfBot._ChatStore(f"Chat {c:04d}", directory=directory)
+        store.save(history, {"model": SelfBot.DEFAULT_MODEL, "temperature": 1.0},
+                   SelfBot.App._serialize_message)
+
+
+def legacy_list(directory):
+    """The pre-catalog _load_saved_chats + _refresh_chat_list."""
+    chats = {}
+    for fname in os.listdir(directory):
+        if not fname.endswith('.json'):
+            continue
+        with open(os.path.join(directory, fname), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        chats[data.get('name', fname[:-5])] = data
+    return sorted(chats)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=100)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_catalog_")
+    try:
+        chats_dir = os.path.join(workdir, "saved_chats")
+        write_chats(chats_dir, args.chats, args.messages)
+        total = sum(os.path.getsize(os.path.join(chats_dir, f)) for f in os.listdir(chats_dir))
+        catalog_path = os.path.join(workdir, "chat_catalog.json")
+
+        legacy_ms, names = timed(lambda: legacy_list(chats_dir))
+        cold_ms, entries = timed(lambda: SelfBot._ChatCatalog(catalog_path, chats_dir).refresh())
+        assert sorted(e["name"] for e in entries.values()) == names
+        warm_ms, _ = timed(lambda: SelfBot._ChatCatalog(catalog_path, chats_dir).refresh())
+
+        store = SelfBot._ChatStore("Chat 0000", directory=chats_dir)
+        history = [{"role": "user", "content": "one more"}]
+        store.save(history, {"model": SelfBot.DEFAULT_MODEL}, SelfBot.App._serialize_message)
+        history.append({"role": "assistant", "content": "and its answer"})
+        store.save(history, {"model": SelfBot.DEFAULT_MODEL}, SelfBot.App._serialize_message)
+        changed_ms, entries = timed(lambda: SelfBot._ChatCatalog(catalog_path, chats_dir).refresh())
+        assert entries["Chat 0000.json"]["messages"] == 2
+
+        print(f"{args.chats} chats, {total / 1e6:.1f} MB in saved_chats/")
+        print(f"{'legacy':<8} {legacy_ms:9.1f} ms")
+        print(f"{'cold':<8} {cold_ms:9.1f} ms")
+        print(f"{'warm':<8} {warm_ms:9.1f} ms")
+        print(f"{'1 new':<8} {changed_ms:9.1f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
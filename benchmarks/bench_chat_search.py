@@ -0,0 +1,137 @@
+"""Compare searching saved chats by scanning the files with _ChatSearchIndex.
+
+Writes --chats synthetic saved chats of --messages messages each (prose,
+tool calls and tool results drawn from a shared vocabulary) and times:
+
+  scan    — what finding prior work took before: read and parse every chat
+            and test each message for the query words (no ranking)
+  cold    — _ChatSearchIndex.refresh(persist=True) with no index yet (reads
+            every chat, then pickles the index like the background indexer)
+  load    — a new _ChatSearchIndex reading the pickled index, plus refresh()
+  query   — BM25 search() for word queries and a quoted-phrase query
+  1 save  — update() after one message is appended through a _ChatStore
+  search_chats after a save — refresh() + search() on the now-changed index;
+            asserts the pickle on disk is not rewritten
+
+Usage:
+    python benchmarks/bench_chat_search.py [--chats 300] [--messages 60]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MyAgent  # noqa: E402
+
+QUERIES = ["invoice spreadsheet", "powershell registry export", '"scheduled task"']
+
+
+def write_chats(directory, chats, messages, seed=0):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(5000)]
+    for k, word in enumerate(["window", "task", "export", "browser", "scheduled",
+                              "powershell", "registry", "spreadsheet", "invoice"]):
+        vocab.insert(8 * (k + 1) ** 2, word)   # ranks 8 .. 648
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]   # Zipf-like word frequencies
+    models = ["claude-sonnet-4-5-20250929", "claude-opus-4-6", "gpt-5"]
+    for c in range(chats):
+        history = []
+        for i in range(messages):
+            words = " ".join(rng.choices(vocab, weights, k=rng.randrange(20, 300)))
+            if i % 3 == 0:
+                history.append({"role": "user", "content": words})
+            elif i % 3 == 1:
+                history.append({"role": "assistant", "content": [
+                    {"type": "text", "text": words},
+                    {"type": "tool_use", "id": f"t{i}", "name": "run_powershell", "input": {"command": words[:80]}}]})
+            else:
+                history.append({"role": "user", "content": [
+                    {"type": "tool_result", "tool_use_id": f"t{i - 1}", "content": words}]})
+        store = MyAgent._ChatStore(f"Chat {c:04d}", directory=directory)
+        store.save(history, {"model": models[c % len(models)]}, MyAgent.App._serialize_message)
+
+
+def scan(directory, query):
+    """Parse every chat and return the (chat, message) pairs holding all query words."""
+    words, _ = MyAgent._parse_chat_query(query)
+    hits = []
+    for fname in sorted(os.listdir(directory)):
+        if not fname.endswith(".json"):
+            continue
+        data = MyAgent._ChatStore.load(os.path.join(directory, fname))
+        messages = data.get("messages", [])
+        skip_ids = MyAgent._search_chats_call_ids(messages)
+        for seq, msg in enumerate(messages):
+            tokens = set(MyAgent._search_tokens(MyAgent._chat_message_text(msg, skip_ids)))
+            if all(w in tokens for w in words):
+                hits.append((fname, seq))
+    return hits
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def best_ms(runs, fn):
+    return min(timed(fn)[0] for _ in range(runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=300)
+    parser.add_argument("--messages", type=int, default=60)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_chat_search_")
+    try:
+        chats_dir = os.path.join(workdir, "saved_chats")
+        write_chats(chats_dir, args.chats, args.messages)
+        total = sum(os.path.getsize(os.path.join(chats_dir, f)) for f in os.listdir(chats_dir))
+        index_path = os.path.join(workdir, "chat_index.pickle")
+
+        scan_ms, _ = timed(lambda: scan(chats_dir, QUERIES[0]))
+        index = MyAgent._ChatSearchIndex(index_path, chats_dir)
+        cold_ms, _ = timed(lambda: index.refresh(persist=True))
+        load_ms, _ = timed(lambda: MyAgent._ChatSearchIndex(index_path, chats_dir).refresh())
+
+        print(f"{args.chats} chats x {args.messages} messages, {total / 1e6:.1f} MB in saved_chats/, "
+              f"index {os.path.getsize(index_path) / 1e6:.1f} MB")
+        print(f"{'scan':<34} {scan_ms:9.1f} ms")
+        print(f"{'cold index':<34} {cold_ms:9.1f} ms")
+        print(f"{'load index + refresh':<34} {load_ms:9.1f} ms")
+        for query in QUERIES:
+            matches, _, _ = index.search(query)
+            ms = best_ms(args.runs, lambda: index.search(query))
+            print(f"{'query ' + query:<34} {ms:9.2f} ms  {matches} matches")
+            if not query.startswith('"'):
+                assert {(r["file"], r["seq"]) for r in index.search(query, limit=10 ** 6)[2]} >= set(scan(chats_dir, query))
+
+        store = MyAgent._ChatStore("Chat 0000", directory=chats_dir)
+        history = MyAgent._ChatStore.load(store.path)["messages"]
+        store.save(history, {"model": "gpt-5"}, MyAgent.App._serialize_message)
+        index.update(store, "gpt-5")
+        history.append({"role": "assistant", "content": "the invoice spreadsheet is exported"})
+        store.save(history, {"model": "gpt-5"}, MyAgent.App._serialize_message)
+        save_ms, _ = timed(lambda: index.update(store, "gpt-5"))
+        assert index.search('"invoice spreadsheet is exported"')[0] == 1
+        print(f"{'1 save (update)':<34} {save_ms:9.2f} ms")
+        # search_chats right after auto-save: refresh() + search must not re-pickle
+        mtime = os.stat(index_path).st_mtime_ns
+        tool_ms, _ = timed(lambda: (index.refresh(), index.search(QUERIES[0])))
+        assert os.stat(index_path).st_mtime_ns == mtime
+        print(f"{'search_chats after a save':<34} {tool_ms:9.2f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Compare MyAgent's old full-rewrite chat auto-save with _ChatStore.
+
+Simulates a long agent run: --turns assistant/tool-result turns (tool
+output of --tool-chars characters, plus a screenshot), with the periodic
+auto-save running after every turn, and times, over the whole run:
+
+  legacy — the old _auto_save_on_close: serialise every message, rewrite
+           saved_chats/<name>.json with indent=2 and rewrite the .txt
+           transcript from the whole chat display
+  store  — _ChatStore: journal the new messages (one write and fsync per
+           save), append the transcript, compact when the journal
+           outgrows the snapshot, and fold the journal in at close
+
+Reports total and last-save milliseconds and the bytes written, and
+checks that the store's files replay to the same chat.
+
+Usage:
+    python benchmarks/bench_chatstore.py [--turns 500] [--tool-chars 2000]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MyAgent  # noqa: E402
+
+META = {"system_prompt": MyAgent.DEFAULT_SYSTEM_PROMPT, "provider": "Anthropic",
+        "model": MyAgent.DEFAULT_MODEL, "temperature": 1.0}
+
+
+class _FakeText:
+    """Just enough of a Tk Text widget (get, marks) for save_transcript."""
+
+    def __init__(self):
+        self.text = ""
+        self.marks = {}
+
+    def _offset(self, index):
+        if index == "1.0":
+            return 0
+        if index in ("end", "end-1c"):
+            return len(self.text)
+        return self.marks[index]
+
+    def insert(self, text):
+        self.text += text
+
+    def get(self, start, end="end"):
+        return self.text[self._offset(start):self._offset(end)]
+
+    def compare(self, a, op, b):
+        return self._offset(a) == self._offset(b)
+
+    def mark_set(self, mark, index):
+        self.marks[mark] = self._offset(index)
+
+    def mark_gravity(self, mark, gravity):
+        pass
+
+
+def turn(i, tool_chars):
+    return [
+        {"role": "assistant", "content": [
+            {"type": "text", "text": f"Step {i}: checking the next page of results."},
+            {"type": "tool_use", "id": f"toolu_{i:05d}", "name": "browser_get_text", "input": {"selector": "main"}},
+        ]},
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": f"toolu_{i:05d}", "content": [
+            {"type": "text", "text": (f"row {i} " * tool_chars)[:tool_chars]},
+            {"type": "image", "source": {"type": "base64", "media_type": "image/jpeg", "data": "x" * 1000}},
+        ]}]},
+    ]
+
+
+def legacy_save(directory, name, messages, display):
+    """The pre-store _auto_save_on_close; returns bytes written."""
+    data = {"messages": [m for m in map(MyAgent.App._serialize_message, messages) if m is not None], **META}
+    data["name"] = name
+    text = json.dumps(data, indent=2, ensure_ascii=False)
+    with open(os.path.join(directory, name + ".json"), "w", encoding="utf-8") as f:
+        f.write(text)
+    output_text = display.get("1.0", "end").rstrip()
+    with open(os.path.join(directory, name + ".txt"), "w", encoding="utf-8") as f:
+        f.write(output_text)
+    return len(text.encode("utf-8")) + len(output_text)
+
+
+def run(turns, tool_chars, save):
+    messages = [{"role": "user", "content": MyAgent.DEFAULT_INSTRUCTION}]
+    display = _FakeText()
+    total = last = 0.0
+    for i in range(turns):
+        messages.extend(turn(i, tool_chars))
+        display.insert(f"Agent: Step {i}: checking the next page of results.\n\n[tool] browser_get_text\n\n")
+        start = time.perf_counter()
+        save(messages, display, final=i == turns - 1)
+        last = time.perf_counter() - start
+        total += last
+    return total * 1000, last * 1000, messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--tool-chars", type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_chatstore_")
+    try:
+        legacy_bytes = 0
+
+        def legacy(messages, display, final):
+            nonlocal legacy_bytes
+            legacy_bytes += legacy_save(workdir, "legacy", messages, display)
+
+        legacy_total, legacy_last, _ = run(args.turns, args.tool_chars, legacy)
+
+        store = MyAgent._ChatStore("store", directory=workdir)
+
+        def journal(messages, display, final):
+            store.save(messages, META, MyAgent.App._serialize_message, compact=final)
+            store.save_transcript(display)
+
+        store_total, store_last, messages = run(args.turns, args.tool_chars, journal)
+        loaded = MyAgent._ChatStore.load(store.path)
+        assert loaded["messages"] == [m for m in map(MyAgent.App._serialize_message, messages) if m is not None]
+
+        print(f"{args.turns} turns, {len(messages)} messages, final chat "
+              f"{os.path.getsize(store.path) / 1e6:.1f} MB")
+        print(f"{'':<8} {'total ms':>10} {'last save ms':>13} {'MB written':>11}")
+        print(f"{'legacy':<8} {legacy_total:10.0f} {legacy_last:13.2f} {legacy_bytes / 1e6:11.1f}")
+        print(f"{'store':<8} {store_total:10.0f} {store_last:13.2f} {store.bytes_written / 1e6:11.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
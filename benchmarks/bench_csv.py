@@ -0,0 +1,183 @@
+"""Compare csv_search engines on generated files of 1M and 10M rows.
+
+Writes a synthetic transactions export (id, date, name, email, city,
+amount, memo) per row count and times, per query:
+
+  legacy    — the original do_csv_search loop: csv.DictReader over the
+              whole file with per-cell .lower() on every call
+  index     — _CsvIndex (dictionary-encoded column store, inverted and
+              trigram indexes); build once, then warm lookups
+  columnar  — _CsvColumns (memory-mapped column buffers scanned in C,
+              hits mapped to rows with NumPy); build once, then lookups
+
+Rare values are used so every engine has to cover the whole file. Build
+times are reported separately from query times. The trigram index is
+memory-hungry on high-cardinality columns, so it is skipped above
+--skip-index-over rows (bigger files use the columnar engine in the app).
+
+Usage:
+    python benchmarks/bench_csv.py [--rows 1000000 10000000] [--dir DIR]
+                                   [--skip-legacy-over N] [--skip-index-over N]
+"""
+
+import argparse
+import csv
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MyAgent  # noqa: E402
+
+CITIES = ["Sydney", "Melbourne", "Brisbane", "Perth", "Adelaide", "Hobart", "Darwin", "Canberra"]
+NAMES = ["Smith", "Jones", "Williams", "Brown", "Wilson", "Taylor", "Nguyen", "Martin", "Lee", "Walker"]
+
+QUERIES = [
+    # (label, search_value, column, match_mode)
+    ("exact id", "4999999", "id", "exact"),
+    ("starts_with email", "needle.", "email", "starts_with"),
+    ("contains memo", "xylophone", "memo", "contains"),
+    ("contains any col", "xylophone", None, "contains"),
+]
+
+
+def write_csv(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "date", "name", "email", "city", "amount", "memo"])
+        for i in range(rows):
+            name = rng.choice(NAMES)
+            # A handful of rare needles spread through the file
+            rare = i % (rows // 4 or 1) == rows // 8
+            w.writerow([
+                i,
+                f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}",
+                name,
+                f"needle.{i}@example.com" if rare else f"{name.lower()}.{i}@example.com",
+                rng.choice(CITIES),
+                f"{rng.uniform(1, 5000):.2f}",
+                "paid by xylophone transfer" if rare else f"invoice {rng.randint(1000, 99999)}",
+            ])
+
+
+def legacy_search(file_path, search_value, column=None, match_mode="contains", max_results=50):
+    """The pre-index do_csv_search match loop (output formatting omitted)."""
+    with open(file_path, "r", encoding="utf-8-sig", newline="") as f:
+        sample = f.read(8192)
+        f.seek(0)
+        try:
+            delimiter = csv.Sniffer().sniff(sample, delimiters=',\t|;').delimiter
+        except csv.Error:
+            delimiter = ','
+        reader = csv.DictReader(f, delimiter=delimiter)
+        search_lower = search_value.lower()
+        matches = []
+        for row_num, row in enumerate(reader, start=2):
+            cells_to_check = [row.get(column, "")] if column else row.values()
+            for cell in cells_to_check:
+                cell_lower = (cell or "").lower()
+                if match_mode == "exact" and cell_lower == search_lower:
+                    matched = True
+                elif match_mode == "starts_with" and cell_lower.startswith(search_lower):
+                    matched = True
+                elif match_mode == "contains" and search_lower in cell_lower:
+                    matched = True
+                else:
+                    matched = False
+                if matched:
+                    matches.append(row_num)
+                    break
+            if len(matches) >= max_results:
+                break
+    return matches
+
+
+def engine_search(engine, search_value, column, match_mode, max_results=50):
+    columns = [engine.headers.index(column)] if column else range(len(engine.headers))
+    row_ids = engine.match_rows(search_value.lower(), columns, match_mode, max_results)
+    engine.read_rows(row_ids)
+    return [r + 2 for r in row_ids]
+
+
+def timed(fn, runs=1):
+    best = float("inf")
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(rows, workdir, skip_legacy_over, skip_index_over):
+    path = os.path.join(workdir, f"bench_{rows}.csv")
+    if not os.path.exists(path):
+        print(f"Writing {rows:,} rows...", flush=True)
+        write_csv(path, rows)
+    print(f"\n== {rows:,} rows ({os.path.getsize(path) / 1e6:,.0f} MB) ==")
+
+    index = None
+    if rows <= skip_index_over:
+        build_index, index = timed(lambda: MyAgent._CsvIndex.build(path))
+        print(f"index build    : {build_index:8.2f} s")
+    else:
+        print("index          : skipped (--skip-index-over)")
+    columns = None
+    if MyAgent.np is not None:
+        build_cols, columns = timed(lambda: MyAgent._CsvColumns.open(path, None))
+        print(f"columnar build : {build_cols:8.2f} s")
+    else:
+        print("columnar       : skipped (NumPy not installed)")
+
+    print(f"{'query':<20} {'legacy ms':>12} {'index ms':>10} {'columnar ms':>12}")
+    for label, value, column, mode in QUERIES:
+        if rows <= skip_legacy_over:
+            t_legacy, expected = timed(lambda: legacy_search(path, value, column, mode))
+            legacy = f"{t_legacy * 1000:12.1f}"
+        else:
+            expected, legacy = None, f"{'skipped':>12}"
+        line = f"{label:<20} {legacy}"
+        if index is not None:
+            t_index, got = timed(lambda: engine_search(index, value, column, mode), runs=5)
+            line += f" {t_index * 1000:10.3f}"
+            assert expected is None or got == expected, (label, "index", got, expected)
+            expected = got
+        else:
+            line += f" {'skipped':>10}"
+        if columns is not None:
+            t_cols, got = timed(lambda: engine_search(columns, value, column, mode), runs=5)
+            line += f" {t_cols * 1000:12.3f}"
+            assert expected is None or got == expected, (label, "columnar", got, expected)
+        print(line)
+    if columns is not None:
+        columns.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--dir", default=None, help="Where to write the generated files (default: temp dir)")
+    parser.add_argument("--skip-legacy-over", type=int, default=10_000_000,
+                        help="Skip the legacy full scan above this many rows")
+    parser.add_argument("--skip-index-over", type=int, default=2_000_000,
+                        help="Skip the trigram index engine above this many rows")
+    args = parser.parse_args()
+
+    workdir = args.dir or tempfile.mkdtemp(prefix="bench_csv_")
+    # Keep benchmark indexes out of the app's real csv_index directory
+    MyAgent.CSV_INDEX_DIR = os.path.join(workdir, "csv_index")
+    try:
+        for rows in args.rows:
+            run(rows, workdir, args.skip_legacy_over, args.skip_index_over)
+    finally:
+        if args.dir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
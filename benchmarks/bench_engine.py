@@ -0,0 +1,311 @@
+"""Measure the asyncio agent engine: per-turn overhead and Stop latency.
+
+Drives App.stream_worker on the app's _AsyncLoop against an in-process
+fake of the AsyncAnthropic streaming client (no network), and reports:
+
+  turn overhead — wall time per agent turn for a model that streams a
+                  short reply and requests 4 parallel-safe tools per turn
+  tool dispatch — the parallel tool stage alone: the old per-turn
+                  ThreadPoolExecutor vs asyncio.gather on the shared loop
+  stop latency  — time from Stop to the "complete" event while a slow
+                  stream is in flight (the old thread engine could only
+                  notice Stop after the API call returned)
+  speculation   — a turn whose model streams 4 fetch_webpage calls, each
+                  block taking --block-ms to generate and the k-th fetch
+                  taking --fetch-ms * (4 - k) / 4, with the Speculate
+                  option off and on
+  mixed turn    — one turn of desktop/browser observers around a click
+                  (--tool-ms each): the old schedule ran all of them one
+                  after another; the capability schedule overlaps the
+                  observers and keeps them ordered around the click
+  fan-out       — one turn requesting --fanout fetch_webpage calls of
+                  --fetch-ms each: wall time, the most fetches in flight
+                  at once and the peak tool queue depth (the old engine
+                  ran every call at once)
+
+Usage:
+    python benchmarks/bench_engine.py [--turns 200] [--tools 4]
+                                      [--block-ms 150] [--fetch-ms 300] [--fanout 20]
+                                      [--tool-ms 100]
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import queue
+import sys
+import time
+from types import SimpleNamespace as NS
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MyAgent  # noqa: E402
+
+
+class _Flag:
+    """Stand-in for a tk.BooleanVar / DoubleVar so no Tk root is needed."""
+
+    def __init__(self, value):
+        self._value = value
+
+    def get(self):
+        return self._value
+
+
+class _FakeStream:
+    def __init__(self, turn, tools, deltas, delay, tool, block_delay):
+        self.turn, self.tools, self.deltas, self.delay = turn, tools, deltas, delay
+        self.tool, self.block_delay = tool, block_delay
+        # `tool` is (name, input or input(k)) repeated `tools` times, or a list of (name, input)
+        calls = tool if isinstance(tool, list) else \
+            [(tool[0], tool[1](k) if callable(tool[1]) else tool[1]) for k in range(tools)]
+        self.blocks = [{"type": "tool_use", "id": f"toolu_{turn}_{k}", "name": name, "input": tool_input}
+                       for k, (name, tool_input) in enumerate(calls[:tools])]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def _events(self):
+        yield NS(type="content_block_start", index=0, content_block=NS(type="text"))
+        for _ in range(self.deltas):
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield NS(type="content_block_delta", index=0, delta=NS(type="text_delta", text="token "))
+        yield NS(type="content_block_stop", index=0)
+        for index, block in enumerate(self.blocks, start=1):
+            yield NS(type="content_block_start", index=index,
+                     content_block=NS(type="tool_use", id=block["id"], name=block["name"], input={}))
+            if self.block_delay:
+                await asyncio.sleep(self.block_delay)
+            yield NS(type="content_block_delta", index=index,
+                     delta=NS(type="input_json_delta", partial_json=json.dumps(block["input"])))
+            yield NS(type="content_block_stop", index=index)
+
+    def __aiter__(self):
+        return self._events()
+
+    async def get_final_message(self):
+        content = [{"type": "text", "text": "token " * self.deltas}] + self.blocks
+        return NS(stop_reason="tool_use" if self.tools else "end_turn", content=[NS(**b) for b in content])
+
+
+class _FakeAsyncAnthropic:
+    """Streams `deltas` text deltas per call, then asks for `tools` tool
+    calls; the last of `turns` calls ends the run."""
+
+    def __init__(self, turns, tools, deltas=20, delay=0.0,
+                 tool=("get_skill", {"skill_name": "notes"}), block_delay=0.0):
+        self.turns, self.tools, self.deltas, self.delay = turns, tools, deltas, delay
+        self.tool, self.block_delay = tool, block_delay
+        self.calls = 0
+        self.messages = self
+
+    def stream(self, **kwargs):
+        self.calls += 1
+        tools = 0 if self.calls >= self.turns else self.tools
+        return _FakeStream(self.calls, tools, self.deltas, self.delay, self.tool, self.block_delay)
+
+
+def make_app(client, loop):
+    app = MyAgent.App.__new__(MyAgent.App)
+    app.queue = queue.Queue()
+    app.provider = "Anthropic"
+    app.model = MyAgent.DEFAULT_MODEL
+    app.system_prompt = MyAgent.DEFAULT_SYSTEM_PROMPT
+    app.skills = {"notes": {"mode": "on_demand", "content": "Remember to be brief."}}
+    app.temperature = 1.0
+    app._temp_var = _Flag(1.0)
+    app.thinking_enabled = False
+    app.prompt_caching = False
+    app.speculative_tools = False
+    app.context_policy = MyAgent._context_policy(None)
+    app.agent_instruction = "Benchmark run"
+    app._headless = False
+    app.stop_requested = False
+    app.debug_enabled = _Flag(False)
+    app.desktop_enabled = _Flag(False)
+    app.browser_enabled = _Flag(False)
+    app.meta_enabled = _Flag(False)
+    app._tool_cache = {}
+    app._responses_tool_cache = {}
+    app._screen_size = None
+    app.async_client = client
+    app._async = loop
+    app._agent_started = False
+    app._tool_limits = MyAgent._ToolLimiter()
+    app._browser_thread = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    app._threaded_tools = {}
+    app._screen_delta = MyAgent._ScreenDelta()
+    return app
+
+
+def wait_for(app, kind, timeout=60, infos=None):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            msg = app.queue.get(timeout=0.001)
+        except queue.Empty:
+            continue
+        if msg["type"] == "error":
+            raise RuntimeError(msg["content"])
+        if msg["type"] == "tool_info" and infos is not None:
+            infos.append(msg["content"])
+        if msg["type"] == kind:
+            return time.perf_counter()
+    raise TimeoutError(kind)
+
+
+def turn_overhead(loop, turns, tools):
+    app = make_app(_FakeAsyncAnthropic(turns, tools), loop)
+    messages = [{"role": "user", "content": "go"}]
+    start = time.perf_counter()
+    loop.submit(app.stream_worker(messages))
+    end = wait_for(app, "complete")
+    assert app.async_client.calls == turns
+    return (end - start) / turns * 1000
+
+
+def dispatch(loop, tools, rounds):
+    app = make_app(None, loop)
+    blocks = [MyAgent._ToolBlock("get_skill", f"toolu_{k}", {"skill_name": "notes"}) for k in range(tools)]
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        # Old engine: a fresh pool per turn
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(blocks)) as executor:
+            futures = [executor.submit(app._execute_tool, b) for b in blocks]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+    legacy = (time.perf_counter() - start) / rounds * 1000
+
+    async def gather_all():
+        for _ in range(rounds):
+            await asyncio.gather(*(app._execute_tool_async(b) for b in blocks))
+
+    start = time.perf_counter()
+    loop.run(gather_all())
+    shared = (time.perf_counter() - start) / rounds * 1000
+    return legacy, shared
+
+
+def stop_latency(loop, stream_seconds=10.0, stop_after=0.5):
+    deltas = 1000
+    app = make_app(_FakeAsyncAnthropic(1, 0, deltas=deltas, delay=stream_seconds / deltas), loop)
+    future = loop.submit(app.stream_worker([{"role": "user", "content": "go"}]))
+    time.sleep(stop_after)
+    start = time.perf_counter()
+    future.cancel()
+    return (wait_for(app, "complete") - start) * 1000, stream_seconds - stop_after
+
+
+def speculation(loop, block_ms, fetch_ms, tools=4):
+    async def slow_fetch(url):
+        k = int(url.rsplit("/", 1)[1])
+        await asyncio.sleep(fetch_ms / 1000 * (tools - k) / tools)
+        return f"Fetched {url}"
+
+    timings = []
+    for speculate in (False, True):
+        client = _FakeAsyncAnthropic(2, tools, tool=("fetch_webpage", lambda k: {"url": f"https://example.com/{k}"}),
+                                     block_delay=block_ms / 1000)
+        app = make_app(client, loop)
+        app.speculative_tools = speculate
+        app.fetch_url_async = slow_fetch
+        start = time.perf_counter()
+        loop.submit(app.stream_worker([{"role": "user", "content": "go"}]))
+        timings.append((wait_for(app, "complete") - start) * 1000)
+    return timings
+
+
+MIXED_TURN = [
+    ("screenshot", {}),
+    ("browser_get_text", {}),
+    ("clipboard_read", {}),
+    ("find_window", {"title": "Notepad"}),
+    ("mouse_click", {"x": 10, "y": 10}),
+    ("screenshot", {}),
+    ("browser_screenshot", {}),
+    ("web_search", {"query": "example"}),
+]
+
+
+def mixed_turn(loop, tool_ms):
+    spans = []
+
+    def slow_tool(block):
+        start = time.perf_counter()
+        time.sleep(tool_ms / 1000)
+        spans.append((block.id, start, time.perf_counter()))
+        return f"{block.name} done"
+
+    client = _FakeAsyncAnthropic(2, len(MIXED_TURN), tool=MIXED_TURN)
+    app = make_app(client, loop)
+    app._execute_tool = slow_tool
+    start = time.perf_counter()
+    loop.submit(app.stream_worker([{"role": "user", "content": "go"}]))
+    elapsed = (wait_for(app, "complete") - start) * 1000
+    return elapsed, len(MIXED_TURN) * tool_ms, spans
+
+
+def fan_out(loop, calls, fetch_ms):
+    in_flight = peak = 0
+
+    async def slow_fetch(url):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            await asyncio.sleep(fetch_ms / 1000)
+        finally:
+            in_flight -= 1
+        return f"Fetched {url}"
+
+    client = _FakeAsyncAnthropic(2, calls, tool=("fetch_webpage", lambda k: {"url": f"https://example.com/{k}"}))
+    app = make_app(client, loop)
+    app.fetch_url_async = slow_fetch
+    start = time.perf_counter()
+    loop.submit(app.stream_worker([{"role": "user", "content": "go"}]))
+    infos = []
+    elapsed = (wait_for(app, "complete", infos=infos) - start) * 1000
+    depth = next((int(line.split("peak depth ")[1].split()[0]) for line in infos
+                  if line.startswith("Tool queue:")), 0)
+    return elapsed, peak, depth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--tools", type=int, default=4)
+    parser.add_argument("--block-ms", type=float, default=150, help="Time to stream one tool_use block")
+    parser.add_argument("--fetch-ms", type=float, default=300, help="Time one fetch_webpage call takes")
+    parser.add_argument("--fanout", type=int, default=20, help="fetch_webpage calls in the fan-out turn")
+    parser.add_argument("--tool-ms", type=float, default=100, help="Time each tool takes in the mixed turn")
+    args = parser.parse_args()
+
+    loop = MyAgent._AsyncLoop()
+    try:
+        per_turn = turn_overhead(loop, args.turns, args.tools)
+        print(f"turn overhead : {per_turn:8.3f} ms/turn ({args.turns} turns, {args.tools} tools each)")
+        legacy, shared = dispatch(loop, args.tools, rounds=500)
+        print(f"tool dispatch : {legacy:8.3f} ms/turn per-turn pool, {shared:.3f} ms/turn shared loop")
+        latency, legacy_wait = stop_latency(loop)
+        print(f"stop latency  : {latency:8.1f} ms (old engine: ~{legacy_wait * 1000:,.0f} ms, until the call ended)")
+        off, on = speculation(loop, args.block_ms, args.fetch_ms)
+        print(f"speculation   : {off:8.1f} ms/turn off, {on:.1f} ms/turn on ({off - on:.1f} ms saved)")
+        elapsed, serial, _ = mixed_turn(loop, args.tool_ms)
+        print(f"mixed turn    : {elapsed:8.1f} ms for {len(MIXED_TURN)} tools (old schedule: {serial:,.0f} ms, "
+              f"one after another)")
+        elapsed, in_flight, depth = fan_out(loop, args.fanout, args.fetch_ms)
+        print(f"fan-out       : {elapsed:8.1f} ms for {args.fanout} fetches, at most {in_flight} in flight, "
+              f"peak queue depth {depth} (old engine: {args.fanout} in flight)")
+    finally:
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
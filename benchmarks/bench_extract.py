@@ -0,0 +1,99 @@
+"""Compare extracting fetch_webpage text from a whole page with the budgeted extractor.
+
+Builds a synthetic article page of --kb kilobytes (a nav menu, an aside,
+paragraphs of body text and a footer) and times:
+
+  full     — the old path: parse the whole page, then cut the text to
+             FETCH_TEXT_BUDGET characters
+  budget   — HTMLTextExtractor(budget=FETCH_TEXT_BUDGET) fed in 16 KB
+             chunks, stopping at `done` like a streamed fetch
+
+Also checks the extractor on pages that broke earlier versions: an unclosed
+<nav> (text after it must not be lost), nested regions and a page whose
+only text is in a nav.
+
+Usage:
+    python benchmarks/bench_extract.py [--kb 2000] [--runs 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MyAgent  # noqa: E402
+
+CHUNK = 16 * 1024
+
+CASES = [
+    # (html, expected text)
+    ("<html><body><nav>Home | About</nav><p>Article text</p></body></html>", "Article text"),
+    ("<body><nav>Home | About<p>Article text</p></body>", "Home | AboutArticle text"),
+    ("<body><nav>Menu</body><p>Trailing text</p>", "Trailing text"),
+    ("<aside>Side<nav>Links</nav>more side</aside><p>Main</p><footer>(c) 2026</footer>", "Main"),
+    ("<nav><a href='/'>Only a menu</a></nav>", "Only a menu"),
+    ("<p>Text</p><script>var x = '<nav>';</script><p>More</p>", "Text\nMore"),
+]
+
+
+def make_page(kb, seed=0):
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(2000)]
+    parts = ["<html><head><style>body { color: black }</style></head><body>",
+             "<nav><ul>" + "".join(f"<li><a href='/{i}'>Section {i}</a></li>" for i in range(200)) + "</ul></nav>",
+             "<aside>" + " ".join(rng.choices(words, k=500)) + "</aside>"]
+    size = sum(map(len, parts))
+    while size < kb * 1024:
+        para = "<p>" + " ".join(rng.choices(words, k=120)) + "</p>\n"
+        parts.append(para)
+        size += len(para)
+    parts.append("<footer>" + " ".join(rng.choices(words, k=300)) + "</footer></body></html>")
+    return "".join(parts)
+
+
+def full(html):
+    return MyAgent.extract_text_from_html(html)[:MyAgent.FETCH_TEXT_BUDGET]
+
+
+def budgeted(html):
+    extractor = MyAgent.HTMLTextExtractor(budget=MyAgent.FETCH_TEXT_BUDGET)
+    for start in range(0, len(html), CHUNK):
+        extractor.feed(html[start:start + CHUNK])
+        if extractor.done:
+            break
+    extractor.close()
+    return extractor.get_text()[:MyAgent.FETCH_TEXT_BUDGET]
+
+
+def best_ms(runs, fn):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kb", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    for html, expected in CASES:
+        got = MyAgent.extract_text_from_html(html)
+        assert got == expected, (html, got, expected)
+    print(f"{len(CASES)} extractor cases OK")
+
+    page = make_page(args.kb)
+    assert budgeted(page) == full(page)
+    print(f"page {len(page) / 1024:,.0f} KB, budget {MyAgent.FETCH_TEXT_BUDGET:,} chars")
+    print(f"{'full parse':<14} {best_ms(args.runs, lambda: full(page)):9.2f} ms")
+    print(f"{'budgeted':<14} {best_ms(args.runs, lambda: budgeted(page)):9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Compare instructions with embedded base64 images against _ImageBlobStore references.
+
+Writes --instructions saved instructions, each attaching --images images of
+--image-kb KB. Half of each instruction's images are a reference picture
+shared by all of them (a common pattern: the same app screenshot reused
+across tasks). Times:
+
+  load   — App._load_saved_instructions(), which _auto_launch,
+           _load_last_state, manage_instructions and run_instruction all
+           call, for the old embedded file and for the blob-reference file
+  start  — reading one instruction's images from the blob store, as START
+           now does (the embedded file had them in memory already)
+
+and reports agent_instructions.json and total on-disk sizes.
+
+Usage:
+    python benchmarks/bench_instructions.py [--instructions 30] [--images 4] [--image-kb 400]
+"""
+
+import argparse
+import base64
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MyAgent  # noqa: E402
+
+
+def make_app(workdir):
+    app = MyAgent.App.__new__(MyAgent.App)
+    app._image_blobs = MyAgent._ImageBlobStore(os.path.join(workdir, "image_blobs"))
+    app.pending_images = []
+    app._editor_images = []
+    return app
+
+
+def embedded_instructions(count, images, image_kb):
+    shared = [base64.standard_b64encode(os.urandom(image_kb * 1024)).decode("ascii")
+              for _ in range(images // 2)]
+    instructions = {}
+    for i in range(count):
+        own = [base64.standard_b64encode(os.urandom(image_kb * 1024)).decode("ascii")
+               for _ in range(images - len(shared))]
+        instructions[f"Task {i:03d}"] = {
+            "text": f"Open the report for task {i} and check the totals.",
+            "images": [{"data": data, "media_type": "image/png", "filename": f"shot{j}.png"}
+                       for j, data in enumerate(shared + own)],
+            "desktop": True, "model": MyAgent.DEFAULT_MODEL,
+        }
+    return instructions
+
+
+def best_ms(runs, fn):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--instructions", type=int, default=30)
+    parser.add_argument("--images", type=int, default=4)
+    parser.add_argument("--image-kb", type=int, default=400)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_instructions_")
+    try:
+        MyAgent.INSTRUCTIONS_FILE = os.path.join(workdir, "agent_instructions.json")
+        instructions = embedded_instructions(args.instructions, args.images, args.image_kb)
+        with open(MyAgent.INSTRUCTIONS_FILE, "w", encoding="utf-8") as f:
+            json.dump(instructions, f, indent=2, ensure_ascii=False)
+        embedded_size = os.path.getsize(MyAgent.INSTRUCTIONS_FILE)
+
+        def load_embedded():
+            # The old _load_saved_instructions: parse everything, nothing to migrate
+            with open(MyAgent.INSTRUCTIONS_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        embedded_ms = best_ms(args.runs, load_embedded)
+
+        app = make_app(workdir)
+        start = time.perf_counter()
+        migrated = app._load_saved_instructions()
+        migrate_ms = (time.perf_counter() - start) * 1000
+        blob_size = os.path.getsize(MyAgent.INSTRUCTIONS_FILE)
+        refs_ms = best_ms(args.runs, app._load_saved_instructions)
+
+        entry = migrated["Task 000"]
+        start_ms = best_ms(args.runs, lambda: [app._image_b64(ref)
+                                               for ref, _mt, _fn in app._instruction_images(entry)])
+        for img, original in zip(entry["images"], instructions["Task 000"]["images"]):
+            assert app._image_blobs.get_b64(img["blob"]) == original["data"]
+
+        blobs_dir = app._image_blobs.directory
+        print(f"{args.instructions} instructions x {args.images} images of {args.image_kb} KB "
+              f"({args.images // 2} shared by all)")
+        print(f"{'':<22} {'file MB':>8} {'on disk MB':>11} {'load ms':>8}")
+        print(f"{'embedded base64':<22} {embedded_size / 1e6:8.1f} {embedded_size / 1e6:11.1f} {embedded_ms:8.1f}")
+        print(f"{'blob references':<22} {blob_size / 1e6:8.3f} "
+              f"{(blob_size + dir_bytes(blobs_dir)) / 1e6:11.1f} {refs_ms:8.2f}")
+        print(f"one-off migration {migrate_ms:.0f} ms; reading one instruction's "
+              f"{len(entry['images'])} images at START {start_ms:.1f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
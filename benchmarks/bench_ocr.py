@@ -0,0 +1,82 @@
+"""Compare read_screen_text's old per-region OCR with the batched, cached path.
+
+An agent reading a form or a table OCRs several regions of the same screen
+one after another. On a synthetic desktop (_FakeCapture) with an OCR
+backend that takes --ocr-ms per call (_FakeOcrBackend), times reading
+--regions regions:
+
+  legacy   — the old do_read_screen_text once per region: a fresh capture
+             and asyncio.run() (a new event loop) per call
+  cold     — App.do_read_screen_text_async with all regions at once: one capture,
+             regions recognised concurrently on the agent event loop
+  warm     — the same call again on the unchanged screen (OCR cache hits)
+  1 change — the same call after one region's pixels changed
+
+Usage:
+    python benchmarks/bench_ocr.py [--regions 8] [--ocr-ms 120]
+"""
+
+import argparse
+import asyncio
+import os
+import queue
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MyAgent  # noqa: E402
+from PIL import ImageDraw  # noqa: E402
+
+
+def legacy_read(backend, ocr, x, y, width, height):
+    """The pre-batch do_read_screen_text (scale 1.0)."""
+    img = backend.grab((x, y, width, height))
+    return asyncio.run(ocr.recognize(img)).strip()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--regions", type=int, default=8)
+    parser.add_argument("--ocr-ms", type=float, default=120)
+    args = parser.parse_args()
+
+    backend = MyAgent._FakeCapture(1920, 1080)
+    regions = [(120 + 40 * i, 90 + 90 * i, 360, 32) for i in range(args.regions)]
+
+    app = MyAgent.App.__new__(MyAgent.App)
+    app.queue = queue.Queue()
+    app._screenshot_scale = 1.0
+    app._screenshots = MyAgent._ScreenshotPipeline(backend)
+    app._ocr = MyAgent._FakeOcrBackend(delay=args.ocr_ms / 1000)
+    app._ocr_cache = MyAgent._OcrCache()
+    app._async = MyAgent._AsyncLoop()
+    try:
+        legacy_ocr = MyAgent._FakeOcrBackend(delay=args.ocr_ms / 1000)
+        legacy_ms, _ = timed(lambda: [legacy_read(backend, legacy_ocr, *r) for r in regions])
+        cold_ms, _ = timed(lambda: app._async.run(app.do_read_screen_text_async(regions)))
+        cold_calls = app._ocr.calls
+        warm_ms, _ = timed(lambda: app._async.run(app.do_read_screen_text_async(regions)))
+        warm_calls = app._ocr.calls - cold_calls
+        x, y, width, height = regions[-1]
+        ImageDraw.Draw(backend.image).rectangle([x + 4, y + 4, x + 60, y + height - 4], fill=(200, 40, 40))
+        changed_ms, _ = timed(lambda: app._async.run(app.do_read_screen_text_async(regions)))
+        changed_calls = app._ocr.calls - cold_calls - warm_calls
+    finally:
+        app._async.close()
+
+    print(f"{args.regions} regions, OCR backend {args.ocr_ms:g} ms per call")
+    print(f"{'legacy':<10} {legacy_ms:9.1f} ms  {legacy_ocr.calls} OCR calls")
+    print(f"{'cold':<10} {cold_ms:9.1f} ms  {cold_calls} OCR calls")
+    print(f"{'warm':<10} {warm_ms:9.1f} ms  {warm_calls} OCR calls")
+    print(f"{'1 change':<10} {changed_ms:9.1f} ms  {changed_calls} OCR calls")
+
+
+if __name__ == "__main__":
+    main()
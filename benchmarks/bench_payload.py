@@ -0,0 +1,146 @@
+"""Measure per-turn Debug payload overhead in MyAgent.stream_worker.
+
+Builds an Anthropic-format agent history with N screenshot tool results
+(base64 PNG noise of a realistic 1280x720 screenshot size) and times, per
+API call:
+
+  legacy     — the old path: copy.deepcopy of the history, in-place image
+               truncation, then json.dumps(indent=2); run on every call
+  debug off  — the new path with the Debug checkbox off (nothing rendered)
+  debug on   — the new path: _payload_for_display streaming the history
+               through _iter_display_json with images swapped out on the fly
+
+Usage:
+    python benchmarks/bench_payload.py [--screenshots 50] [--runs 5]
+"""
+
+import argparse
+import base64
+import copy
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MyAgent  # noqa: E402
+
+
+class _Flag:
+    """Stand-in for a tk.BooleanVar so the benchmark needs no Tk root."""
+
+    def __init__(self, value):
+        self._value = value
+
+    def get(self):
+        return self._value
+
+
+def build_history(screenshots, image_bytes=900_000):
+    messages = [{"role": "user", "content": MyAgent.DEFAULT_INSTRUCTION}]
+    for i in range(screenshots):
+        data = base64.standard_b64encode(os.urandom(image_bytes)).decode("utf-8")
+        messages.append({"role": "assistant", "content": [
+            {"type": "text", "text": f"Step {i}: taking a screenshot."},
+            {"type": "tool_use", "id": f"toolu_{i:04d}", "name": "screenshot", "input": {}},
+        ]})
+        messages.append({"role": "user", "content": [{
+            "type": "tool_result",
+            "tool_use_id": f"toolu_{i:04d}",
+            "content": [
+                {"type": "text", "text": "Screenshot captured (1280x720)."},
+                {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": data}},
+            ],
+        }]})
+    return messages
+
+
+def legacy_payload(app, messages):
+    """The pre-change _payload_for_display (Anthropic path)."""
+    display_msgs = copy.deepcopy([{"role": m["role"], "content": m["content"]} for m in messages])
+
+    def _truncate_images(blocks):
+        for block in blocks:
+            if isinstance(block, dict):
+                if block.get("type") == "image":
+                    src = block.get("source", {})
+                    if src.get("data"):
+                        src["data"] = src["data"][:40] + "...[truncated]"
+                if block.get("type") == "tool_result" and isinstance(block.get("content"), list):
+                    _truncate_images(block["content"])
+
+    for msg in display_msgs:
+        if isinstance(msg["content"], list):
+            _truncate_images(msg["content"])
+    payload = {
+        "model": app.model,
+        "stream": True,
+        "system": app._build_system_prompt(),
+        "tools": app._get_tools(),
+        "messages": display_msgs,
+        "max_tokens": MyAgent.MAX_TOKENS,
+        "temperature": app.temperature,
+    }
+    return json.dumps(payload, indent=2)
+
+
+def make_app(debug):
+    app = MyAgent.App.__new__(MyAgent.App)
+    app.provider = "Anthropic"
+    app.model = MyAgent.DEFAULT_MODEL
+    app.system_prompt = MyAgent.DEFAULT_SYSTEM_PROMPT
+    app.skills = {}
+    app.temperature = 1.0
+    app.thinking_enabled = False
+    app.prompt_caching = False
+    app.debug_enabled = _Flag(debug)
+    app.desktop_enabled = _Flag(False)
+    app.browser_enabled = _Flag(False)
+    app.meta_enabled = _Flag(False)
+    app._responses_cache = MyAgent._ResponsesInputCache()
+    app._tool_cache = {}
+    app._responses_tool_cache = {}
+    app._screen_size = None
+    return app
+
+
+def per_turn(fn, runs):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--screenshots", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    messages = build_history(args.screenshots)
+    mb = sum(len(m["content"][0]["content"][1]["source"]["data"])
+             for m in messages[2::2]) / 1e6
+    print(f"History: {len(messages)} messages, {args.screenshots} screenshots ({mb:.1f} MB base64)")
+
+    app_off = make_app(debug=False)
+    app_on = make_app(debug=True)
+
+    def new_turn(app):
+        # Mirrors the stream_worker gate
+        if app.debug_enabled.get():
+            app._payload_for_display(messages)
+
+    legacy = per_turn(lambda: legacy_payload(app_on, messages), args.runs)
+    off = per_turn(lambda: new_turn(app_off), args.runs)
+    on = per_turn(lambda: new_turn(app_on), args.runs)
+    print(f"legacy (every call) : {legacy:9.2f} ms/turn")
+    print(f"new, Debug off      : {off:9.3f} ms/turn")
+    print(f"new, Debug on       : {on:9.2f} ms/turn")
+    assert json.loads(legacy_payload(app_on, messages)) == json.loads(app_on._payload_for_display(messages))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Replay a recorded stream through MyAgent's chat render stage.
+
+Turns the assistant text of a saved chat into a stream of small
+text/thinking deltas (the size the API emits them), then renders it two
+ways into a real Tk Text widget:
+
+  per-delta  — the old check_queue behaviour: state toggle, insert and
+               scroll for every delta
+  batched    — App.check_queue with the coalescing _RenderBatch stage
+
+Reports inserts/sec and total main-thread time for each.
+
+Usage:
+    python benchmarks/bench_render.py [saved_chats/<name>.json] [--budget MS]
+"""
+
+import argparse
+import json
+import os
+import queue
+import random
+import sys
+import time
+import tkinter as tk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MyAgent  # noqa: E402
+
+DEFAULT_CHAT = os.path.join(MyAgent.CHATS_DIR, "S&N_Haiku1.json")
+
+
+def record_stream(chat_path, repeat=1, seed=0):
+    """Build a list of queue messages from a saved chat's assistant text."""
+    with open(chat_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    texts = []
+    for msg in data.get("messages", []):
+        if msg.get("role") != "assistant":
+            continue
+        content = msg.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+        elif isinstance(content, list):
+            texts.extend(b.get("text", "") for b in content
+                         if isinstance(b, dict) and b.get("type") == "text")
+    rng = random.Random(seed)
+    stream = []
+    for _ in range(repeat):
+        for text in texts:
+            if not text:
+                continue
+            stream.append({"type": "thinking_start"})
+            for i in range(0, min(len(text), 400), 4):
+                stream.append({"type": "thinking_delta", "content": text[i:i + 4]})
+            stream.append({"type": "thinking_end"})
+            stream.append({"type": "label"})
+            pos = 0
+            while pos < len(text):
+                n = rng.randint(2, 8)
+                stream.append({"type": "text_delta", "content": text[pos:pos + n]})
+                pos += n
+    return stream
+
+
+def replay_per_delta(widget, stream):
+    """Old behaviour: one state toggle / insert / scroll per message."""
+    inserts = 0
+    start = time.perf_counter()
+    for msg in stream:
+        if msg["type"] == "label":
+            text, tag = "Agent:\n", "assistant_label"
+        elif msg["type"] == "text_delta":
+            text, tag = msg["content"], "assistant"
+        elif msg["type"] == "thinking_start":
+            text, tag = "Thinking:\n", "thinking_label"
+        elif msg["type"] == "thinking_delta":
+            text, tag = msg["content"], "thinking"
+        else:
+            text, tag = "\n\n", "thinking"
+        widget.config(state="normal")
+        widget.insert(tk.END, text, tag)
+        widget.see(tk.END)
+        widget.config(state="disabled")
+        inserts += 1
+    return inserts, time.perf_counter() - start
+
+
+class _NoRescheduleRoot:
+    """Root proxy so check_queue's after() re-arm is a no-op during replay."""
+
+    def __init__(self, root):
+        self._root = root
+
+    def after(self, *args):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._root, name)
+
+
+def replay_batched(root, widget, stream, budget_ms, tick_ms):
+    """Feed the stream into App.check_queue in producer-sized chunks."""
+    app = MyAgent.App.__new__(MyAgent.App)
+    app.root = _NoRescheduleRoot(root)
+    app.queue = queue.Queue()
+    app.chat_display = widget
+    app.debug_enabled = tk.BooleanVar(value=False)
+    app.tool_calls_enabled = tk.BooleanVar(value=False)
+    app.show_activity = tk.BooleanVar(value=False)
+    app.show_thinking = tk.BooleanVar(value=True)
+    app._current_response_text = ""
+    app._current_thinking_text = ""
+    app._render_budget_ms = budget_ms
+
+    # Roughly how many deltas a fast stream produces per tick (~150 deltas/s)
+    per_tick = max(1, int(150 * tick_ms / 1000))
+    frames = 0
+    busy = 0.0
+    for i in range(0, len(stream), per_tick):
+        for msg in stream[i:i + per_tick]:
+            app.queue.put(msg)
+        start = time.perf_counter()
+        app.check_queue()
+        busy += time.perf_counter() - start
+        frames += 1
+    while not app.queue.empty():
+        start = time.perf_counter()
+        app.check_queue()
+        busy += time.perf_counter() - start
+        frames += 1
+    return frames, busy
+
+
+def _make_widget(root):
+    widget = tk.Text(root, wrap=tk.WORD, state="disabled")
+    widget.pack()
+    for tag in ("assistant", "assistant_label", "thinking", "thinking_label"):
+        widget.tag_config(tag)
+    return widget
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("chat", nargs="?", default=DEFAULT_CHAT)
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Replay the chat N times to lengthen the stream")
+    parser.add_argument("--budget", type=float, default=MyAgent.RENDER_FRAME_BUDGET_MS,
+                        help="Frame budget in ms for the batched renderer")
+    args = parser.parse_args()
+
+    stream = record_stream(args.chat, repeat=args.repeat)
+    root = tk.Tk()
+    root.withdraw()
+
+    widget = _make_widget(root)
+    inserts, elapsed = replay_per_delta(widget, stream)
+    print(f"Stream: {len(stream)} messages from {os.path.basename(args.chat)}")
+    print(f"per-delta : {inserts} inserts in {elapsed * 1000:.1f} ms main-thread "
+          f"({inserts / elapsed:,.0f} inserts/s)")
+    widget.destroy()
+
+    widget = _make_widget(root)
+    frames, busy = replay_batched(root, widget, stream, args.budget, MyAgent.RENDER_TICK_MS)
+    print(f"batched   : {len(stream)} deltas in {frames} frames, {busy * 1000:.1f} ms main-thread "
+          f"({len(stream) / busy:,.0f} deltas/s, budget {args.budget:g} ms)")
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
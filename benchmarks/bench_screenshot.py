@@ -0,0 +1,140 @@
+"""Compare the screenshot tool's old PNG path with the _ScreenshotPipeline.
+
+Captures a synthetic desktop (_FakeCapture, so no display is needed) at
+common screen sizes and times, per screenshot:
+
+  legacy — the old do_screenshot: capture, resize with the default
+           filter, full-colour PNG, base64
+  jpeg / webp / png — _ScreenshotPipeline with each SCREENSHOT_FORMAT
+           (png is the 256-colour palette encoder)
+
+Reports per-stage milliseconds (best of --runs) and the base64 payload
+each screenshot adds to the request.
+
+Then replays a desktop loop (--steps screenshots, each after a small
+change such as a highlighted button or a typed word) through
+App.do_screenshot with delta screenshots off and on, and reports the
+payload and estimated image tokens (width * height / 750 per image).
+
+Usage:
+    python benchmarks/bench_screenshot.py [--sizes 1920x1080 2560x1440] [--runs 10] [--steps 20]
+"""
+
+import argparse
+import base64
+import io
+import os
+import queue
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MyAgent  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+
+def legacy_shot(backend, max_w=1280):
+    """The pre-pipeline do_screenshot image path."""
+    timings = {}
+    start = time.perf_counter()
+    img = backend.grab()
+    timings["capture"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    orig_w, orig_h = img.size
+    if orig_w > max_w:
+        ratio = orig_w / max_w
+        img = img.resize((max_w, int(orig_h / ratio)))
+    timings["resize"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    timings["encode"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    b64 = base64.standard_b64encode(buf.getvalue()).decode("utf-8")
+    timings["b64"] = (time.perf_counter() - start) * 1000
+    return timings, len(b64)
+
+
+def best_of(runs, fn):
+    best, size = None, 0
+    for _ in range(runs):
+        timings, size = fn()
+        if best is None or sum(timings.values()) < sum(best.values()):
+            best = timings
+    return best, size
+
+
+def image_blocks(result):
+    return [] if isinstance(result, str) else [b for b in result if b["type"] == "image"]
+
+
+def desktop_loop(steps, deltas, seed=0):
+    """Screenshot after each small UI change; returns (ms, base64 bytes, image tokens)."""
+    MyAgent.SCREENSHOT_DELTAS = deltas
+    app = MyAgent.App.__new__(MyAgent.App)
+    app.queue = queue.Queue()
+    app.context_policy = MyAgent._context_policy(None)
+    backend = MyAgent._FakeCapture(1920, 1080)
+    app._screenshots = MyAgent._ScreenshotPipeline(backend)
+    app._screen_delta = MyAgent._ScreenDelta()
+    draw = ImageDraw.Draw(backend.image)
+    rng = random.Random(seed)
+
+    elapsed = payload = tokens = 0.0
+    for step in range(steps):
+        if step:
+            # A button highlight or a word typed into a field
+            x, y = rng.randrange(100, 1700), rng.randrange(100, 950)
+            if step % 2:
+                draw.rectangle([x, y, x + 120, y + 32], fill=(rng.randrange(256), 120, 200))
+            else:
+                draw.text((x, y), f"typed text {step}", fill=(0, 0, 0))
+        app._screen_delta.next_turn()
+        start = time.perf_counter()
+        result = app.do_screenshot()
+        elapsed += time.perf_counter() - start
+        for block in image_blocks(result):
+            data = block["source"]["data"]
+            payload += len(data)
+            with Image.open(io.BytesIO(base64.b64decode(data))) as img:
+                tokens += img.width * img.height / 750
+    return elapsed * 1000, payload, tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["1920x1080", "2560x1440"])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--steps", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'screen':<10} {'encoder':<8} {'capture':>8} {'resize':>8} {'encode':>8} {'b64':>6} "
+          f"{'total ms':>9} {'payload KB':>11}")
+    for size in args.sizes:
+        width, height = (int(n) for n in size.split("x"))
+        backend = MyAgent._FakeCapture(width, height)
+        rows = [("legacy", best_of(args.runs, lambda: legacy_shot(backend)))]
+        for fmt in ("jpeg", "webp", "png"):
+            pipeline = MyAgent._ScreenshotPipeline(backend, fmt=fmt)
+
+            def shot():
+                s = pipeline.shoot()
+                return s["timings"], len(s["data"])
+            rows.append((fmt, best_of(args.runs, shot)))
+        for label, (t, payload) in rows:
+            print(f"{size:<10} {label:<8} {t['capture']:8.1f} {t['resize']:8.1f} {t['encode']:8.1f} "
+                  f"{t['b64']:6.1f} {sum(t.values()):9.1f} {payload / 1024:11.0f}")
+
+    print(f"\nDesktop loop, {args.steps} screenshots at 1920x1080 (small change before each):")
+    for label, deltas in (("full frames", False), ("deltas", True)):
+        ms, payload, tokens = desktop_loop(args.steps, deltas)
+        print(f"{label:<12} {ms:8.1f} ms total {payload / 1024:10,.0f} KB {tokens:10,.0f} image tokens")
+
+
+if __name__ == "__main__":
+    main()
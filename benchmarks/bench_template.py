@@ -0,0 +1,143 @@
+"""Compare find_image_on_screen's old locateOnScreen search with _TemplateMatcher.
+
+Draws a few button-like icons onto a synthetic desktop (_FakeCapture) at
+known positions, saves them as template PNGs, and times locating them:
+
+  legacy — what pyautogui.locateOnScreen(confidence=...) did per call:
+           decode the template from disk, then a full-resolution colour
+           TM_CCOEFF_NORMED search of the whole screen
+  cold   — App.do_find_image_on_screen for one template with an empty
+           template cache (decode + coarse pyramid search + refinement)
+  warm   — the same call again (template and its pyramid cached)
+  batch  — every template in one call, sharing one capture
+  hinted — one template with a `region` hint around its position
+
+Every path is checked against the known icon positions. Requires
+opencv-python.
+
+Usage:
+    python benchmarks/bench_template.py [--sizes 1920x1080 3840x2160] [--runs 5]
+"""
+
+import argparse
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MyAgent  # noqa: E402
+from PIL import ImageDraw  # noqa: E402
+
+ICONS = [
+    # (label, width, height, fill)
+    ("OK", 48, 48, (60, 140, 60)),
+    ("Save as...", 120, 32, (40, 90, 200)),
+    ("Cancel this download", 200, 60, (180, 60, 40)),
+]
+
+
+def draw_icons(backend, workdir):
+    """Draw ICONS onto the fake screen; returns [(path, (left, top))]."""
+    draw = ImageDraw.Draw(backend.image)
+    width, height = backend.image.size
+    placed = []
+    for i, (label, w, h, fill) in enumerate(ICONS):
+        left, top = width // 4 + i * width // 5 + 7, height // 3 + i * height // 7 + 3
+        draw.rectangle([left, top, left + w - 1, top + h - 1], fill=fill, outline=(10, 10, 10))
+        draw.ellipse([left + 4, top + 4, left + 14, top + 14], fill=(250, 250, 250))
+        draw.text((left + 18, top + h // 2 - 6), label, fill=(255, 255, 255))
+        path = os.path.join(workdir, f"icon_{i}.png")
+        backend.image.crop((left, top, left + w, top + h)).save(path)
+        placed.append((path, (left, top)))
+    return placed
+
+
+def legacy_locate(backend, path):
+    """pyautogui.locateOnScreen's OpenCV path (pyscreeze), one template."""
+    import cv2
+    import numpy as np
+    needle = cv2.imread(path, cv2.IMREAD_COLOR)
+    haystack = cv2.cvtColor(np.asarray(backend.grab()), cv2.COLOR_RGB2BGR)
+    scores = cv2.matchTemplate(haystack, needle, cv2.TM_CCOEFF_NORMED)
+    _, _, _, (x, y) = cv2.minMaxLoc(scores)
+    return x, y
+
+
+def best_ms(runs, fn):
+    best = float("inf")
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def make_app(backend):
+    app = MyAgent.App.__new__(MyAgent.App)
+    app.queue = queue.Queue()
+    app._screenshot_scale = 1.0
+    app._screenshots = MyAgent._ScreenshotPipeline(backend)
+    app._templates = MyAgent._TemplateMatcher()
+    return app
+
+
+def found_at(result):
+    """Top-left corners from do_find_image_on_screen's output."""
+    corners = []
+    for line in result.splitlines():
+        if line.startswith("Image found at region ("):
+            x, y = line[len("Image found at region ("):].split(",")[:2]
+            corners.append((int(x), int(y)))
+    return corners
+
+
+def run(size, runs, workdir):
+    width, height = (int(n) for n in size.split("x"))
+    backend = MyAgent._FakeCapture(width, height)
+    placed = draw_icons(backend, workdir)
+    paths = [p for p, _ in placed]
+    expected = [pos for _, pos in placed]
+
+    legacy, got = best_ms(runs, lambda: legacy_locate(backend, paths[1]))
+    assert got == expected[1], ("legacy", got, expected[1])
+
+    cold_app = make_app(backend)
+    cold, result = best_ms(1, lambda: cold_app.do_find_image_on_screen(paths[1:2]))
+    assert found_at(result) == expected[1:2], result
+    warm, result = best_ms(runs, lambda: cold_app.do_find_image_on_screen(paths[1:2]))
+    assert found_at(result) == expected[1:2], result
+    batch, result = best_ms(runs, lambda: cold_app.do_find_image_on_screen(paths))
+    assert found_at(result) == expected, result
+    x, y = expected[1]
+    hint = (max(0, x - 150), max(0, y - 100), 400, 250)
+    hinted, result = best_ms(runs, lambda: cold_app.do_find_image_on_screen(paths[1:2], region=hint))
+    assert found_at(result) == expected[1:2], result
+
+    print(f"{size:<10} {legacy:9.1f} {cold:9.1f} {warm:9.1f} {batch:11.1f} {hinted:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["1920x1080", "3840x2160"])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    if MyAgent.cv2 is None:
+        sys.exit("opencv-python is not installed")
+
+    workdir = tempfile.mkdtemp(prefix="bench_template_")
+    try:
+        print(f"{'screen':<10} {'legacy ms':>9} {'cold ms':>9} {'warm ms':>9} "
+              f"{f'batch of {len(ICONS)}':>11} {'hinted ms':>9}")
+        for size in args.sizes:
+            run(size, args.runs, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()